@@ -0,0 +1,196 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import weakref
+
+from memory_manager import frame_token
+
+
+DEFAULT_SAMPLE_ROWS = 100_000
+SAMPLE_ROW_OPTIONS = [10_000, 100_000, 1_000_000]
+# Two-sided 95% normal quantile
+Z95 = 1.96
+# HyperLogLog registers: 2**14 for a whole column (~0.8% error), 2**10 per group (~3%)
+HLL_PRECISION = 14
+HLL_GROUP_PRECISION = 10
+# Per-group sketches above this many registers in total fall back to an exact count
+MAX_GROUP_REGISTERS = 2**26
+CI_SUFFIX = " ±"
+
+_samples = {}    # (frame token, rows, seed) -> sample positions, dropped with the frame
+
+
+def approx_toggle(step, prefix, step_count):
+    """Approximate-mode controls for an aggregate step's form."""
+    key = f"{prefix}_approx_{step_count}"
+    approximate = st.checkbox("⚡ Approximate (sample + sketches)", value=step.get("approximate", False), key=key,
+                              help="Answers from a random sample of rows; distinct counts from HyperLogLog sketches.")
+    step["approximate"] = approximate
+    if approximate:
+        step["sample_rows"] = st.select_slider("Sample rows", SAMPLE_ROW_OPTIONS,
+                                               value=step.get("sample_rows", DEFAULT_SAMPLE_ROWS),
+                                               key=f"{prefix}_approx_rows_{step_count}")
+        st.button("🎯 Run exact", key=f"{prefix}_approx_exact_{step_count}", on_click=_run_exact, args=(step, key),
+                  help="Recompute this step on every row and replace the estimates.")
+
+
+def _run_exact(step, key):
+    step["approximate"] = False
+    st.session_state[key] = False
+
+
+# --- Sampling --------------------------------------------------------------
+
+def _forget_samples(token):
+    for key in [k for k in _samples if k[0] == token]:
+        del _samples[key]
+
+
+def sample_positions(df, rows, seed=0):
+    """Sorted positions of a uniform random sample of `rows` rows, drawn once per frame."""
+    token = frame_token(df)
+    key = (token, rows, seed)
+    if key not in _samples:
+        if not any(k[0] == token for k in _samples):
+            weakref.finalize(df, _forget_samples, token)
+        # Without replacement; numpy draws small samples of large tables without permuting every row
+        _samples[key] = np.sort(np.random.default_rng(seed).choice(len(df), size=rows, replace=False))
+    return _samples[key]
+
+
+def _fpc(m, n):
+    """Finite population correction for a sample of `m` out of `n` rows."""
+    return np.sqrt(max(n - m, 0) / (n - 1)) if n > 1 else 0.0
+
+
+# --- HyperLogLog -----------------------------------------------------------
+
+def _hll_estimate(registers, precision):
+    m = 1 << precision
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype("float64")), axis=-1)
+    zeros = np.sum(registers == 0, axis=-1)
+    # Linear counting while many registers are still empty
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+def hll_distinct(series, codes=None, groups=1, precision=HLL_PRECISION):
+    """Estimated distinct non-null values of `series`, overall or per group code (0..groups-1).
+
+    Returns (estimates, 95% half-widths) as arrays of length `groups`.
+    """
+    mask = series.notna().to_numpy()
+    if codes is not None:
+        mask = mask & (codes >= 0)  # rows whose group key is null belong to no group
+    hashes = pd.util.hash_pandas_object(series[mask], index=False).to_numpy()
+    m = 1 << precision
+    bucket = (hashes >> np.uint64(64 - precision)).astype("int64")
+    # Rank = position of the first 1 bit after the bucket bits; the guard bit caps it
+    rest = (hashes << np.uint64(precision)) | np.uint64(1 << (precision - 1))
+    rank = (65 - np.frexp(rest.astype("float64"))[1]).astype("uint8")
+    slot = bucket if codes is None else codes[mask].astype("int64") * m + bucket
+
+    registers = np.zeros(groups * m, dtype="uint8")
+    if len(slot):
+        best = pd.Series(rank).groupby(slot).max()
+        registers[best.index.to_numpy()] = best.to_numpy()
+    estimates = _hll_estimate(registers.reshape(groups, m), precision)
+    return estimates, Z95 * 1.04 / np.sqrt(m) * estimates
+
+
+# --- Estimators ------------------------------------------------------------
+
+def approx_aggregate(df, column, func, rows=DEFAULT_SAMPLE_ROWS):
+    """(estimate, 95% half-width or NaN) of `func` over `df[column]`."""
+    n = len(df)
+    if n <= rows:
+        return getattr(df[column], func)(), 0.0
+    if func == "nunique":
+        estimate, half_width = hll_distinct(df[column])
+        return float(estimate[0]), float(half_width[0])
+
+    sample = df[column].take(sample_positions(df, rows))
+    fpc = _fpc(rows, n)
+    values = sample.dropna()
+    if func == "count":
+        p = len(values) / rows
+        return n * p, Z95 * n * np.sqrt(p * (1 - p) / rows) * fpc
+    if func == "sum":
+        # Total = n × mean of the sampled values, nulls counting as 0
+        y = sample.fillna(0).astype("float64")
+        return n * y.mean(), Z95 * n * y.std(ddof=1) / np.sqrt(rows) * fpc
+    if func == "mean":
+        if len(values) < 2:
+            return values.mean(), np.nan
+        return values.mean(), Z95 * values.std(ddof=1) / np.sqrt(len(values)) * fpc
+    # min / max of a sample only bound the true value
+    return getattr(values, func)(), np.nan
+
+
+def approx_group_by(df, group_cols, aggregations, rows=DEFAULT_SAMPLE_ROWS):
+    """Group-by of `df` estimated from a row sample (distinct counts from per-group sketches).
+
+    Each `{func}_{col}` column is followed by `{func}_{col} ±`, its 95% half-width.
+    Groups absent from the sample are missing from the result.
+    """
+    n = len(df)
+    sampled = n > rows
+    sample = df.take(sample_positions(df, rows)) if sampled else df
+    m = len(sample)
+    fpc = _fpc(m, n) if sampled else 0.0
+    grouped = sample.groupby(group_cols)
+    result = grouped.size().to_frame("_rows")
+
+    for col, func in aggregations.items():
+        name = f"{func}_{col}"
+        if func == "nunique":
+            continue
+        if func in ["sum", "count"]:
+            # Per-group total as a population total: y = value (or 1 if non-null) inside the group, 0 outside
+            x = sample[col].astype("float64") if func == "sum" else sample[col].notna().astype("float64")
+            if func == "sum":
+                x = x.fillna(0)
+            s1 = x.groupby([sample[c] for c in group_cols]).sum()
+            s2 = (x * x).groupby([sample[c] for c in group_cols]).sum()
+            mean_y = s1 / m
+            var_y = (s2 / m - mean_y ** 2) * m / max(m - 1, 1)
+            result[name] = n * mean_y
+            result[name + CI_SUFFIX] = Z95 * n * np.sqrt(var_y.clip(lower=0) / m) * fpc
+        elif func == "mean":
+            stats = grouped[col].agg(["mean", "std", "count"])
+            result[name] = stats["mean"]
+            result[name + CI_SUFFIX] = Z95 * stats["std"] / np.sqrt(stats["count"]) * fpc
+        else:
+            result[name] = grouped[col].agg(func)
+            result[name + CI_SUFFIX] = np.nan
+
+    distinct_cols = [col for col, func in aggregations.items() if func == "nunique"]
+    if distinct_cols:
+        # Sketches read every row but keep only a few registers per group
+        full = df.groupby(group_cols)
+        codes = full.ngroup().to_numpy()
+        keys = full.size().index
+        groups = len(keys)
+        for col in distinct_cols:
+            name = f"nunique_{col}"
+            if not sampled or groups * (1 << HLL_GROUP_PRECISION) > MAX_GROUP_REGISTERS:
+                exact = full[col].nunique()
+                estimates, half_widths = exact.to_numpy(), np.zeros(groups)
+            else:
+                estimates, half_widths = hll_distinct(df[col], codes, groups, HLL_GROUP_PRECISION)
+            result[name] = pd.Series(estimates, index=keys).reindex(result.index)
+            result[name + CI_SUFFIX] = pd.Series(half_widths, index=keys).reindex(result.index)
+
+    ordered = [c for col, func in aggregations.items() for c in (f"{func}_{col}", f"{func}_{col}{CI_SUFFIX}")]
+    return result[ordered].reset_index()
+
+
+def approx_caption(df, rows, grouped=False):
+    n = len(df)
+    if n <= rows:
+        st.caption(f"≈ Approximate mode: the table has only {n:,} rows, so values are exact.")
+    else:
+        st.caption(f"≈ Approximate: estimated from {rows:,} of {n:,} rows ({rows / n:.2%}); "
+                   f"`{CI_SUFFIX.strip()}` columns are 95% confidence half-widths. Use 🎯 Run exact for precise values."
+                   + (" Groups with no sampled rows are not listed." if grouped else ""))
@@ -0,0 +1,222 @@
+import streamlit as st
+import copy
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from sql_steps import apply_step
+from pipeline_executor import is_mutating
+from shared_tables import private_copy
+from memory_manager import frame_token
+
+
+DEFAULT_SAMPLE_ROWS = 10_000
+DEFAULT_TIME_BUDGET_S = 300
+
+# One small pool for the whole server; full runs are queued, never run on the script thread
+_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vq-full-run")
+
+
+class RunCancelled(Exception):
+    pass
+
+
+class RunTimedOut(Exception):
+    pass
+
+
+class BackgroundRun:
+    """A full pipeline run on a worker thread.
+
+    Cancellation and the time budget are cooperative: they are checked between
+    steps, so a cancelled run keeps only the steps it already finished.
+    """
+
+    def __init__(self, fingerprints, job, time_budget_s=DEFAULT_TIME_BUDGET_S):
+        self.fingerprints = fingerprints
+        self.time_budget_s = time_budget_s
+        self.results = {}
+        self.progress = 0.0
+        self.current_step = None
+        self.acknowledged = False
+        self._cancel = threading.Event()
+        self.started = time.monotonic()
+        self.future = _EXECUTOR.submit(job, self)
+
+    def check(self):
+        if self._cancel.is_set():
+            raise RunCancelled()
+        if self.time_budget_s and self.elapsed > self.time_budget_s:
+            raise RunTimedOut()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def status(self):
+        if not self.future.done():
+            return "cancelling" if self._cancel.is_set() else "running"
+        error = self.future.exception()
+        if error is None:
+            return "done"
+        if isinstance(error, RunCancelled):
+            return "cancelled"
+        if isinstance(error, RunTimedOut):
+            return "timed out"
+        return "failed"
+
+    def result_for(self, index, fingerprint):
+        """Full result of step `index`, only if it was computed for this exact config."""
+        if index < len(self.fingerprints) and self.fingerprints[index] == fingerprint:
+            return self.results.get(index)
+        return None
+
+
+def pipeline_fingerprints(steps, tables):
+    """Cumulative fingerprint per step: step i's result depends on steps 0..i and the inputs."""
+    digest = hashlib.sha1()
+    for name in sorted(tables):
+        df = tables[name]
+        digest.update(f"{name}:{frame_token(df)}:{df.shape}".encode())
+    fingerprints = []
+    for step in steps:
+        digest.update(json.dumps(step, sort_keys=True, default=str).encode())
+        fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+def deterministic_sample(df, n=DEFAULT_SAMPLE_ROWS, seed=0):
+    if len(df) <= n:
+        return df
+    return df.sample(n=n, random_state=seed).sort_index()
+
+
+def sample_tables(tables, n, cache):
+    """Sample every table once per table object; `cache` survives reruns."""
+    sampled = {}
+    for name, df in tables.items():
+        hit = cache.get(name)
+        if hit is None or hit[0] != frame_token(df) or hit[1] != n:
+            hit = (frame_token(df), n, deterministic_sample(df, n))
+            cache[name] = hit
+        sampled[name] = hit[2]
+    return sampled
+
+
+def execute_dynamic_step(step, available):
+    source_key = step.get("input_source")
+    source_df = available.get(source_key)
+    if source_df is None:
+        return None
+    if is_mutating(step):
+        # The source may be an uploaded table or an earlier step's result that is kept and reused
+        source_df = private_copy(source_df)
+    return apply_step(step, {source_key: source_df})
+
+
+def _full_pipeline_job(steps, tables, reuse, ctx):
+    def job(run):
+        # The worker has no script context of its own: run with the session's, so steps
+        # see its declared keys, indexes and memory bookkeeping as the preview does
+        thread = threading.current_thread()
+        add_script_run_ctx(thread, ctx)
+        try:
+            available = dict(tables)
+            total = max(len(steps), 1)
+            for i, step in enumerate(steps):
+                run.check()
+                run.current_step = i
+                df = reuse.get(i)
+                if df is None:
+                    df = execute_dynamic_step(step, available)
+                if df is not None:
+                    run.results[i] = df
+                    available[f"step_{i+1}"] = df
+                run.progress = (i + 1) / total
+            return run.results
+        finally:
+            add_script_run_ctx(thread, None)
+    return job
+
+
+def ensure_background_run(key, steps, tables, time_budget_s, output_dir=None):
+    """Start (or keep) the full run matching the current pipeline; cancel stale ones.
+
+    A run for the same pipeline is kept whatever its status (a cancelled,
+    timed-out or failed run stays so until the pipeline changes or the user
+    retries it).
+    """
+    fingerprints = pipeline_fingerprints(steps, tables)
+    run = st.session_state.get(key)
+    retry = st.session_state.pop(f"{key}_retry", False)
+    if run is not None and run.fingerprints == fingerprints and not (retry and run.status not in ["running", "cancelling"]):
+        return run
+
+    # Reuse full results of unchanged leading steps
+    reuse = {}
+    if run is not None:
+        run.cancel()
+        for i, fp in enumerate(fingerprints):
+            df = run.result_for(i, fp)
+            if df is None:
+                break
+            reuse[i] = df
+
+    steps_copy = copy.deepcopy(steps)
+    for step in steps_copy:
+        # Where spills and SQL scripts go, since the worker can't rely on the script's session keys
+        step["output_dir"] = step.get("output_dir") or output_dir
+    run = BackgroundRun(fingerprints, _full_pipeline_job(steps_copy, tables, reuse, get_script_run_ctx()),
+                        time_budget_s)
+    st.session_state[key] = run
+    return run
+
+
+def _render_run_status(key):
+    run = st.session_state.get(key)
+    if run is None:
+        return
+    status = run.status
+    if status in ["running", "cancelling"]:
+        step_no = (run.current_step or 0) + 1
+        st.progress(run.progress, text=f"⏳ Full run: step {step_no}/{len(run.fingerprints)} · {run.elapsed:.0f}s")
+        if st.button("⏹️ Cancel full run", key=f"{key}_cancel"):
+            run.cancel()
+    elif not run.acknowledged:
+        # Swap the finished results into the main page
+        run.acknowledged = True
+        st.rerun()
+    elif status == "done":
+        st.caption(f"✅ Full run finished in {run.elapsed:.1f}s")
+    else:
+        if status == "failed":
+            st.error(f"❌ Full run failed: {run.future.exception()}")
+        else:
+            st.warning(f"⚠️ Full run {status} after {run.elapsed:.0f}s")
+        st.button("🔁 Retry full run", key=f"{key}_retry_button", on_click=_request_retry, args=(key,))
+
+
+def _request_retry(key):
+    st.session_state[f"{key}_retry"] = True
+
+
+if hasattr(st, "fragment"):
+    _render_run_status_live = st.fragment(run_every=1)(_render_run_status)
+else:
+    _render_run_status_live = _render_run_status
+
+
+def background_run_status(key):
+    run = st.session_state.get(key)
+    if run is not None and run.status in ["running", "cancelling"]:
+        _render_run_status_live(key)
+    else:
+        _render_run_status(key)
@@ -0,0 +1,264 @@
+"""Benchmark every apply_step step type (and SQL generation) on synthetic tables.
+
+    python benchmarks/bench_steps.py --sizes 1e4 1e5 1e6 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_steps.py --sizes 1e4 1e5 1e6 --compare benchmarks/baseline.json --threshold 0.2
+
+Each case records best-of-N wall time and tracemalloc peak memory. With
+--compare, cases slower than the baseline by more than --threshold are
+reported and the exit code is 1.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_pipeline import strip_ui  # noqa: E402
+
+strip_ui()
+
+from pipeline_executor import is_mutating  # noqa: E402
+from sql_generator import generate_sql_query_for_step, iter_insert_batches  # noqa: E402
+from sql_steps import apply_step, plan_missing_value_batch  # noqa: E402
+from step_registry import step_type_names  # noqa: E402
+
+
+FACT = "fact.csv"
+FACT_B = "fact_b.csv"
+DIM = "dim.csv"
+
+
+def make_tables(rows, key_cardinality, null_ratio, str_width, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = int(rows)
+    key_cardinality = max(1, int(key_cardinality))
+
+    pool = np.array([f"{i:0{str_width}d}"[-str_width:] for i in range(min(key_cardinality, 100_000))], dtype=object)
+    value = rng.normal(100, 25, rows)
+    value[rng.random(rows) < null_ratio] = np.nan
+
+    fact = pd.DataFrame({
+        "id": np.arange(rows),
+        "key": rng.integers(0, key_cardinality, rows),
+        "category": pool[rng.integers(0, len(pool), rows)],
+        "value": value,
+        "amount": rng.integers(0, 1_000, rows),
+    })
+    dim = pd.DataFrame({
+        "key": np.arange(key_cardinality),
+        "label": pool[np.arange(key_cardinality) % len(pool)],
+    })
+    # Half-overlapping copy for set operations
+    fact_b = fact.iloc[rows // 2:].copy()
+    fact_b["id"] = fact_b["id"] + rows // 4
+    return {FACT: fact, FACT_B: fact_b, DIM: dim}
+
+
+def step_cases(tables):
+    fact, dim = tables[FACT], tables[DIM]
+    median_amount = int(fact["amount"].median())
+    first_key = int(fact["key"].iloc[0])
+    # Small typed-in tables, as the create-table forms would store them
+    new_rows = dim.head(1_000)
+    pasted = "\n".join(f"{key},{label}" for key, label in new_rows.itertuples(index=False))
+
+    missing = {"type": "Handle Missing Values", "table": FACT, "batch_mode": True,
+               "columns": ["value"], "dtype_strategies": {"numeric": "Fill with Median"},
+               "table_columns": fact.columns.tolist()}
+    # The form resolves the fill values up front; the SQL is generated from them
+    missing["fill_values"], missing["drop_columns"] = plan_missing_value_batch(fact, missing)
+
+    return {
+        "Filter Rows": {"type": "Filter Rows", "table": FACT, "column": "amount", "operator": ">",
+                        "expression": f"amount > {median_amount}"},
+        "Sort Rows": {"type": "Sort Rows", "table": FACT, "columns": ["key", "amount"], "ascending": True},
+        "Group By": {"type": "Group By", "table": FACT, "group_cols": ["key"],
+                     "aggregations": {"value": "mean", "amount": "sum"}, "having_conditions": []},
+        "Join Tables": {"type": "Join Tables", "left_table": FACT, "right_table": DIM, "join_type": "inner",
+                        "left_on": "key", "right_on": "key", "cast_to_str": True, "is_foreign_key_link": True},
+        "Set Operation": {"type": "Set Operation", "table1": FACT, "table2": FACT_B, "operation": "UNION"},
+        "Modify Column": {"type": "Modify Column", "table": FACT, "table1": FACT, "col1": "amount", "col1_table": FACT,
+                          "operator": "*", "rhs_mode": "Manual constant", "constant": "2", "alias": "amount_x2",
+                          "use_manual_expr": False, "expression": f"tables['{FACT}']['amount'] * 2"},
+        "Aggregate Column": {"type": "Aggregate Column", "table": FACT, "column": "value", "function": "mean",
+                             "alias": "mean_value"},
+        "Handle Missing Values": missing,
+        "Handle Missing Values (column)": {"type": "Handle Missing Values", "table": FACT, "column": "value",
+                                           "strategy": "Fill with Mean"},
+        "Semi Join": {"type": "Semi Join", "left_table": FACT, "right_table": FACT_B, "left_on": "id", "right_on": "id"},
+        "Anti Join": {"type": "Anti Join", "left_table": FACT, "right_table": FACT_B, "left_on": "id", "right_on": "id"},
+        "Deduplicate": {"type": "Deduplicate", "table": FACT, "subset": ["key", "category"], "keep": "first",
+                        "table_columns": list(fact.columns)},
+        "Window Function": {"type": "Window Function", "table": FACT, "function": "SUM", "column": "amount",
+                            "alias": "running_amount", "partition_by": ["key"], "order_by": ["id"], "ascending": True},
+        "INSERT": {"type": "INSERT", "table": FACT, "columns": list(fact.columns),
+                   "values": {"id": len(fact), "key": first_key, "category": "new", "value": 1.0, "amount": 1}},
+        "UPDATE": {"type": "UPDATE", "table": FACT, "condition_col": "key", "condition_val": first_key,
+                   "update_col": "amount", "new_value": 0},
+        "DELETE": {"type": "DELETE", "table": FACT, "condition_col": "key", "condition_val": first_key},
+        "Modify Table Structure": {"type": "Modify Table Structure", "table": FACT, "action": "Convert Data Types",
+                                   "dtype_dict": {"amount": "float"}},
+        "Create & Save New Table": {"type": "Create & Save New Table", "output_name": "new_table", "use_existing": True,
+                                    "base_table": FACT, "base_columns": ["id", "key"], "custom_columns": ["note"],
+                                    "rows": [["typed"]] * 100},
+        "Create Table with Primary Key": {"type": "Create Table with Primary Key", "output_name": "pk_table",
+                                          "columns": ["key", "label"], "dtypes": {"key": "INT", "label": "TEXT"},
+                                          "primary_key": "key", "data": pasted},
+        "Create New Table with Foreign Link": {"type": "Create New Table with Foreign Link", "output_name": "fk_table",
+                                               "columns": ["key", "label"], "dtypes": {"key": "int64", "label": "str"},
+                                               "data": new_rows.values.tolist()},
+    }
+
+
+def run_step(step, tables):
+    """apply_step's output, including a table the step only wrote back into the dict."""
+    dataframes = dict(tables)
+    result = apply_step(step, dataframes)
+    if isinstance(result, pd.DataFrame):
+        return result
+    created = [name for name in dataframes if name not in tables]
+    if created:
+        return dataframes[created[-1]]
+    if step.get("table") in dataframes:
+        # Changed in place
+        return dataframes[step["table"]]
+    raise RuntimeError(f"{step['type']} produced no output")
+
+
+def fresh_copies(tables):
+    return {name: df.copy() for name, df in tables.items()}
+
+
+def measure(fn, repeat, setup=None):
+    """Time `fn(setup())`; `setup` runs outside the timed region."""
+    times = []
+    peak = 0
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        # Cached fill statistics etc. would otherwise hide the real cost after the first run
+        streamlit.cache_data.clear()
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {"seconds": min(times), "median_seconds": statistics.median(times), "peak_mb": peak / 2**20}
+
+
+def run_benchmarks(sizes, cardinalities, null_ratios, widths, repeat, only=None):
+    results = {}
+    for rows in sizes:
+        for card in cardinalities:
+            key_cardinality = card * rows if card < 1 else card
+            for null_ratio in null_ratios:
+                for width in widths:
+                    tables = make_tables(rows, key_cardinality, null_ratio, width)
+                    params = f"rows={int(rows)}|card={card}|nulls={null_ratio}|width={width}"
+                    for name, step in step_cases(tables).items():
+                        if only and name not in only:
+                            continue
+                        # Steps that change their table in place get fresh copies, made outside the timing
+                        setup = (lambda: fresh_copies(tables)) if is_mutating(step) else (lambda: tables)
+                        results[f"{name}|{params}"] = measure(lambda t: run_step(dict(step), t), repeat, setup)
+                        # SQL is generated from the step as applied (apply fills in e.g. the batch SQL)
+                        applied = dict(step)
+                        run_step(applied, setup())
+                        results[f"SQL {name}|{params}"] = measure(lambda _: generate_sql_query_for_step(dict(applied)), repeat)
+                        print(f"  {name:<24} {params}  {results[f'{name}|{params}']['seconds']:.4f}s", file=sys.stderr)
+
+                    if not only or "SQL INSERT" in only:
+                        fact = tables[FACT]
+                        results[f"SQL INSERT render|{params}"] = measure(
+                            lambda _: sum(len(s) for s in iter_insert_batches("fact", fact, {"category": "str"})), repeat)
+    return results
+
+
+def uncovered_step_types():
+    cases = step_cases(make_tables(10, 2, 0.0, 4))
+    return [name for name in step_type_names() if not any(step["type"] == name for step in cases.values())]
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for case, current in sorted(results.items()):
+        base = baseline.get("results", {}).get(case)
+        if not base or base["seconds"] <= 0:
+            continue
+        ratio = current["seconds"] / base["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append((case, base["seconds"], current["seconds"], ratio))
+    return regressions
+
+
+def _float_list(values):
+    return [float(v) for v in values]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["1e4", "1e5", "1e6"], help="Row counts (1e4 .. 1e7)")
+    parser.add_argument("--cardinalities", nargs="+", default=["100", "0.1"],
+                        help="Distinct join/group keys: absolute (>=1) or a fraction of rows (<1)")
+    parser.add_argument("--null-ratios", nargs="+", default=["0.0", "0.2"])
+    parser.add_argument("--widths", nargs="+", default=["8", "64"], help="String column widths")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="Only these step types")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--save-baseline", help="Write results JSON as the new baseline")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown ratio before flagging")
+    args = parser.parse_args(argv)
+
+    missing = uncovered_step_types()
+    if missing:
+        print(f"⚠️ No benchmark case for: {', '.join(missing)}", file=sys.stderr)
+
+    results = run_benchmarks(
+        sizes=[int(float(s)) for s in args.sizes],
+        cardinalities=_float_list(args.cardinalities),
+        null_ratios=_float_list(args.null_ratios),
+        widths=[int(w) for w in args.widths],
+        repeat=args.repeat,
+        only=args.only,
+    )
+    payload = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for case, before, after, ratio in regressions:
+            print(f"❌ REGRESSION {case}: {before:.4f}s -> {after:.4f}s ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+import streamlit as st
+import pandas as pd
+import os
+
+from sql_steps import apply_step
+from runtime_filter import RuntimeFilter
+from grace_join import common_schema
+
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Steps whose output for a chunk only depends on that chunk
+ROW_LOCAL_STEPS = ["Filter Rows", "Modify Column", "Handle Missing Values"]
+# Joins that stream their left table against a right table held in memory
+LOOKUP_STEPS = ["Join Tables", "Semi Join", "Anti Join"]
+# Reductions that can be computed from per-chunk partials
+REDUCTION_STEPS = ["Aggregate Column"]
+
+CONSTANT_FILL_STRATEGIES = {"Fill with Custom Value", "Drop Rows", "Leave As Is"}
+
+
+def chunk_blocker(step):
+    """Return why a step can't run chunk-by-chunk, or None if it can."""
+    step_type = step.get("type")
+    if step_type not in ROW_LOCAL_STEPS + LOOKUP_STEPS + REDUCTION_STEPS:
+        return f"`{step_type}` needs the whole table in memory"
+
+    if step_type in LOOKUP_STEPS:
+        if step.get("right_table") == step.get("left_table"):
+            return "a join of the streamed table with itself needs the whole table"
+        if step_type == "Join Tables" and step.get("join_type") not in ["inner", "left"]:
+            return "only inner and left joins find every streamed row's matches within its chunk"
+
+    if step_type == "Modify Column" and not step.get("use_manual_expr", False):
+        other = step.get("col2_table")
+        if other and other != step.get("col1_table"):
+            return "Modify Column reads a column from another table"
+
+    if step_type == "Handle Missing Values":
+        if step.get("batch_mode"):
+            strategies = set(step.get("dtype_strategies", {}).values())
+        else:
+            strategies = {step.get("strategy")}
+        if not strategies <= CONSTANT_FILL_STRATEGIES:
+            return "mean/median/mode fills need statistics over the whole column"
+
+    if step_type == "Aggregate Column" and step.get("approximate"):
+        return "approximate mode samples the whole table — turn it off to stream exact partials"
+
+    if step_type == "Aggregate Column" and step.get("function") not in ["sum", "mean", "count", "min", "max"]:
+        return f"aggregate `{step.get('function')}` is not decomposable"
+
+    return None
+
+
+def iter_source_chunks(path, chunksize=DEFAULT_CHUNK_SIZE, predicate=None):
+    """Yield DataFrame record batches from a CSV or Parquet file.
+
+    A pyarrow `predicate` is pushed into Parquet reads, skipping row groups
+    whose statistics rule it out.
+    """
+    if path.lower().endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required to stream Parquet files")
+        if predicate is not None:
+            import pyarrow.dataset as ds
+            for batch in ds.dataset(path, format="parquet").to_batches(filter=predicate, batch_size=chunksize):
+                yield batch.to_pandas()
+            return
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def _bind_tables(step, chunk, tables=None):
+    # Every table a step refers to is the current chunk of the stream, except a join's right table
+    names = [step.get(k) for k in ["table", "table1", "col1_table", "col2_table", "left_table"]]
+    bound = {name: chunk for name in names if name}
+    if step.get("type") in LOOKUP_STEPS:
+        bound[step["right_table"]] = tables[step["right_table"]]
+    return bound
+
+
+def prepare_lookups(steps, tables):
+    """{step position: (right table, runtime filter or None)} for the join steps of a chunked run.
+
+    The right table is cast and its runtime filter built once, not per chunk.
+    """
+    lookups = {}
+    for i, step in enumerate(steps):
+        if step["type"] != "Join Tables":
+            continue
+        right = (tables or {}).get(step["right_table"])
+        if right is None:
+            raise ValueError(f"Join Tables needs `{step['right_table']}` loaded in memory as its right table")
+        if step.get("cast_to_str"):
+            right = right.assign(**{step["right_on"]: right[step["right_on"]].astype(str)})
+        runtime = None
+        # Only an inner join drops the streamed (left) rows that have no match
+        if step.get("runtime_filter") and step["join_type"] == "inner":
+            runtime = RuntimeFilter(right[step["right_on"]], bloom=step["runtime_filter"] == "bloom")
+        lookups[i] = (right, runtime)
+    return lookups
+
+
+def join_chunk(step, chunk, lookup):
+    """Join one chunk of the left table to the in-memory right table. Returns (rows, rows pruned)."""
+    right, runtime = lookup
+    left_on, right_on = step["left_on"], step["right_on"]
+    if step.get("cast_to_str"):
+        chunk = chunk.assign(**{left_on: chunk[left_on].astype(str)})
+    pruned = 0
+    if runtime is not None and runtime.usable_for(chunk[left_on]):
+        keep = runtime.mask(chunk[left_on])
+        pruned = len(chunk) - int(keep.sum())
+        chunk = chunk[keep]
+    return pd.merge(chunk, right, how=step["join_type"], left_on=left_on, right_on=right_on), pruned
+
+
+def pushdown_predicate(source_path, step, tables):
+    """Range of the first step's right-side keys as a Parquet read filter, or None.
+
+    Only steps that drop left rows without a match qualify: inner joins with a
+    runtime filter, and semi joins.
+    """
+    if not source_path.lower().endswith(".parquet") or step["type"] not in ["Join Tables", "Semi Join"]:
+        return None
+    if step["type"] == "Join Tables" and not (step.get("runtime_filter") and step["join_type"] == "inner"
+                                              and not step.get("cast_to_str")):
+        return None
+    right = (tables or {}).get(step["right_table"])
+    if right is None:
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        field_type = pq.read_schema(source_path).field(step["left_on"]).type
+    except (ImportError, KeyError):
+        return None
+    if not (pa.types.is_integer(field_type) or pa.types.is_floating(field_type)):
+        return None
+    keys = right[step["right_on"]]
+    if step["type"] == "Semi Join":
+        # A semi join never matches null keys
+        keys = keys.dropna()
+    return RuntimeFilter(keys, bloom=False).arrow_range(step["left_on"])
+
+
+def apply_row_local(step, chunk, tables=None):
+    if step["type"] == "Filter Rows":
+        return chunk.query(step["expression"])
+
+    if step["type"] == "Handle Missing Values":
+        if step.get("batch_mode"):
+            drop_cols = [c for c in step.get("drop_columns", []) if c in chunk.columns]
+            if drop_cols:
+                chunk = chunk.dropna(subset=drop_cols)
+            return chunk.fillna(value=step.get("fill_values", {}))
+        col = step["column"]
+        if step["strategy"] == "Drop Rows":
+            return chunk.dropna(subset=[col])
+        if step["strategy"] == "Fill with Custom Value":
+            return chunk.fillna(value={col: step.get("custom_value")})
+        return chunk
+
+    return apply_step(step, _bind_tables(step, chunk, tables))
+
+
+def partial_aggregate(step, chunk):
+    col = chunk[step["column"]]
+    func = step["function"]
+    if func == "mean":
+        return {"sum": col.sum(), "count": col.count()}
+    return {func: getattr(col, func)()}
+
+
+def combine_partials(func, partials):
+    if not partials:
+        return None
+    if func == "mean":
+        total = sum(p["sum"] for p in partials)
+        count = sum(p["count"] for p in partials)
+        return total / count if count else None
+    values = [p[func] for p in partials if not pd.isna(p[func])]
+    if func in ["sum", "count"]:
+        return sum(values)
+    if not values:
+        return None
+    return min(values) if func == "min" else max(values)
+
+
+def _write_chunk(df, path, output_format, state):
+    if output_format == "parquet":
+        import pyarrow as pa
+        from pyarrow import feather
+        # Chunks are kept apart until the end: a column that is all-null or int in the
+        # first chunk may hold strings or floats in a later one
+        parts = state.setdefault("parts", [])
+        part = f"{path}.part-{len(parts):05d}.arrow"
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), part)
+        parts.append(part)
+    else:
+        df.to_csv(path, mode="a" if state.get("started") else "w", header=not state.get("started"), index=False)
+    state["started"] = True
+
+
+def _finish_parquet(path, parts):
+    """Write the chunk files to one Parquet file, in a schema every chunk casts to."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import feather
+    schema = common_schema([pa.ipc.open_file(part).schema.remove_metadata() for part in parts])
+    with pq.ParquetWriter(path, schema) as writer:
+        for part in parts:
+            writer.write_table(feather.read_table(part).replace_schema_metadata(None).cast(schema))
+
+
+def run_chunked(source_path, steps, output_dir, chunksize=DEFAULT_CHUNK_SIZE, output_format="csv", output_name="chunked_output",
+                tables=None):
+    """Stream source_path through a chain of row-local steps with bounded memory.
+
+    Join steps read their right table from `tables`. An optional final
+    Aggregate Column step is answered from per-chunk partials; otherwise the
+    transformed rows are appended to a file in output_dir.
+    """
+    for step in steps:
+        reason = chunk_blocker(step)
+        if reason:
+            raise ValueError(f"Step `{step.get('type')}` can't run in chunked mode: {reason}")
+    if any(s["type"] in REDUCTION_STEPS for s in steps[:-1]):
+        raise ValueError("Aggregate Column can only be the last step of a chunked run")
+
+    reducer = steps[-1] if steps and steps[-1]["type"] in REDUCTION_STEPS else None
+    row_steps = steps[:-1] if reducer else steps
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"{output_name}.{output_format}")
+    state = {}
+    partials = []
+    rows_in = rows_out = chunks = pruned = 0
+    lookups = prepare_lookups(row_steps, tables)
+    predicate = pushdown_predicate(source_path, row_steps[0], tables) if row_steps else None
+
+    try:
+        for chunk in iter_source_chunks(source_path, chunksize, predicate):
+            chunks += 1
+            rows_in += len(chunk)
+            for i, step in enumerate(row_steps):
+                if i in lookups:
+                    chunk, dropped = join_chunk(step, chunk, lookups[i])
+                    pruned += dropped
+                    continue
+                chunk = apply_row_local(step, chunk, tables)
+                if chunk is None:
+                    raise ValueError(f"Step `{step['type']}` failed on chunk {chunks}")
+            rows_out += len(chunk)
+
+            if reducer:
+                partials.append(partial_aggregate(reducer, chunk))
+            elif len(chunk):
+                _write_chunk(chunk, output_path, output_format, state)
+        if state.get("parts"):
+            _finish_parquet(output_path, state["parts"])
+    finally:
+        for part in state.get("parts", []):
+            if os.path.exists(part):
+                os.remove(part)
+
+    if predicate is not None:
+        # Rows the Parquet reader skipped never reached a chunk
+        import pyarrow.parquet as pq
+        skipped = pq.ParquetFile(source_path).metadata.num_rows - rows_in
+        pruned += skipped
+        rows_in += skipped
+    summary = {"chunks": chunks, "rows_in": rows_in, "rows_out": rows_out, "pruned": pruned}
+    if reducer:
+        value = combine_partials(reducer["function"], partials)
+        summary["result"] = pd.DataFrame({reducer["alias"]: [value]})
+    else:
+        summary["output_path"] = output_path if state.get("started") else None
+    return summary
+
+
+def chunked_run_ui(steps, prefix="basic", tables=None):
+    with st.expander("🧱 Out-of-Core Chunked Run", expanded=False):
+        st.caption("Streams a file through Filter / Modify Column / constant fills and joins against loaded tables, "
+                   "with an optional final Aggregate Column, without loading it into memory.")
+
+        blockers = [(i, chunk_blocker(s)) for i, s in enumerate(steps)]
+        blockers = [(i, r) for i, r in blockers if r]
+        if not steps:
+            st.info("ℹ️ Add steps to the pipeline first.")
+            return
+        if blockers:
+            for i, reason in blockers:
+                st.warning(f"⚠️ Step {i+1}: {reason}")
+            return
+
+        first_table = steps[0].get("table") or steps[0].get("table1") or steps[0].get("left_table", "")
+        default_path = os.path.join(st.session_state.get("upload_folder", ""), first_table)
+        source_path = st.text_input("📄 Source file (CSV or Parquet)", value=default_path, key=f"{prefix}_chunked_source")
+        chunksize = st.number_input("Rows per chunk", min_value=1_000, value=DEFAULT_CHUNK_SIZE, step=10_000, key=f"{prefix}_chunked_size")
+        output_format = st.radio("Output format", ["csv", "parquet"], horizontal=True, key=f"{prefix}_chunked_format")
+
+        if st.button("▶️ Run Chunked", key=f"{prefix}_chunked_run"):
+            if not os.path.isfile(source_path):
+                st.error(f"❌ File not found: `{source_path}`")
+                return
+            output_dir = st.session_state.get(f"{prefix}_step_output_dir", os.path.abspath("sql_outputs"))
+            try:
+                with st.spinner("Streaming chunks..."):
+                    summary = run_chunked(source_path, steps, output_dir, int(chunksize), output_format, tables=tables)
+            except Exception as e:
+                st.error(f"❌ Chunked run failed: {e}")
+                return
+
+            st.success(f"✅ Processed {summary['rows_in']:,} rows in {summary['chunks']} chunk(s); {summary['rows_out']:,} rows kept.")
+            if summary["pruned"]:
+                st.caption(f"🧹 Runtime filter pruned {summary['pruned']:,} rows before joining.")
+            if "result" in summary:
+                st.dataframe(summary["result"])
+            elif summary["output_path"]:
+                st.caption(f"💾 Output written to `{summary['output_path']}`")
@@ -0,0 +1,117 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+TOP_K = 50
+HISTOGRAM_BINS = 20
+# k for the k-minimum-values distinct count sketch (~3% standard error)
+KMV_SIZE = 1024
+MAX_SEARCH_RESULTS = 100
+
+
+def approx_distinct(series):
+    """Estimate distinct non-null values from the k smallest 64-bit value hashes."""
+    hashes = pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy()
+    if len(hashes) <= 4 * KMV_SIZE:
+        return int(len(np.unique(hashes)))
+    smallest = np.unique(np.partition(hashes, 4 * KMV_SIZE)[:4 * KMV_SIZE])
+    if len(smallest) < KMV_SIZE:
+        # Heavy duplication: few enough distinct values to count exactly
+        return int(len(np.unique(hashes)))
+    kth = float(smallest[KMV_SIZE - 1]) / 2**64
+    return int(round((KMV_SIZE - 1) / kth))
+
+
+def column_profile(series):
+    values = series.dropna()
+    profile = {
+        "dtype": str(series.dtype),
+        "rows": int(len(series)),
+        "nulls": int(len(series) - len(values)),
+        "bytes": int(series.memory_usage(deep=True, index=False)),
+        "min": None,
+        "max": None,
+        "distinct": approx_distinct(series),
+        "top_values": [],
+        "top_counts": [],
+        "histogram": None,
+    }
+    if values.empty:
+        return profile
+
+    top = values.value_counts().head(TOP_K)
+    profile["top_values"] = top.index.tolist()
+    profile["top_counts"] = top.tolist()
+
+    orderable = pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)
+    if orderable and not pd.api.types.is_bool_dtype(series):
+        profile["min"], profile["max"] = values.min(), values.max()
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        counts, edges = np.histogram(values.to_numpy(dtype="float64"), bins=HISTOGRAM_BINS)
+        profile["histogram"] = {"counts": counts.tolist(), "edges": edges.tolist()}
+    return profile
+
+
+@st.cache_data(show_spinner="📊 Profiling columns...")
+def table_catalog(df):
+    """Statistics for every column of one table version, profiled in parallel."""
+    workers = min(len(df.columns), os.cpu_count() or 1) or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        profiles = pool.map(column_profile, (df[col] for col in df.columns))
+        return dict(zip(df.columns, profiles))
+
+
+@st.cache_data(show_spinner=False)
+def search_values(series, query, limit=MAX_SEARCH_RESULTS):
+    """Distinct values containing `query` (case-insensitive), without listing every value."""
+    text = series.dropna().astype(str)
+    matches = series.dropna()[text.str.contains(query, case=False, regex=False)]
+    return matches.drop_duplicates().head(limit).tolist()
+
+
+def value_picker(label, series, stats, key):
+    """Selectbox over the frequent values; a search box finds the rest."""
+    if stats["distinct"] <= TOP_K:
+        return st.selectbox(label, stats["top_values"], key=key)
+
+    query = st.text_input(f"🔎 Search {stats['distinct']:,} distinct values (≈)", key=f"{key}_search")
+    if query and series is not None:
+        options = search_values(series, query)
+        if not options:
+            st.caption("No matching values.")
+            return query
+        if len(options) == MAX_SEARCH_RESULTS:
+            st.caption(f"Showing the first {MAX_SEARCH_RESULTS} matches — refine the search to narrow down.")
+    else:
+        options = stats["top_values"]
+        st.caption(f"Showing the {len(options)} most frequent values.")
+    return st.selectbox(label, options, key=key)
+
+
+def catalog_frame(catalog):
+    rows = []
+    for col, stats in catalog.items():
+        rows.append({
+            "column": col,
+            "dtype": stats["dtype"],
+            "nulls": stats["nulls"],
+            "null %": 100 * stats["nulls"] / stats["rows"] if stats["rows"] else 0.0,
+            "≈ distinct": stats["distinct"],
+            "min": stats["min"],
+            "max": stats["max"],
+            "most frequent": stats["top_values"][0] if stats["top_values"] else None,
+        })
+    return pd.DataFrame(rows).set_index("column").astype({"min": str, "max": str, "most frequent": str})
+
+
+def render_catalog(name, df):
+    catalog = table_catalog(df)
+    st.dataframe(catalog_frame(catalog), use_container_width=True)
+    numeric = [col for col, stats in catalog.items() if stats["histogram"]]
+    if numeric:
+        col = st.selectbox("Histogram", numeric, key=f"catalog_hist_{name}")
+        hist = catalog[col]["histogram"]
+        st.bar_chart(pd.Series(hist["counts"], index=np.round(hist["edges"][:-1], 4), name=col))
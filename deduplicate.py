@@ -0,0 +1,50 @@
+import pandas as pd
+import numpy as np
+
+
+KEEP_OPTIONS = {"First occurrence": "first", "Last occurrence": "last", "None (drop every repeated row)": "none"}
+
+
+def fingerprints(df, columns):
+    """One 64-bit hash per row of `df[columns]`, computed column by column without building tuples."""
+    frame = df[columns]
+    floats = [col for col in columns if frame[col].dtype.kind == "f"]
+    if floats:
+        # 0.0 and -0.0 are equal values but different bit patterns
+        frame = frame.assign(**{col: frame[col] + 0.0 for col in floats})
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+def _same_rows(frame, positions, representatives):
+    """Whether each row at `positions` equals the row at the matching `representatives` (nulls equal)."""
+    for col in frame.columns:
+        a = frame[col].take(positions).reset_index(drop=True)
+        b = frame[col].take(representatives).reset_index(drop=True)
+        if not (a.eq(b).fillna(False) | (a.isna() & b.isna())).all():
+            return False
+    return True
+
+
+def duplicate_mask(df, subset=None, keep="first"):
+    """Boolean mask of the rows `df.drop_duplicates(subset, keep)` would drop (keep: first/last/none).
+
+    Rows are compared by fingerprint in a uint64 hash table; rows sharing a
+    fingerprint are then checked against the first of them, and a hash
+    collision falls back to pandas' exact comparison.
+    """
+    columns = list(subset) if subset else list(df.columns)
+    keep = False if keep == "none" else keep
+    if not len(df):
+        return np.zeros(0, dtype=bool)
+    codes, uniques = pd.factorize(fingerprints(df, columns))
+    if len(uniques) == len(df):
+        return np.zeros(len(df), dtype=bool)
+
+    codes = pd.Series(codes)
+    repeated = codes.duplicated(keep="first").to_numpy()
+    # factorize numbers fingerprints in order of first appearance, so the first rows are in code order
+    first_positions = np.flatnonzero(~repeated)
+    positions = np.flatnonzero(repeated)
+    if not _same_rows(df[columns], positions, first_positions[codes.to_numpy()[positions]]):
+        return df.duplicated(subset=columns, keep=keep).to_numpy()
+    return repeated if keep == "first" else codes.duplicated(keep=keep).to_numpy()
@@ -1,6 +1,17 @@
 import streamlit as st
 import os
 import pandas as pd
+from step_metrics import profile_toggle, render_profile, metrics_badge, pipeline_metrics_panel
+from pipeline_executor import execute_step
+from partial_rerun import scoped
+from step_registry import step_type_names, table_schemas, output_schema, form_tables
+from explain import explain_panel
+from memory_manager import managed_frames, discard_step_outputs, enforce_budget
+from step_output_store import persist_step_output, lazy_download_button, available_formats
+from background_runner import (
+    DEFAULT_SAMPLE_ROWS, DEFAULT_TIME_BUDGET_S, sample_tables, pipeline_fingerprints,
+    ensure_background_run, background_run_status
+)
 
 def dynamic_sql_pipeline_ui(prefix="dynamic"):
     
@@ -35,25 +46,35 @@ def dynamic_sql_pipeline_ui(prefix="dynamic"):
         return
     
 
-    # 💾 Store in session state so other steps/modules can access
-    st.session_state["step_output_dir"] = step_output_dir
+    # 💾 Store in session state so other steps/modules can access (one folder per tab)
+    st.session_state[f"{prefix}_step_output_dir"] = step_output_dir
+    output_format = st.sidebar.selectbox("💾 Step output format", available_formats(), key=f"{prefix}_output_format")
 
     # Step types
-    SQL_STEP_OPTIONS = [
-        "Filter Rows", "Sort Rows", "Group By", "Join Tables","Create Table with Primary Key",
-        "Aggregate Column", "Modify Column", "Create & Save New Table","INSERT", "UPDATE", "DELETE","Set Operation","Handle Missing Values","Modify Table Structure","Create New Table with Foreign Link"
-    ]
+    SQL_STEP_OPTIONS = step_type_names()
 
-    # Init pipeline and outputs
-    if "sql_pipeline" not in st.session_state:
-        st.session_state.sql_pipeline = []
-    if "sql_step_outputs" not in st.session_state:
-        st.session_state.sql_step_outputs = {}
+    # Init pipeline and outputs (each tab keeps its own)
+    pipeline = st.session_state.setdefault(f"{prefix}_sql_pipeline", [])
+    step_outputs = managed_frames(f"{prefix}_sql_step_outputs")
+    # Outputs of steps that no longer exist are garbage
+    discard_step_outputs(step_outputs, len(pipeline) + 1)
 
     dataframes = st.session_state.get("uploaded_tables", {})
     if not dataframes:
         st.warning("⚠️ Upload at least one dataset first.")
         return
+
+    # ⚡ Instant preview on a sample, full computation on a worker thread
+    run_key = f"{prefix}_background_run"
+    preview_mode = st.sidebar.checkbox("⚡ Preview on sample, full run in background", key=f"{prefix}_preview_mode")
+    if preview_mode:
+        sample_rows = st.sidebar.number_input("Preview sample rows", min_value=100, value=DEFAULT_SAMPLE_ROWS, step=1000, key=f"{prefix}_preview_rows")
+        time_budget = st.sidebar.number_input("Full run time budget (s)", min_value=5, value=DEFAULT_TIME_BUDGET_S, step=30, key=f"{prefix}_time_budget")
+        sample_cache = st.session_state.setdefault(f"{prefix}_sample_cache", {})
+        sampled_tables = sample_tables(dataframes, int(sample_rows), sample_cache)
+    elif st.session_state.get(run_key) is not None:
+        st.session_state.pop(run_key).cancel()
+
     st.markdown("### ➕ Select Step Type")
     # Arrange buttons in rows of 4 columns
     num_cols = 5
@@ -77,15 +98,43 @@ def dynamic_sql_pipeline_ui(prefix="dynamic"):
         for j, opt in enumerate(SQL_STEP_OPTIONS[i:i+num_cols]):
             with cols[j]:
                 if st.button(opt, key=f"{prefix}_step_btn_{opt}"):
-                    st.session_state.sql_pipeline.append({"type": opt})
-                    st.session_state.selected_step_index = len(st.session_state.sql_pipeline) - 1
+                    pipeline.append({"type": opt})
+                    st.session_state.selected_step_index = len(pipeline) - 1
                     st.rerun()
 
  
+    # 📈 Per-step instrumentation (previous run's badge shows on the expander)
+    trace_memory = st.sidebar.checkbox("📈 Track peak memory per step", value=False, key=f"{prefix}_trace_memory",
+                                       help="Traces Python allocations while each step runs; slows steps, and traced "
+                                            "steps of all sessions run one at a time.")
+
+    # ⚡ Editing a step reruns only this section; unchanged steps reuse their results
+    preview = None
+    if preview_mode:
+        preview = {"sampled_tables": sampled_tables, "run_key": run_key, "time_budget": int(time_budget)}
+    render_dynamic_steps(pipeline, step_outputs, dataframes, SQL_STEP_OPTIONS, step_output_dir, output_format,
+                         trace_memory, preview, prefix)
+
+    if preview_mode and pipeline:
+        background_run_status(run_key)
+
+
+@scoped
+def render_dynamic_steps(pipeline, step_outputs, dataframes, step_options, step_output_dir, output_format,
+                         trace_memory, preview=None, prefix="dynamic"):
+    background_run = st.session_state.get(preview["run_key"]) if preview is not None else None
+    last_metrics = st.session_state.get(f"{prefix}_step_metrics", {})
+    run_metrics = {}
+    # Forms render from propagated schemas, not from executed upstream outputs
+    schemas = table_schemas(dataframes)
+    # 🧭 Estimated cost of each step before anything runs; filled in once the forms below
+    # have updated the steps
+    plan = st.container()
+
     # Track outputs
-    for i, step in enumerate(st.session_state.sql_pipeline):
-        with st.expander(f"Step {i+1}: {step['type']}", expanded=True):
-            step_type = st.selectbox("Step Type", SQL_STEP_OPTIONS, index=SQL_STEP_OPTIONS.index(step["type"]), key=f"step_type_{i}")
+    for i, step in enumerate(pipeline):
+        with st.expander(f"Step {i+1}: {step['type']}  {metrics_badge(last_metrics.get(i))}", expanded=True):
+            step_type = st.selectbox("Step Type", step_options, index=step_options.index(step["type"]), key=f"step_type_{i}")
             step["type"] = step_type
 
             # --- Select input source (with emoji-labeled display names) ---
@@ -103,34 +152,85 @@ def dynamic_sql_pipeline_ui(prefix="dynamic"):
             step["input_source"] = actual_source_key
 
 
-            # --- Merge inputs for build form and apply step ---
-            available_data = dataframes.copy()
-            available_data.update(st.session_state.sql_step_outputs)
+            # --- Form inputs: uploads plus upstream schemas ---
+            upstream = {f"step_{j+1}": schemas[f"step_{j+1}"] for j in range(i) if f"step_{j+1}" in schemas}
+            # Only the input's rows, so spilled outputs of other steps stay on disk
+            upstream_outputs = {}
+            if actual_source_key in upstream and actual_source_key in step_outputs:
+                upstream_outputs[actual_source_key] = step_outputs[actual_source_key]
 
             # Form builder
-            from sql_steps import build_step_form, apply_step
-            build_step_form(i, step, available_data, prefix="dynamic")
+            from sql_steps import build_step_form
+            build_step_form(i, step, form_tables(step, dataframes, upstream, upstream_outputs), prefix="dynamic")
+            schema = output_schema(step, schemas)
+            if schema is not None:
+                schemas[f"step_{i+1}"] = schema
 
             # Actions
             col1, col2 = st.columns([1, 1])
             with col1:
                 if st.button("❌ Delete", key=f"dynamic_delete_{i}"):
-                    st.session_state.sql_pipeline.pop(i)
+                    pipeline.pop(i)
+                    discard_step_outputs(step_outputs, i + 1)
                     st.rerun()
 
             # --- Apply step using dynamic source ---
-            source_df = available_data.get(actual_source_key)
+            profile_on, use_sampler = profile_toggle(i, prefix)
+            profile = None
+
+            def run_step(source_df):
+                nonlocal profile
+                df, run_metrics[i], profile = execute_step(step, {actual_source_key: source_df}, prefix,
+                                                           trace_memory, profile_on, use_sampler)
+                return df
+
+            is_preview = False
+            if preview is not None:
+                fingerprint = pipeline_fingerprints(pipeline[:i+1], dataframes)[-1]
+                full_df = background_run.result_for(i, fingerprint) if background_run else None
+                if full_df is not None:
+                    source_df, df = full_df, full_df
+                else:
+                    source_df = step_outputs.get(actual_source_key, preview["sampled_tables"].get(actual_source_key))
+                    df = None
+                    if source_df is not None:
+                        df = run_step(source_df)
+                    is_preview = True
+            else:
+                source_df = step_outputs.get(actual_source_key, dataframes.get(actual_source_key))
+                df = None
+                if source_df is not None:
+                    df = run_step(source_df)
+
+            # Keep the session within its memory budget as results accumulate
+            enforce_budget(protect=[frame for frame in (source_df, df) if isinstance(frame, pd.DataFrame)])
+
+            if i in run_metrics:
+                st.caption(metrics_badge(run_metrics[i]))
+            if profile is not None:
+                render_profile(profile, i, prefix)
+
             if source_df is not None:
-                df = apply_step(step, {actual_source_key: source_df})
                 if df is not None:
                     st.markdown(f"#### 📄 Output of Step {i+1}")
+                    if is_preview:
+                        st.caption(f"👁️ Preview on a {len(source_df):,}-row sample — full result swaps in when ready")
                     st.dataframe(df)
                     step_key = f"step_{i+1}"
-                    st.session_state.sql_step_outputs[step_key] = df
+                    step_outputs[step_key] = df
+                    if is_preview:
+                        continue
+
+                    base_name = f"{step_key}_{step['type'].replace(' ', '_').lower()}"
+                    filepath, fingerprint = persist_step_output(df, step_output_dir, base_name, output_format)
+                    lazy_download_button(df, filepath, fingerprint, output_format,
+                                         f"⬇️ Download {step_key} Output", key=f"{prefix}_download_{i}")
+
+    st.session_state[f"{prefix}_step_metrics"] = run_metrics
+    pipeline_metrics_panel(run_metrics, prefix)
 
-                    filename = f"{step_key}_{step['type'].replace(' ', '_').lower()}.csv"
-                    filepath = os.path.join(step_output_dir, filename)
-                    df.to_csv(filepath, index=False)
+    with plan:
+        explain_panel(pipeline, dataframes, prefix=prefix)
 
-                    with open(filepath, "rb") as f:
-                        st.download_button(f"⬇️ Download {step_key} Output", f, file_name=filename)
+    if preview is not None and pipeline:
+        ensure_background_run(preview["run_key"], pipeline, dataframes, preview["time_budget"], step_output_dir)
@@ -0,0 +1,316 @@
+import streamlit as st
+import pandas as pd
+import math
+
+from column_stats import table_catalog
+from step_registry import table_schemas, output_schema
+from pipeline_executor import is_mutating
+from table_index import declared_keys
+from sort_order import RANGE_OPERATORS
+from approximate import DEFAULT_SAMPLE_ROWS
+from memory_manager import headroom_bytes
+from step_output_store import arrow_available
+
+
+# Rows above which a step is worth a warning
+LARGE_ROWS = 1_000_000
+# Output rows per input row beyond which a join looks like a cross product
+JOIN_BLOWUP = 10
+# Groups per input row beyond which a group-by barely reduces anything
+HIGH_GROUP_RATIO = 0.5
+DEFAULT_SELECTIVITY = {">": 1 / 3, "<": 1 / 3, ">=": 1 / 3, "<=": 1 / 3,
+                       "between": 1 / 4, "not between": 3 / 4, "contains": 1 / 10}
+# Bytes per value for computed columns, whose size isn't in any catalog
+NUMERIC_BYTES, OBJECT_BYTES = 8, 48
+
+
+def table_estimate(df):
+    """Planner view of a real table: rows and per-column statistics from the catalog."""
+    catalog = table_catalog(df)
+    rows = len(df)
+    return {
+        "rows": rows,
+        "columns": {
+            col: {
+                "distinct": max(stats["distinct"], 1),
+                "null_ratio": stats["nulls"] / rows if rows else 0.0,
+                "row_bytes": stats["bytes"] / rows if rows else NUMERIC_BYTES,
+                "range": (stats["min"], stats["max"]) if stats["histogram"] else None,
+            }
+            for col, stats in catalog.items()
+        },
+    }
+
+
+def _derive(source, rows, schema=None, renamed=None):
+    """Estimate for an output of `rows` rows whose columns follow `schema` (or `source`)."""
+    renamed = renamed or {}
+    columns = {}
+    names = list(schema.columns) if schema is not None else list(source["columns"])
+    for col in names:
+        origin = source["columns"].get(renamed.get(col, col)) if source else None
+        if origin is None:
+            numeric = schema is not None and pd.api.types.is_numeric_dtype(schema[col].dtype)
+            origin = {"distinct": rows, "null_ratio": 0.0, "row_bytes": NUMERIC_BYTES if numeric else OBJECT_BYTES, "range": None}
+        columns[col] = {**origin, "distinct": max(1, min(origin["distinct"], rows))}
+    return {"rows": rows, "columns": columns}
+
+
+def row_bytes(estimate):
+    return sum(c["row_bytes"] for c in estimate["columns"].values())
+
+
+def _distinct(estimate, col):
+    info = estimate["columns"].get(col)
+    return info["distinct"] if info else max(estimate["rows"], 1)
+
+
+def filter_selectivity(estimate, step):
+    col, op, value = step.get("column"), step.get("operator"), step.get("value")
+    info = estimate["columns"].get(col)
+    if op == "==":
+        return 1 / _distinct(estimate, col)
+    if op == "!=":
+        return 1 - 1 / _distinct(estimate, col)
+    # Range predicates: interpolate over [min, max] when the bounds are known
+    if info and info["range"] and op in ["<", "<=", ">", ">=", "between", "not between"]:
+        lo, hi = (float(v) for v in info["range"])
+        try:
+            if op in ["between", "not between"]:
+                low, high = (float(v) for v in value)
+                inside = (min(high, hi) - max(low, lo)) / (hi - lo) if hi > lo else 1.0
+                inside = min(max(inside, 0.0), 1.0)
+                return inside if op == "between" else 1 - inside
+            below = (float(value) - lo) / (hi - lo) if hi > lo else 0.5
+            below = min(max(below, 0.0), 1.0)
+            return below if op in ["<", "<="] else 1 - below
+        except (TypeError, ValueError):
+            pass
+    return DEFAULT_SELECTIVITY.get(op, 1 / 3)
+
+
+def _sorted_by(schemas, table):
+    schema = schemas.get(table)
+    return schema.attrs.get("sorted_by") if schema is not None else None
+
+
+def _sorted_on(schemas, table, column):
+    order = _sorted_by(schemas, table)
+    return bool(order) and order[0][0] == column and order[1]
+
+
+def _log_cost(n):
+    return n * math.log2(n) if n > 1 else n
+
+
+def explain_step(step, estimates, schemas):
+    """(estimate, strategy, cost, risks) for one step; estimate is None when it can't be planned."""
+    kind = step.get("type")
+    schema = output_schema(step, schemas)
+    risks = []
+
+    if kind in ["Filter Rows", "Sort Rows", "Group By", "Aggregate Column", "Modify Column", "INSERT", "UPDATE",
+                "DELETE", "Handle Missing Values", "Modify Table Structure", "Window Function", "Deduplicate"]:
+        source = estimates.get(step.get("table"))
+        if source is None:
+            return None, "not configured", 0, []
+        n = source["rows"]
+
+    if kind == "Filter Rows":
+        rows = n * filter_selectivity(source, step)
+        if step.get("operator") in RANGE_OPERATORS and _sorted_on(schemas, step.get("table"), step.get("column")):
+            return _derive(source, rows, schema), "binary search on sorted column (zero-copy slice)", math.log2(n + 1), risks
+        return _derive(source, rows, schema), "boolean mask scan (DataFrame.query)", n, risks
+
+    if kind == "Sort Rows":
+        order = _sorted_by(schemas, step.get("table"))
+        columns = tuple(step.get("columns", []))
+        if columns and order and order[1] == step.get("ascending", True) and order[0][:len(columns)] == columns:
+            return _derive(source, n, schema), "already sorted — skipped", 0, risks
+        if n > LARGE_ROWS and len(step.get("columns", [])) > 1:
+            risks.append(f"multi-key sort of {n:,.0f} rows")
+        return _derive(source, n, schema), f"sort_values on {', '.join(step.get('columns', [])) or '—'}", _log_cost(n), risks
+
+    if kind == "Group By":
+        group_cols = step.get("group_cols", [])
+        groups = 1
+        for col in group_cols:
+            groups *= _distinct(source, col)
+        groups = min(groups, n) if group_cols else 1
+        if n and groups / n > HIGH_GROUP_RATIO and n > 10_000:
+            risks.append(f"high-cardinality group-by: ≈{groups:,.0f} groups from {n:,.0f} rows")
+        if step.get("approximate"):
+            rows = min(n, step.get("sample_rows", DEFAULT_SAMPLE_ROWS))
+            sketch = n if "nunique" in step.get("aggregations", {}).values() else 0
+            return _derive(source, groups, schema), f"sampled hash aggregate ({rows:,.0f} rows)", rows + sketch + groups, risks
+        return _derive(source, groups, schema), "hash aggregate (groupby.agg)", n + groups, risks
+
+    if kind == "Join Tables":
+        left, right = estimates.get(step.get("left_table")), estimates.get(step.get("right_table"))
+        if left is None or right is None:
+            return None, "not configured", 0, []
+        nl, nr = left["rows"], right["rows"]
+        dl, dr = _distinct(left, step.get("left_on")), _distinct(right, step.get("right_on"))
+        if step.get("is_foreign_key_link"):
+            # The FK pre-filter keeps right rows whose key appears on the left
+            nr = nr * min(1.0, dl / dr)
+        matched = nl * nr / max(dl, dr, 1)
+        how = step.get("join_type", "inner")
+        rows = {"inner": matched, "left": max(matched, nl), "right": max(matched, nr),
+                "outer": max(matched, nl, nr)}.get(how, matched)
+        if rows > JOIN_BLOWUP * max(nl, nr, 1):
+            risks.append(f"cross-product join: ≈{rows:,.0f} rows from {nl:,.0f} × {nr:,.0f} "
+                         f"(only ≈{min(dl, dr):,.0f} distinct keys)")
+        estimate = _derive({"columns": {**right["columns"], **left["columns"]}}, rows, schema)
+        strategy = f"hash join ({how}), build on right"
+        if (how in ["inner", "left"] and not step.get("cast_to_str") and _sorted_on(schemas, step.get("left_table"), step.get("left_on"))
+                and _sorted_on(schemas, step.get("right_table"), step.get("right_on"))):
+            strategy = f"sort-merge join ({how}), both sides sorted on the keys"
+        if step.get("is_foreign_key_link"):
+            indexed = step.get("right_on") in declared_keys(step.get("right_table")) and not step.get("cast_to_str")
+            strategy += " + FK pre-filter" + (" (key index lookup)" if indexed else "")
+        if step.get("runtime_filter") and how in ["inner", "left", "right"]:
+            # Probe rows are hashed once against the other side's keys; unmatched ones skip the merge
+            strategy += f" + runtime {'Bloom' if step['runtime_filter'] == 'bloom' else 'min/max'} filter"
+        if step.get("cast_to_str"):
+            strategy += ", keys cast to str"
+        spill = step.get("spill_join", "auto")
+        if arrow_available() and (spill == "always" or (spill == "auto" and rows * row_bytes(estimate) > headroom_bytes())):
+            # Partitions are written once and read back once on top of the in-memory work
+            strategy = f"grace hash join ({how}), partitions spilled to disk"
+            return estimate, strategy, 2 * (nl + nr) + rows, risks
+        return estimate, strategy, nl + nr + rows, risks
+
+    if kind == "Window Function":
+        keys = tuple(step.get("partition_by", []) + step.get("order_by", []))
+        order = _sorted_by(schemas, step.get("table"))
+        presorted = bool(keys) and step.get("ascending", True) and bool(order) and order[1] and order[0][:len(keys)] == keys
+        if not keys or presorted:
+            return _derive(source, n, schema), "groupby transform over input order", n, risks
+        return _derive(source, n, schema), f"one sort on {', '.join(keys)} + groupby transform", _log_cost(n) + n, risks
+
+    if kind == "Deduplicate":
+        subset = step.get("subset") or list(source["columns"])
+        distinct = 1
+        for col in subset:
+            distinct *= _distinct(source, col)
+        rows = min(n, distinct)
+        if step.get("keep") == "none":
+            # Keys seen once, assuming copies spread evenly over the distinct keys
+            rows = n * math.exp(-n / max(distinct, 1))
+        return _derive(source, rows, schema), "64-bit row fingerprints in a uint64 hash set", n, risks
+
+    if kind in ["Semi Join", "Anti Join"]:
+        left, right = estimates.get(step.get("left_table")), estimates.get(step.get("right_table"))
+        if left is None or right is None:
+            return None, "not configured", 0, []
+        nl, nr = left["rows"], right["rows"]
+        # Share of left keys that appear on the right, assuming the smaller key set is contained in the larger
+        found = min(1.0, _distinct(right, step.get("right_on")) / _distinct(left, step.get("left_on")))
+        rows = nl * (found if kind == "Semi Join" else 1 - found)
+        return _derive(left, rows, schema), "hash-set probe of cached right keys", nl + nr, risks
+
+    if kind == "Aggregate Column":
+        if step.get("approximate"):
+            if step.get("function") == "nunique":
+                return _derive(source, 1, schema), "HyperLogLog sketch scan", n, risks
+            rows = min(n, step.get("sample_rows", DEFAULT_SAMPLE_ROWS))
+            return _derive(source, 1, schema), f"{step.get('function', 'sum')} over a {rows:,.0f}-row sample", rows, risks
+        return _derive(source, 1, schema), f"{step.get('function', 'sum')} scan", n, risks
+
+    if kind == "Set Operation":
+        a, b = estimates.get(step.get("table1")), estimates.get(step.get("table2"))
+        if a is None or b is None:
+            return None, "not configured", 0, []
+        op = step.get("operation")
+        rows = {"UNION ALL": a["rows"] + b["rows"], "INTERSECT": min(a["rows"], b["rows"]),
+                "EXCEPT": a["rows"]}.get(op, a["rows"] + b["rows"])
+        strategy = {"UNION": "concat + row-fingerprint dedup", "UNION ALL": "concat",
+                    "INTERSECT": "hash join on all columns", "EXCEPT": "outer join + indicator"}.get(op, op)
+        return _derive(a, rows, schema), strategy, a["rows"] + b["rows"] + rows, risks
+
+    if kind == "Handle Missing Values":
+        rows = n
+        if step.get("batch_mode"):
+            for col in step.get("drop_columns", []):
+                rows *= 1 - source["columns"].get(col, {}).get("null_ratio", 0.0)
+        elif step.get("strategy") == "Drop Rows":
+            rows *= 1 - source["columns"].get(step.get("column"), {}).get("null_ratio", 0.0)
+        return _derive(source, rows, schema), "fillna / dropna", n, risks
+
+    if kind in ["Modify Column", "INSERT", "UPDATE", "DELETE"]:
+        rows = n + 1 if kind == "INSERT" else n
+        if kind == "DELETE":
+            rows = n * (1 - 1 / _distinct(source, step.get("condition_col")))
+        strategy = "full column scan" if kind in ["UPDATE", "DELETE"] else "vectorized column expression"
+        cost = n
+        if kind in ["UPDATE", "DELETE"] and step.get("condition_col") in declared_keys(step.get("table")):
+            strategy = "hash index lookup on declared key"
+            cost = n / _distinct(source, step.get("condition_col")) if kind == "UPDATE" else n
+        return _derive(source, rows, schema), strategy, cost, risks
+
+    if kind == "Modify Table Structure":
+        renamed = {new: old for old, new in step.get("rename_dict", {}).items()} if step.get("action") == "Rename Columns" else {}
+        return _derive(source, n, schema, renamed), f"in-place {step.get('action', '').lower()}", n, risks
+
+    # Steps that build tables from typed-in rows
+    if schema is None:
+        return None, "not configured", 0, []
+    base = estimates.get(step.get("base_table")) if kind == "Create & Save New Table" and step.get("use_existing") else None
+    if base is not None:
+        rows = max(base["rows"], len(step.get("rows", [])))
+        # pandas may copy the base columns, so the whole result is costed
+        return _derive(base, rows, schema), "base columns + typed-in rows", rows, risks
+    data = step.get("rows") or step.get("data", "")
+    rows = len(data) if isinstance(data, list) else len(str(data).strip().splitlines())
+    return _derive(None, rows, schema), "build from entered rows", rows, risks
+
+
+def output_names(pipeline):
+    """Name each basic-pipeline step's output is read back by: its saved table, or the table it changes."""
+    return [step.get("output_name") or (step.get("table") if is_mutating(step) else None) or f"step_{i+1}"
+            for i, step in enumerate(pipeline)]
+
+
+def explain_pipeline(pipeline, tables, names=None):
+    estimates = {name: table_estimate(df) for name, df in tables.items()}
+    schemas = table_schemas(tables)
+    plan = []
+    for i, step in enumerate(pipeline):
+        name = names[i] if names else f"step_{i+1}"
+        estimate, strategy, cost, risks = explain_step(step, estimates, schemas)
+        schema = output_schema(step, schemas)
+        if estimate is not None:
+            estimates[name] = estimate
+        if schema is not None:
+            schemas[name] = schema
+        plan.append({
+            "step": i + 1,
+            "type": step.get("type"),
+            "output": name,
+            "strategy": strategy,
+            "est_rows": None if estimate is None else round(estimate["rows"]),
+            "est_mb": None if estimate is None else estimate["rows"] * row_bytes(estimate) / 2**20,
+            "cost": cost,
+            "risks": "; ".join(risks),
+        })
+    return pd.DataFrame(plan)
+
+
+def explain_panel(pipeline, tables, names=None, prefix="basic"):
+    if not pipeline:
+        return
+    with st.expander("🧭 EXPLAIN — estimated plan before running", expanded=False):
+        if not st.checkbox("Estimate costs from column statistics", key=f"{prefix}_explain"):
+            st.caption("Profiles the uploaded tables once per version, then estimates each step.")
+            return
+        plan = explain_pipeline(pipeline, tables, names)
+        total = plan["cost"].sum()
+        plan["cost %"] = 100 * plan["cost"] / total if total else 0.0
+        st.dataframe(plan.drop(columns=["cost"]).set_index("step")
+                     .style.format({"est_rows": "{:,.0f}", "est_mb": "{:,.1f}", "cost %": "{:.0f}%"}, na_rep="—"),
+                     use_container_width=True)
+        for row in plan.itertuples():
+            if row.risks:
+                st.warning(f"⚠️ Step {row.step} ({row.type}): {row.risks}")
+        st.caption("Estimates assume independent, uniformly distributed columns; distinct counts are approximate.")
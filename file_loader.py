@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 import os
 import io
+from column_stats import render_catalog
+from shared_tables import shared_table, file_key, upload_key
 
 def load_file(filename, file_obj):
     try:
@@ -26,7 +28,8 @@ def upload_data():
         if uploaded_files:
             st.session_state.upload_folder = os.path.abspath("sql_outputs")
             for file in uploaded_files:
-                df = load_file(file.name, file)
+                # Identical uploads in any session share one parsed, read-only frame
+                df = shared_table(file.name, upload_key(file), lambda: load_file(file.name, file))
                 if df is not None:
                     st.session_state.uploaded_tables[file.name] = df
 
@@ -44,7 +47,7 @@ def upload_data():
             else:
                 for fname in files:
                     fpath = os.path.join(folder_path, fname)
-                    df = load_file(fname, fpath)
+                    df = shared_table(fname, file_key(fpath), lambda: load_file(fname, fpath))
                     if df is not None:
                         st.session_state.uploaded_tables[fname] = df
                 st.sidebar.success(f"✅ Loaded {len(files)} files from folder.")
@@ -63,6 +66,8 @@ def show_file_info():
                 df.info(buf=buf)
                 st.code(buf.getvalue(), language="text")
                 st.dataframe(df)
+                if st.checkbox("📊 Column statistics", key=f"catalog_{name}"):
+                    render_catalog(name, df)
 
  
         return True
@@ -0,0 +1,171 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from memory_manager import SPILL_ROOT, session_id, frame_bytes, frame_token, headroom_bytes
+from table_index import key_set
+
+
+SPILL_MODES = {"Auto (when over the memory budget)": "auto", "Always": "always", "Never": "never"}
+MIN_PARTITIONS = 2
+MAX_PARTITIONS = 256
+# Bytes per output row for the merge's row indexers, on top of the row itself
+INDEXER_BYTES = 16
+
+
+class SpillUnsupported(Exception):
+    """The inputs can't be written as Arrow partitions (e.g. object columns mixing types)."""
+
+
+def output_name(step, left, right):
+    """File name for a spilled join: one per step config and pair of input frames."""
+    config = json.dumps({k: v for k, v in step.items() if k not in ["sql", "output_dir"]}, sort_keys=True, default=str)
+    digest = hashlib.sha1(f"{config}|{frame_token(left)}|{frame_token(right)}".encode()).hexdigest()[:12]
+    return f"join_{step['left_table']}_{step['right_table']}_{digest}.parquet"
+
+
+def estimate_join_bytes(left, right, how, left_on, right_on):
+    """Rough bytes pd.merge needs for its output: estimated rows × (left row + right row + indexers)."""
+    nl, nr = len(left), len(right)
+    dl, dr = len(key_set(left, left_on)), len(key_set(right, right_on))
+    matched = nl * nr / max(dl, dr, 1)
+    rows = {"inner": matched, "left": max(matched, nl), "right": max(matched, nr),
+            "outer": max(matched, nl + nr)}.get(how, matched)
+    width = frame_bytes(left) / max(nl, 1) + frame_bytes(right) / max(nr, 1)
+    return rows * (width + INDEXER_BYTES)
+
+
+def should_spill(mode, estimate):
+    if mode == "always":
+        return True
+    return mode == "auto" and estimate > headroom_bytes()
+
+
+def partition_count(estimate, headroom):
+    """Partitions so that one partition pair's join takes about a quarter of the headroom."""
+    target = max(headroom / 4, 64 * 2**20)
+    return int(np.clip(np.ceil(estimate / target), MIN_PARTITIONS, MAX_PARTITIONS))
+
+
+def _numeric(keys):
+    return keys.dtype.kind in "iufb"
+
+
+def _partition_codes(keys, partitions, as_float):
+    if as_float:
+        # merge matches 1 and 1.0 (and 0.0 and -0.0); hash them as the same float
+        keys = keys.astype("float64") + 0.0
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    return (hashes % np.uint64(partitions)).astype(np.intp)
+
+
+def _write_partitions(df, codes, partitions, directory, side):
+    """Write the rows of each partition code to an Arrow IPC file. Returns the paths."""
+    import pyarrow as pa
+    from pyarrow import feather
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(partitions + 1))
+    paths = []
+    for p in range(partitions):
+        path = os.path.join(directory, f"{side}-{p:04d}.arrow")
+        part = df.take(order[bounds[p]:bounds[p + 1]])
+        # Empty partitions are written too, so a left/outer join still sees the other side's columns
+        feather.write_feather(pa.Table.from_pandas(part, preserve_index=False), path)
+        paths.append(path)
+    return paths
+
+
+def join_partition(left_path, right_path, how, left_on, right_on, out_path):
+    """Join one partition pair (in this process or a worker) and write the rows to `out_path`."""
+    import pyarrow as pa
+    from pyarrow import feather
+    left = feather.read_table(left_path).to_pandas()
+    right = feather.read_table(right_path).to_pandas()
+    os.remove(left_path)
+    os.remove(right_path)
+    merged = pd.merge(left, right, how=how, left_on=left_on, right_on=right_on)
+    feather.write_feather(pa.Table.from_pandas(merged, preserve_index=False), out_path)
+    return len(merged)
+
+
+def common_schema(schemas):
+    """One schema every table of `schemas` casts to (all-null columns and int/float mixes resolved)."""
+    import pyarrow as pa
+    fields = []
+    for field in schemas[0]:
+        types = {schema.field(field.name).type for schema in schemas} - {pa.null()}
+        if len(types) > 1 and all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+            # Unmatched rows of a left/outer join turn integer columns into floats in some partitions
+            kind = pa.float64()
+        elif len(types) > 1:
+            kind = pa.string()
+        else:
+            kind = types.pop() if types else pa.null()
+        fields.append(pa.field(field.name, kind))
+    return pa.schema(fields)
+
+
+def grace_join(left, right, how, left_on, right_on, output_path, partitions, workers=1):
+    """pd.merge(left, right) as a grace hash join that streams its output to `output_path` (Parquet).
+
+    Both sides are hash-partitioned on their keys into Arrow files, so equal
+    keys land in the same partition pair; the pairs are joined one at a time
+    (or `workers` at a time in a process pool) and appended to the output.
+    Returns the number of output rows. Raises SpillUnsupported when pyarrow
+    can't convert the data, so the caller can join in memory instead.
+    """
+    import pyarrow as pa
+
+    directory = os.path.join(SPILL_ROOT, session_id(), "joins", uuid.uuid4().hex)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        return _grace_join(left, right, how, left_on, right_on, output_path, partitions, workers, directory)
+    except pa.ArrowException as e:
+        raise SpillUnsupported(str(e)) from e
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _grace_join(left, right, how, left_on, right_on, output_path, partitions, workers, directory):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import feather
+
+    as_float = (left[left_on].dtype != right[right_on].dtype and _numeric(left[left_on]) and _numeric(right[right_on])) \
+        or left[left_on].dtype.kind == "f" or right[right_on].dtype.kind == "f"
+    left_paths = _write_partitions(left, _partition_codes(left[left_on], partitions, as_float), partitions, directory, "left")
+    right_paths = _write_partitions(right, _partition_codes(right[right_on], partitions, as_float), partitions, directory, "right")
+    out_paths = [os.path.join(directory, f"out-{p:04d}.arrow") for p in range(partitions)]
+    jobs = list(zip(left_paths, right_paths, [how] * partitions, [left_on] * partitions, [right_on] * partitions, out_paths))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = sum(pool.map(join_partition, *zip(*jobs)))
+    else:
+        rows = sum(join_partition(*job) for job in jobs)
+
+    schema = common_schema([pa.ipc.open_file(path).schema.remove_metadata() for path in out_paths])
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    # Written under a temporary name, so a concurrent run of the same join never sees a partial file
+    tmp_path = f"{output_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for path in out_paths:
+                writer.write_table(feather.read_table(path).replace_schema_metadata(None).cast(schema))
+                os.remove(path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
+
+
+def read_join_output(path):
+    """Load a spilled join's output, releasing Arrow buffers as columns convert."""
+    import pyarrow.parquet as pq
+    return pq.read_table(path).to_pandas(self_destruct=True, split_blocks=True)
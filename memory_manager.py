@@ -0,0 +1,343 @@
+import streamlit as st
+import pandas as pd
+import itertools
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import MutableMapping
+
+from step_output_store import arrow_available
+from shared_tables import shared_share_bytes, shared_cache_report
+
+
+DEFAULT_SESSION_BUDGET_MB = 1024
+# Process-wide budget shared by every session on this server
+GLOBAL_BUDGET_MB = int(os.environ.get("VQ_GLOBAL_MEMORY_MB", 8192))
+SPILL_ROOT = os.path.join(tempfile.gettempdir(), "visual_query_spill")
+# A session that hasn't reported for this long no longer counts toward the global budget
+SESSION_TTL_S = 3600
+
+BUDGET_KEY = "memory_budget_mb"
+LAST_USED_KEY = "_frame_last_used"
+SIZES_KEY = "_frame_bytes"
+
+_tokens = {}            # id(frame) -> token, removed when the frame is collected
+_token_counter = itertools.count()
+_global_lock = threading.Lock()
+_session_usage = {}     # session id -> (resident bytes, reported at)
+
+
+# --- Frame identity --------------------------------------------------------
+
+def frame_token(df):
+    """Stable identity for a frame: unlike id(), never reused for a different frame,
+    and kept by a frame reloaded from spill."""
+    token = _tokens.get(id(df))
+    if token is None:
+        token = f"f{next(_token_counter)}"
+        _adopt(df, token)
+    return token
+
+
+def _adopt(df, token):
+    key = id(df)
+    _tokens[key] = token
+    try:
+        weakref.finalize(df, _forget_token, key, token)
+    except TypeError:
+        pass
+
+
+def _forget_token(key, token):
+    if _tokens.get(key) == token:
+        del _tokens[key]
+
+
+def session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else "local"
+    except Exception:
+        return "local"
+
+
+def frame_bytes(df):
+    sizes = st.session_state.setdefault(SIZES_KEY, {})
+    token = frame_token(df)
+    if token not in sizes:
+        sizes[token] = int(df.memory_usage(deep=True).sum())
+    return sizes[token]
+
+
+def touch(df):
+    st.session_state.setdefault(LAST_USED_KEY, {})[frame_token(df)] = time.monotonic()
+
+
+# --- Spilling --------------------------------------------------------------
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class SpilledFrame:
+    """A frame written to disk (Arrow IPC when pyarrow is installed); the file goes with the handle."""
+
+    def __init__(self, df, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.token = frame_token(df)
+        self.nbytes = frame_bytes(df)
+        self.path = self._write(df, os.path.join(directory, uuid.uuid4().hex))
+        self._loaded = None
+        weakref.finalize(self, _remove_file, self.path)
+
+    @staticmethod
+    def _write(df, base):
+        if arrow_available():
+            import pyarrow as pa
+            from pyarrow import feather
+            try:
+                # preserve_index keeps filtered/sorted row labels intact
+                feather.write_feather(pa.Table.from_pandas(df, preserve_index=True), base + ".arrow")
+                return base + ".arrow"
+            except (pa.ArrowException, TypeError, ValueError):
+                pass  # mixed-type object columns etc.
+        with open(base + ".pkl", "wb") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return base + ".pkl"
+
+    def disk_bytes(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def load(self):
+        # Several stores may hold this handle; they share one reloaded copy
+        df = self._loaded() if self._loaded is not None else None
+        if df is not None:
+            touch(df)
+            return df
+        if self.path.endswith(".arrow"):
+            from pyarrow import feather
+            df = feather.read_table(self.path).to_pandas()
+        else:
+            with open(self.path, "rb") as f:
+                df = pickle.load(f)
+        _adopt(df, self.token)
+        st.session_state.setdefault(SIZES_KEY, {})[self.token] = self.nbytes
+        self._loaded = weakref.ref(df)
+        touch(df)
+        return df
+
+
+def materialize(value):
+    """A frame, reloading it from disk first if it was spilled."""
+    return value.load() if isinstance(value, SpilledFrame) else value
+
+
+class ManagedFrames(MutableMapping):
+    """Dict of frames whose values may be spilled to disk and are reloaded on access."""
+
+    def __init__(self, initial=None):
+        self._items = {}
+        self.update(initial or {})
+
+    def __getitem__(self, key):
+        value = self._items[key]
+        if isinstance(value, SpilledFrame):
+            value = self._items[key] = value.load()
+        elif isinstance(value, pd.DataFrame):
+            touch(value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+        if isinstance(value, pd.DataFrame):
+            touch(value)
+
+    def __delitem__(self, key):
+        del self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def raw_values(self):
+        return list(self._items.values())
+
+    def replace(self, frame, handle):
+        for key, value in self._items.items():
+            if value is frame:
+                self._items[key] = handle
+
+
+def managed_frames(key):
+    """The ManagedFrames stored under `key` in session state (converting a plain dict)."""
+    current = st.session_state.get(key)
+    if not isinstance(current, ManagedFrames):
+        current = st.session_state[key] = ManagedFrames(current)
+    return current
+
+
+def discard_step_outputs(step_outputs, first_step):
+    """Drop outputs of step `first_step` (1-based) onwards, e.g. after a delete shifts the steps."""
+    for key in list(step_outputs):
+        if key.startswith("step_") and key[5:].isdigit() and int(key[5:]) >= first_step:
+            del step_outputs[key]
+
+
+# --- Budget enforcement ----------------------------------------------------
+
+def _stores():
+    from pipeline_executor import SHARED_RESULTS_KEY
+    stores = [value for value in st.session_state.values() if isinstance(value, ManagedFrames)]
+    return stores, st.session_state.get(SHARED_RESULTS_KEY, {})
+
+
+def _resident_frames():
+    """token -> frame for every spillable frame held in memory by this session."""
+    stores, results = _stores()
+    frames = {}
+    for store in stores:
+        for value in store.raw_values():
+            if isinstance(value, pd.DataFrame):
+                frames[frame_token(value)] = value
+    for entry in results.values():
+        if isinstance(entry["df"], pd.DataFrame):
+            frames[frame_token(entry["df"])] = entry["df"]
+    return frames
+
+
+def _spilled_handles():
+    stores, results = _stores()
+    handles = {}
+    for value in itertools.chain(*(store.raw_values() for store in stores), (e["df"] for e in results.values())):
+        if isinstance(value, SpilledFrame):
+            handles[value.path] = value
+    return list(handles.values())
+
+
+def _spill(frame, directory):
+    handle = SpilledFrame(frame, directory)
+    stores, results = _stores()
+    for store in stores:
+        store.replace(frame, handle)
+    for entry in results.values():
+        if entry["df"] is frame:
+            entry["df"] = handle
+        for name, written in entry["writes"].items():
+            if written is frame:
+                entry["writes"][name] = handle
+    return handle
+
+
+def pinned_tables():
+    return st.session_state.get("uploaded_tables", {})
+
+
+def memory_report():
+    resident = _resident_frames()
+    tables = pinned_tables()
+    table_tokens = {frame_token(df) for df in tables.values()}
+    # Tables from the shared cache count only this session's share
+    shares = {name: shared_share_bytes(df) for name, df in tables.items()}
+    return {
+        "tables_bytes": sum(frame_bytes(df) for name, df in tables.items() if shares[name] is None),
+        "shared_tables_bytes": sum(share for share in shares.values() if share is not None),
+        "resident_bytes": sum(frame_bytes(df) for token, df in resident.items() if token not in table_tokens),
+        "resident_frames": len(resident),
+        "spilled_bytes": sum(h.nbytes for h in _spilled_handles()),
+        "spilled_disk_bytes": sum(h.disk_bytes() for h in _spilled_handles()),
+    }
+
+
+def _report_usage(total_bytes):
+    now = time.monotonic()
+    with _global_lock:
+        _session_usage[session_id()] = (total_bytes, now)
+        for sid in [s for s, (_, at) in _session_usage.items() if now - at > SESSION_TTL_S]:
+            del _session_usage[sid]
+        return sum(used for used, _ in _session_usage.values())
+
+
+def session_budget_bytes(global_bytes, own_bytes):
+    budget = st.session_state.get(BUDGET_KEY, DEFAULT_SESSION_BUDGET_MB) * 2**20
+    global_budget = GLOBAL_BUDGET_MB * 2**20
+    if global_bytes > global_budget and global_bytes:
+        # Over the server-wide budget: every session shrinks to its proportional share
+        budget = min(budget, own_bytes * global_budget / global_bytes)
+    return budget
+
+
+def headroom_bytes():
+    """Bytes this session can still allocate before going over its budget (negative when over)."""
+    report = memory_report()
+    own = report["tables_bytes"] + report["shared_tables_bytes"] + report["resident_bytes"]
+    return session_budget_bytes(_report_usage(own), own) - own
+
+
+def enforce_budget(protect=()):
+    """Spill least-recently-used step outputs until this session fits its budget.
+
+    Uploaded tables stay resident (every step reads them by name) but count
+    toward the budget. Frames in `protect` (e.g. the step being shown) stay too.
+    """
+    report = memory_report()
+    own = report["tables_bytes"] + report["shared_tables_bytes"] + report["resident_bytes"]
+    budget = session_budget_bytes(_report_usage(own), own)
+    if own <= budget:
+        return 0
+
+    keep = {frame_token(df) for df in itertools.chain(pinned_tables().values(), protect)}
+    last_used = st.session_state.get(LAST_USED_KEY, {})
+    candidates = sorted((last_used.get(token, 0), token, df) for token, df in _resident_frames().items()
+                        if token not in keep)
+    directory = os.path.join(SPILL_ROOT, session_id(), "results")
+    spilled = 0
+    for _, _, df in candidates:
+        if own <= budget:
+            break
+        size = frame_bytes(df)
+        _spill(df, directory)
+        own -= size
+        spilled += 1
+    _report_usage(own)
+
+    # Forget bookkeeping for frames nothing references any more
+    live = set(_tokens.values()) | {handle.token for handle in _spilled_handles()}
+    for key in [LAST_USED_KEY, SIZES_KEY]:
+        book = st.session_state.get(key, {})
+        for token in [t for t in book if t not in live]:
+            del book[token]
+    return spilled
+
+
+def memory_panel():
+    with st.sidebar.expander("🧠 Memory", expanded=False):
+        st.number_input("Session budget (MB)", min_value=64, value=DEFAULT_SESSION_BUDGET_MB, step=256, key=BUDGET_KEY)
+        report = memory_report()
+        with _global_lock:
+            global_bytes = sum(used for used, _ in _session_usage.values())
+            sessions = len(_session_usage)
+        st.dataframe(pd.DataFrame({
+            "MB": [report["shared_tables_bytes"] / 2**20, report["tables_bytes"] / 2**20,
+                   report["resident_bytes"] / 2**20, report["spilled_bytes"] / 2**20,
+                   report["spilled_disk_bytes"] / 2**20, global_bytes / 2**20, GLOBAL_BUDGET_MB],
+        }, index=["shared tables (my share)", "private tables", "step results in RAM", "step results spilled",
+                  "spill files on disk", f"all sessions ({sessions})", "server budget"]).round(1))
+        shared = shared_cache_report()
+        if not shared.empty:
+            st.caption(f"🤝 Shared table cache: {shared['MB'].sum():,.1f} MB held once for all sessions")
+            st.dataframe(shared.set_index("table").round(1))
+        if st.button("💾 Spill all step results now", key="memory_spill_all"):
+            directory = os.path.join(SPILL_ROOT, session_id(), "results")
+            table_tokens = {frame_token(df) for df in pinned_tables().values()}
+            for token, df in _resident_frames().items():
+                if token not in table_tokens:
+                    _spill(df, directory)
+            st.rerun()
@@ -0,0 +1,79 @@
+import streamlit as st
+import pandas as pd
+import functools
+import time
+
+
+LATENCY_KEY = "_interaction_latency"
+FULL_RUN_KEY = "_full_run_started"
+MAX_LATENCY_SAMPLES = 200
+
+
+def fragments_supported():
+    return hasattr(st, "fragment")
+
+
+def partial_reruns_enabled():
+    return fragments_supported() and st.session_state.get("partial_reruns", True)
+
+
+def record_latency(kind, started):
+    samples = st.session_state.setdefault(LATENCY_KEY, [])
+    samples.append({"kind": kind, "ms": (time.perf_counter() - started) * 1000})
+    del samples[:-MAX_LATENCY_SAMPLES]
+
+
+def begin_full_run():
+    st.session_state[FULL_RUN_KEY] = time.perf_counter()
+
+
+def end_full_run():
+    started = st.session_state.pop(FULL_RUN_KEY, None)
+    if started is not None:
+        record_latency("full app rerun", started)
+
+
+def scoped(render):
+    """Make `render` a fragment: widget changes inside it rerun only that function.
+
+    The call is timed so fragment reruns can be compared against full-app reruns.
+    """
+    @functools.wraps(render)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            # During a full rerun the whole script is timed instead
+            if FULL_RUN_KEY not in st.session_state:
+                record_latency("fragment rerun", started)
+
+    as_fragment = st.fragment(timed) if fragments_supported() else timed
+
+    @functools.wraps(render)
+    def call(*args, **kwargs):
+        if partial_reruns_enabled():
+            return as_fragment(*args, **kwargs)
+        return timed(*args, **kwargs)
+
+    return call
+
+
+def latency_panel():
+    with st.sidebar.expander("⏱️ Interaction Latency", expanded=False):
+        if fragments_supported():
+            st.checkbox("⚡ Partial reruns (only the edited pipeline reruns)", value=True, key="partial_reruns")
+        else:
+            st.caption("Partial reruns need a Streamlit version with `st.fragment`.")
+
+        samples = st.session_state.get(LATENCY_KEY, [])
+        if not samples:
+            st.caption("No interactions recorded yet.")
+            return
+        df = pd.DataFrame(samples)
+        summary = df.groupby("kind")["ms"].agg(
+            runs="count", last_ms="last", mean_ms="mean", p95_ms=lambda s: s.quantile(0.95)
+        )
+        st.dataframe(summary.round(1))
+        if st.button("🧹 Reset", key="latency_reset"):
+            st.session_state[LATENCY_KEY] = []
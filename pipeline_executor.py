@@ -0,0 +1,136 @@
+import streamlit as st
+import pandas as pd
+import hashlib
+import json
+from collections import OrderedDict
+
+from step_metrics import instrumented_apply, profiled_apply, INPUT_KEYS
+from memory_manager import frame_token, materialize, touch
+from shared_tables import make_private, private_copy
+
+
+SHARED_RESULTS_KEY = "_shared_step_results"
+MAX_CACHED_RESULTS = 64
+
+# Keys apply_step writes back onto the step; they don't change what the step computes
+DERIVED_STEP_KEYS = {"sql", "sql_code", "sql_file"}
+# Keys only one tab sets, or that change where/how fast a step runs but not its result.
+# The Dynamic tab's `input_source` names the same frame the step's own table keys read,
+# and that frame is hashed by identity below.
+TAB_STEP_KEYS = {"input_source", "output_dir", "join_workers"}
+
+# Steps that modify their input tables in place; never cached, and they invalidate readers
+MUTATING_STEP_TYPES = {"INSERT", "UPDATE", "DELETE", "Modify Table Structure"}
+
+
+def _result_cache():
+    cache = st.session_state.get(SHARED_RESULTS_KEY)
+    if not isinstance(cache, OrderedDict):
+        cache = OrderedDict()
+        st.session_state[SHARED_RESULTS_KEY] = cache
+    return cache
+
+
+def begin_rerun():
+    """Call once at the top of each full script run."""
+    _result_cache()
+
+
+def is_mutating(step):
+    if step.get("type") == "Handle Missing Values":
+        return not step.get("batch_mode")
+    return step.get("type") in MUTATING_STEP_TYPES
+
+
+def _input_names(step, dataframes):
+    if step.get("use_manual_expr"):
+        # A manual expression can reach any table through `tables[...]`
+        return sorted(dataframes)
+    names = []
+    for key in INPUT_KEYS:
+        name = step.get(key)
+        if name in dataframes and name not in names:
+            names.append(name)
+    return names
+
+
+def execution_fingerprint(step, dataframes):
+    """Hash of what determines a step's result: its normalized config and the frames it reads.
+
+    The same step on the same tables fingerprints alike in the Basic and
+    Dynamic tabs, so either tab can reuse the other's result.
+    """
+    config = {k: v for k, v in step.items() if k not in DERIVED_STEP_KEYS | TAB_STEP_KEYS}
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode())
+    for name in _input_names(step, dataframes):
+        df = dataframes[name]
+        digest.update(f"{name}:{frame_token(df)}:{df.shape}".encode())
+    return digest.hexdigest()
+
+
+def _is_cached(df, cache):
+    return any(entry["df"] is df or any(frame is df for frame in entry["writes"].values())
+               for entry in cache.values())
+
+
+def invalidate_tables(names):
+    """Drop cached results that read any of these tables."""
+    cache = _result_cache()
+    for key in [k for k, entry in cache.items() if set(entry["inputs"]) & set(names)]:
+        del cache[key]
+
+
+def execute_step(step, dataframes, owner="basic", trace_memory=False, profile=False, sampler=False):
+    """Run a step, reusing the result when neither its config nor its inputs changed.
+
+    Results are shared by both pipeline tabs and survive fragment reruns, so
+    editing step k only re-executes step k and the steps that consume its output.
+    Returns (df, metrics, profile). Writes a step makes into `dataframes`
+    (new or replaced tables) are replayed for later callers that hit the cache.
+    """
+    st.session_state["step_output_dir"] = st.session_state.get(f"{owner}_step_output_dir", st.session_state.get("step_output_dir"))
+
+    cache = _result_cache()
+    mutating = is_mutating(step)
+    names = _input_names(step, dataframes)
+    key = execution_fingerprint(step, dataframes)
+    hit = None if mutating else cache.get(key)
+    if hit is not None:
+        cache.move_to_end(key)
+        metrics, profile_result = {**hit["metrics"], "shared": True}, None
+        if profile:
+            # Profile a fresh run, but keep handing out the cached frames: later steps
+            # fingerprint their inputs by identity and would all re-execute otherwise
+            _, metrics, profile_result = profiled_apply(step, dict(dataframes), trace_memory, sampler)
+        # Results the memory manager spilled to disk are reloaded transparently
+        hit["df"] = materialize(hit["df"])
+        hit["writes"] = {name: materialize(frame) for name, frame in hit["writes"].items()}
+        dataframes.update(hit["writes"])
+        if hit["df"] is not None:
+            touch(hit["df"])
+        return hit["df"], metrics, profile_result
+
+    if mutating:
+        # Copy-on-write: never mutate a table other sessions share, nor a result
+        # cached for the next rerun (it would come back already mutated)
+        make_private(dataframes, names)
+        for name in names:
+            if _is_cached(dataframes[name], cache):
+                dataframes[name] = private_copy(dataframes[name])
+    before = dict(dataframes)
+    if profile:
+        df, metrics, profile_result = profiled_apply(step, dataframes, trace_memory, sampler)
+    else:
+        df, metrics = instrumented_apply(step, dataframes, trace_memory)
+        profile_result = None
+    writes = {name: frame for name, frame in dataframes.items() if before.get(name) is not frame}
+
+    if mutating:
+        invalidate_tables(names + list(writes))
+    else:
+        cache[key] = {"df": df, "metrics": metrics, "writes": writes, "inputs": names}
+        if isinstance(df, pd.DataFrame):
+            touch(df)
+        while len(cache) > MAX_CACHED_RESULTS:
+            cache.popitem(last=False)
+    return df, metrics, profile_result
@@ -0,0 +1,226 @@
+"""Run a saved pipeline without Streamlit.
+
+    python run_pipeline.py pipeline.json data/folder_a data/folder_b -o runs --jobs 4
+
+Each input folder's CSV/XLSX files become the pipeline's tables; step outputs,
+the chained SQL and per-step timings are written to <output>/<folder name>/.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+
+PIPELINE_FORMAT_VERSION = 1
+
+log = logging.getLogger("visual_query.headless")
+
+
+class _SessionState(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class HeadlessStreamlit:
+    """Stand-in for the `st` module: display calls become no-ops, messages go to the log."""
+
+    def __init__(self):
+        self.session_state = _SessionState()
+        self.sidebar = self
+
+    def error(self, msg, *args, **kwargs):
+        log.error(msg)
+
+    def warning(self, msg, *args, **kwargs):
+        log.warning(msg)
+
+    def info(self, msg, *args, **kwargs):
+        log.info(msg)
+
+    def success(self, msg, *args, **kwargs):
+        log.info(msg)
+
+    def __getattr__(self, name):
+        def _noop(*args, **kwargs):
+            return None
+        return _noop
+
+
+# Every module apply_step and the SQL generator can reach that talks to `st`
+STEP_MODULES = (
+    "sql_steps", "sql_generator", "file_loader", "approximate", "table_index", "shared_tables",
+    "memory_manager", "step_output_store", "pipeline_executor", "column_stats", "explain",
+    "chunked_executor", "step_metrics",
+)
+
+
+def strip_ui():
+    """Point the step modules at the headless `st` so apply_step runs without a script context."""
+    headless = HeadlessStreamlit()
+    for name in STEP_MODULES:
+        importlib.import_module(name).st = headless
+    return headless
+
+
+def _to_jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, tuple):
+        return list(value)
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict(orient="records")
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    return str(value)
+
+
+def pipeline_to_json(steps):
+    mode = "dynamic" if any("input_source" in step for step in steps) else "basic"
+    payload = {"version": PIPELINE_FORMAT_VERSION, "mode": mode, "steps": steps}
+    return json.dumps(payload, indent=2, default=_to_jsonable)
+
+
+def parse_pipeline(text, filename="pipeline.json"):
+    if filename.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required to read YAML pipeline files")
+        payload = yaml.safe_load(text)
+    else:
+        payload = json.loads(text)
+
+    if isinstance(payload, list):
+        payload = {"steps": payload}
+    if payload.get("version", PIPELINE_FORMAT_VERSION) > PIPELINE_FORMAT_VERSION:
+        raise ValueError(f"Pipeline file version {payload['version']} is newer than this runner supports")
+    return payload
+
+
+def load_pipeline_file(path):
+    with open(path, encoding="utf-8") as f:
+        return parse_pipeline(f.read(), path)
+
+
+def load_folder_tables(folder):
+    from file_loader import load_file
+
+    tables = {}
+    for fname in sorted(os.listdir(folder)):
+        if fname.lower().endswith((".csv", ".xlsx")):
+            df = load_file(fname, os.path.join(folder, fname))
+            if df is not None:
+                tables[fname] = df
+    return tables
+
+
+def run_pipeline(steps, tables, output_dir, output_format="csv"):
+    """Execute steps against tables and write outputs; returns per-step timings."""
+    from sql_generator import chain_sql_steps, generate_sql_query_for_step
+    from sql_steps import apply_step
+    from step_output_store import serialize_frame, OUTPUT_FORMATS
+
+    st = strip_ui()
+    step_output_dir = os.path.join(output_dir, "step_outputs")
+    os.makedirs(step_output_dir, exist_ok=True)
+    st.session_state["step_output_dir"] = step_output_dir
+
+    outputs = {}
+    timings = []
+    sql_list = []
+    for i, step in enumerate(steps):
+        start = time.perf_counter()
+        if "input_source" in step:
+            # Dynamic pipeline: chained on an uploaded table or a previous step's output
+            source_key = step["input_source"]
+            source_df = outputs.get(source_key, tables.get(source_key))
+            df = apply_step(step, {source_key: source_df}) if source_df is not None else None
+        else:
+            df = apply_step(step, tables)
+        elapsed = time.perf_counter() - start
+
+        step_key = f"step_{i+1}"
+        timing = {"step": i + 1, "type": step.get("type"), "seconds": round(elapsed, 6),
+                  "rows_out": None if df is None else int(len(df))}
+        if df is not None:
+            outputs[step_key] = df
+            base_name = f"{step_key}_{step['type'].replace(' ', '_').lower()}"
+            serialize_frame(df, os.path.join(step_output_dir, base_name + OUTPUT_FORMATS[output_format][0]), output_format)
+        timings.append(timing)
+
+        try:
+            sql = generate_sql_query_for_step(step)
+        except Exception as e:
+            sql = f"-- Error generating SQL: {e}"
+        sql_list.append(sql or f"-- No SQL for {step.get('type')}")
+
+    if sql_list:
+        with open(os.path.join(output_dir, "pipeline.sql"), "w", encoding="utf-8") as f:
+            f.write(chain_sql_steps(sql_list) + "\n")
+    with open(os.path.join(output_dir, "timings.json"), "w", encoding="utf-8") as f:
+        json.dump(timings, f, indent=2)
+    return timings
+
+
+def run_folder(pipeline, folder, output_root, output_format="csv"):
+    strip_ui()
+    tables = load_folder_tables(folder)
+    if not tables:
+        raise ValueError(f"No CSV or Excel files found in {folder}")
+    output_dir = os.path.join(output_root, os.path.basename(os.path.normpath(folder)))
+    os.makedirs(output_dir, exist_ok=True)
+    return run_pipeline(pipeline["steps"], tables, output_dir, output_format)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a saved Visual Query pipeline over input folders.")
+    parser.add_argument("pipeline", help="Pipeline file (.json, .yaml or .yml)")
+    parser.add_argument("folders", nargs="+", help="Input folders containing CSV/XLSX files")
+    parser.add_argument("-o", "--output", default="sql_outputs/batch", help="Output root folder")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Parallel worker processes")
+    parser.add_argument("--format", choices=["csv", "parquet", "feather"], default="csv", help="Step output format")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    pipeline = load_pipeline_file(args.pipeline)
+    folders = [f for f in args.folders if os.path.isdir(f)]
+    for missing in sorted(set(args.folders) - set(folders)):
+        print(f"⚠️ Skipping {missing}: not a folder", file=sys.stderr)
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs or 1, len(folders) or 1))) as pool:
+        futures = {pool.submit(run_folder, pipeline, folder, args.output, args.format): folder for folder in folders}
+        for future in as_completed(futures):
+            folder = futures[future]
+            try:
+                timings = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"❌ {folder}: {e}", file=sys.stderr)
+                continue
+            total = sum(t["seconds"] for t in timings)
+            print(f"✅ {folder} ({total:.3f}s)")
+            for t in timings:
+                print(f"   step {t['step']:>2} {t['type']:<35} {t['seconds']:>10.3f}s  rows_out={t['rows_out']}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import pandas as pd
+import numpy as np
+import math
+
+from sort_order import keep_order
+
+
+RUNTIME_FILTER_MODES = {"Off": None, "Bloom filter + min/max": "bloom", "Min/max range only": "range"}
+BLOOM_FPP = 0.01
+# Kinds whose min/max bound can be compared against the other side's keys
+RANGE_KINDS = "iufM"
+# Kinds pandas' merge compares by numeric value, across dtypes
+NUMERIC_KINDS = "iuf"
+
+
+def _hashable(keys):
+    """Whether equal keys hash equally: object columns only when every value is a string."""
+    return keys.dtype != object or pd.api.types.infer_dtype(keys, skipna=True) in ["string", "empty"]
+
+
+def _hashes(values):
+    """Two 32-bit hashes per value for double hashing, from one vectorized 64-bit hash."""
+    values = pd.Series(values)
+    if values.dtype.kind in NUMERIC_KINDS:
+        # merge matches 1 and 1.0 (and 0.0 and -0.0); hash them as the same float
+        values = values.astype("float64") + 0.0
+    h = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return h & np.uint64(0xFFFFFFFF), (h >> np.uint64(32)) | np.uint64(1)
+
+
+class RuntimeFilter:
+    """A join's build-side keys summarized as a min/max range and an optional Bloom filter.
+
+    `mask` keeps every probe row that may have a match (false positives are
+    removed by the join itself) and drops rows that certainly have none.
+    """
+
+    def __init__(self, keys, bloom=True, fpp=BLOOM_FPP):
+        valid = keys.dropna()
+        # pandas' merge pairs null keys with each other, so nulls survive if the build side has any
+        self.has_nulls = len(valid) < len(keys)
+        self.dtype = keys.dtype
+        self.range = None
+        if len(valid) and keys.dtype.kind in RANGE_KINDS:
+            self.range = (valid.min(), valid.max())
+        self.bits = None
+        if bloom and _hashable(valid):
+            distinct = valid.unique()
+            n = max(len(distinct), 1)
+            m = max(64, int(math.ceil(-n * math.log(fpp) / math.log(2) ** 2)))
+            self.k = max(1, int(round(m / n * math.log(2))))
+            self.bits = np.zeros(m, dtype=bool)
+            h1, h2 = _hashes(distinct)
+            for i in range(self.k):
+                self.bits[(h1 + np.uint64(i) * h2) % np.uint64(m)] = True
+        self.empty_build = len(valid) == 0
+
+    def _same_keys(self, probe_keys):
+        return probe_keys.dtype == self.dtype or (probe_keys.dtype.kind in NUMERIC_KINDS and
+                                                  self.dtype.kind in NUMERIC_KINDS)
+
+    def _comparable(self, probe_keys):
+        return self.range is not None and self._same_keys(probe_keys)
+
+    def _probeable(self, probe_keys):
+        return self.bits is not None and self._same_keys(probe_keys) and _hashable(probe_keys)
+
+    def usable_for(self, probe_keys):
+        """Whether this filter can prune keys like `probe_keys` (pruning nothing is not a failure)."""
+        return self.empty_build or self._comparable(probe_keys) or self._probeable(probe_keys)
+
+    def mask(self, probe_keys):
+        valid = probe_keys.notna().to_numpy()
+        keep = valid.copy()
+        if self.empty_build:
+            keep[:] = False
+        if self._comparable(probe_keys):
+            low, high = self.range
+            keep &= ((probe_keys >= low) & (probe_keys <= high)).to_numpy()
+        if keep.any() and self._probeable(probe_keys):
+            # Probe only rows the range kept
+            h1, h2 = _hashes(probe_keys[keep].to_numpy())
+            hit = np.ones(len(h1), dtype=bool)
+            m = np.uint64(len(self.bits))
+            for i in range(self.k):
+                hit &= self.bits[(h1 + np.uint64(i) * h2) % m]
+            keep[keep] = hit
+        keep[~valid] = self.has_nulls
+        return keep
+
+    def arrow_range(self, column):
+        """The range as a pyarrow dataset filter expression, for pruning Parquet row groups."""
+        if self.range is None or self.dtype.kind not in "iuf" or self.has_nulls:
+            return None
+        import pyarrow.dataset as ds
+        low, high = (v.item() if hasattr(v, "item") else v for v in self.range)
+        return (ds.field(column) >= low) & (ds.field(column) <= high)
+
+
+def prune_join_inputs(left, right, left_on, right_on, how, mode):
+    """Drop rows of the larger prunable side whose key can't match the other side.
+
+    Only a side whose unmatched rows the join discards can be pruned: either
+    side of an inner join, the right of a left join, the left of a right join.
+    Returns (left, right, report) where report is None or (side, pruned, rows).
+    """
+    sides = {"inner": ["left", "right"], "left": ["right"], "right": ["left"]}.get(how, [])
+    if not mode or not sides:
+        return left, right, None
+    frames = {"left": (left, left_on), "right": (right, right_on)}
+    probe_side = max(sides, key=lambda side: len(frames[side][0]))
+    build_side = "right" if probe_side == "left" else "left"
+    probe, probe_on = frames[probe_side]
+    build, build_on = frames[build_side]
+
+    runtime = RuntimeFilter(build[build_on], bloom=mode == "bloom")
+    if not runtime.usable_for(probe[probe_on]):
+        return left, right, None
+    keep = runtime.mask(probe[probe_on])
+    if keep.all():
+        return left, right, (probe_side, 0, len(probe))
+    pruned = probe[keep]
+    keep_order(probe, pruned)
+    report = (probe_side, len(probe) - len(pruned), len(probe))
+    return (pruned, right, report) if probe_side == "left" else (left, pruned, report)
@@ -0,0 +1,169 @@
+import streamlit as st
+import pandas as pd
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+
+# Idle (unreferenced) tables are kept for reuse until the cache exceeds this
+SHARED_CACHE_MB = int(os.environ.get("VQ_SHARED_TABLE_CACHE_MB", 4096))
+LEASES_KEY = "_table_leases"
+DIGESTS_KEY = "_upload_digests"
+
+# Re-entrant: a session's leases can be finalized by garbage collection while the lock is held
+_lock = threading.RLock()
+_key_locks = defaultdict(threading.Lock)
+_entries = {}   # key -> {"df", "bytes", "refs": {session ids}, "last_used"}
+_views = weakref.WeakValueDictionary()   # id -> frame aliasing another table's memory
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return ("file", os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def upload_key(uploaded_file):
+    """Content hash of an uploaded file, computed once per upload in this session."""
+    digests = st.session_state.setdefault(DIGESTS_KEY, {})
+    ident = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, "file_id", None))
+    if ident not in digests:
+        digests[ident] = hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+    return ("upload", digests[ident])
+
+
+class _Leases:
+    """This session's table name -> shared cache key; released when the session goes away."""
+
+    def __init__(self, session):
+        self.session = session
+        self.keys = {}
+        weakref.finalize(self, _release_all, session, self.keys)
+
+
+def _release_all(session, keys):
+    for key in list(keys.values()):
+        release(key, session)
+
+
+def _leases():
+    from memory_manager import session_id
+    leases = st.session_state.get(LEASES_KEY)
+    if leases is None:
+        leases = st.session_state[LEASES_KEY] = _Leases(session_id())
+    return leases
+
+
+def release(key, session):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return
+        entry["refs"].discard(session)
+        entry["last_used"] = time.monotonic()
+    _evict_idle()
+
+
+def _evict_idle():
+    with _lock:
+        total = sum(entry["bytes"] for entry in _entries.values())
+        idle = sorted((entry["last_used"], key) for key, entry in _entries.items() if not entry["refs"])
+        for _, key in idle:
+            if total <= SHARED_CACHE_MB * 2**20:
+                break
+            total -= _entries.pop(key)["bytes"]
+        # A file that changed on disk won't be asked for under its old key again
+        current = {}
+        for key in _entries:
+            if key[0] == "file":
+                current.setdefault(key[1], []).append(key)
+        for versions in current.values():
+            for key in sorted(versions, key=lambda k: k[2])[:-1]:
+                if not _entries[key]["refs"]:
+                    del _entries[key]
+
+
+def shared_table(name, key, loader):
+    """The process-wide read-only frame for `key`, parsed by `loader` only on first use.
+
+    Concurrent sessions asking for the same key wait for one parse. The session
+    holds a reference under `name` until it loads something else by that name.
+    """
+    leases = _leases()
+    with _lock:
+        key_lock = _key_locks[key]
+    with key_lock:
+        with _lock:
+            entry = _entries.get(key)
+        if entry is None:
+            df = loader()
+            if df is None:
+                return None
+            entry = {"df": df, "bytes": int(df.memory_usage(deep=True).sum()), "refs": set(),
+                     "last_used": time.monotonic()}
+            with _lock:
+                _entries[key] = entry
+
+    with _lock:
+        entry["refs"].add(leases.session)
+        entry["last_used"] = time.monotonic()
+    previous = leases.keys.get(name)
+    leases.keys[name] = key
+    if previous is not None and previous != key and previous not in leases.keys.values():
+        release(previous, leases.session)
+    _evict_idle()
+    return entry["df"]
+
+
+def register_view(df):
+    """Mark a frame that references another table's memory without copying it."""
+    _views[id(df)] = df
+
+
+def is_shared(df):
+    if _views.get(id(df)) is df:
+        return True
+    with _lock:
+        return any(entry["df"] is df for entry in _entries.values())
+
+
+def copy_if_shared(df):
+    """Copy-on-write: a private copy to mutate if `df` is shared (or a view of a table), else `df` itself."""
+    if not (isinstance(df, pd.DataFrame) and is_shared(df)):
+        return df
+    return private_copy(df)
+
+
+def private_copy(df):
+    from table_index import carry_indexes
+    private = df.copy()
+    # Same rows in the same order: key indexes built on the shared table still apply
+    carry_indexes(df, private)
+    return private
+
+
+def make_private(dataframes, names):
+    """Replace shared tables among `names` in `dataframes` with private copies before a mutation."""
+    for name in names:
+        if name in dataframes:
+            dataframes[name] = copy_if_shared(dataframes[name])
+
+
+def shared_share_bytes(df):
+    """This session's share of a table's memory: split across sessions if shared, else None."""
+    with _lock:
+        for entry in _entries.values():
+            if entry["df"] is df:
+                return entry["bytes"] / max(len(entry["refs"]), 1)
+    return None
+
+
+def shared_cache_report():
+    with _lock:
+        return pd.DataFrame([
+            {"table": os.path.basename(key[1]) if key[0] == "file" else f"upload {key[1][:8]}",
+             "MB": entry["bytes"] / 2**20, "sessions": len(entry["refs"])}
+            for key, entry in _entries.items()
+        ], columns=["table", "MB", "sessions"])
@@ -0,0 +1,175 @@
+import pandas as pd
+import numpy as np
+import weakref
+
+from memory_manager import frame_token
+from shared_tables import register_view
+
+
+RANGE_OPERATORS = [">", ">=", "<", "<=", "between"]
+# Columns whose values numpy can binary-search directly (NaN sorts last, as sort_values puts it)
+SEARCHABLE_KINDS = "iuf"
+
+_orders = {}     # frame token -> (sort columns, ascending), dropped with the frame
+_checked = {}    # (frame token, column) -> whether the column was found ascending
+_tracked = set()
+
+
+def _forget_frame(token):
+    _tracked.discard(token)
+    _orders.pop(token, None)
+    for key in [k for k in _checked if k[0] == token]:
+        del _checked[key]
+
+
+def _track(df):
+    token = frame_token(df)
+    if token not in _tracked:
+        _tracked.add(token)
+        weakref.finalize(df, _forget_frame, token)
+    return token
+
+
+def record_order(df, columns, ascending=True):
+    """Note that `df` is sorted by `columns` (all ascending or all descending)."""
+    if columns:
+        _orders[_track(df)] = (tuple(columns), bool(ascending))
+
+
+def order_of(df):
+    """(sort columns, ascending) recorded for `df`, or None."""
+    return _orders.get(frame_token(df))
+
+
+def keep_order(source, result):
+    """`result` holds a subset of `source`'s rows in the same order, so it keeps its sort order."""
+    order = order_of(source)
+    if order is not None:
+        record_order(result, *order)
+
+
+def forget_order(df, column=None):
+    """Drop `df`'s sort order after its values (or those of `column`) change in place."""
+    token = frame_token(df)
+    order = _orders.get(token)
+    if order is not None and (column is None or column in order[0]):
+        del _orders[token]
+    for key in [k for k in _checked if k[0] == token and (column is None or k[1] == column)]:
+        del _checked[key]
+
+
+def carry_order(source, target):
+    order = order_of(source)
+    if order is not None:
+        record_order(target, *order)
+
+
+def _searchable(series):
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in SEARCHABLE_KINDS
+
+
+def is_sorted_on(df, column):
+    """Whether `df` is sorted ascending on `column`: recorded by a sort, or checked once per frame."""
+    order = order_of(df)
+    if order is not None and order[0][0] == column and order[1]:
+        return True
+    if column not in df.columns or not _searchable(df[column]):
+        return False
+    key = (_track(df), column)
+    if key not in _checked:
+        _checked[key] = bool(df[column].is_monotonic_increasing)
+    return _checked[key]
+
+
+def already_sorted(df, columns, ascending=True):
+    """Whether sorting `df` by `columns` would leave it as it is."""
+    order = order_of(df)
+    if order is not None and order[1] == bool(ascending) and order[0][:len(columns)] == tuple(columns):
+        return True
+    return len(columns) == 1 and ascending and is_sorted_on(df, columns[0])
+
+
+def sort_rows(df, columns, ascending=True):
+    """`df` sorted by `columns`, skipping the sort when it is already in that order.
+
+    Returns (frame, skipped). A skipped sort returns a shallow view of `df`,
+    copied before any later in-place change.
+    """
+    if columns and already_sorted(df, columns, ascending):
+        out = df.copy(deep=False)
+        register_view(out)
+        skipped = True
+    else:
+        out = df.sort_values(by=columns, ascending=ascending)
+        skipped = False
+    record_order(out, columns, ascending)
+    return out, skipped
+
+
+def range_slice(df, column, operator, value):
+    """Rows of `df` matching `column <operator> value` as a zero-copy positional slice.
+
+    Binary-searches a column sorted ascending; returns None when the predicate
+    or column doesn't allow it, so the caller filters the usual way.
+    """
+    if operator not in RANGE_OPERATORS or column not in df.columns:
+        return None
+    if not (_searchable(df[column]) and is_sorted_on(df, column)):
+        return None
+    try:
+        bounds = [float(v) for v in value] if operator == "between" else [float(value)]
+    except (TypeError, ValueError):
+        return None
+    values = df[column].to_numpy()
+    # Nulls sort last and never satisfy a comparison
+    end = int(np.searchsorted(values, np.nan)) if values.dtype.kind == "f" and len(values) and np.isnan(values[-1]) else len(values)
+    values = values[:end]
+
+    if operator == "between":
+        start, stop = np.searchsorted(values, bounds[0], "left"), np.searchsorted(values, bounds[1], "right")
+    elif operator in [">", ">="]:
+        start, stop = np.searchsorted(values, bounds[0], "right" if operator == ">" else "left"), end
+    else:
+        start, stop = 0, np.searchsorted(values, bounds[0], "left" if operator == "<" else "right")
+    out = df.iloc[int(start):max(int(start), int(stop))]
+    register_view(out)
+    keep_order(df, out)
+    return out
+
+
+def _take(frame, indexer):
+    frame = frame.reset_index(drop=True)
+    if indexer is None:
+        return frame
+    # -1 marks a row with no match: reindexing fills it with nulls, as a merge does
+    return frame.reindex(indexer).reset_index(drop=True)
+
+
+def sorted_merge(left, right, how, left_on, right_on):
+    """pd.merge of two frames sorted ascending on their keys, as a merge of the sorted key runs.
+
+    Only inner and left joins, whose merge output keeps the left order, are
+    handled; returns None otherwise so the caller hash-joins.
+    """
+    if how not in ["inner", "left"] or left_on not in left.columns or right_on not in right.columns:
+        return None
+    if not all(_searchable(frame[key]) and is_sorted_on(frame, key) for frame, key in [(left, left_on), (right, right_on)]):
+        return None
+    left_keys, right_keys = left[left_on].to_numpy(), right[right_on].to_numpy()
+    if left_keys.dtype != right_keys.dtype:
+        return None
+    for keys in [left_keys, right_keys]:
+        # pandas matches null keys with each other; leave that to merge
+        if keys.dtype.kind == "f" and len(keys) and np.isnan(keys[-1]):
+            return None
+
+    _, left_idx, right_idx = pd.Index(left_keys).join(pd.Index(right_keys), how=how, return_indexers=True)
+    left_part, right_part = _take(left, left_idx), _take(right, right_idx)
+    if left_on == right_on:
+        right_part = right_part.drop(columns=right_on)
+    overlap = set(left_part.columns) & set(right_part.columns)
+    left_part = left_part.rename(columns={col: f"{col}_x" for col in overlap})
+    right_part = right_part.rename(columns={col: f"{col}_y" for col in overlap})
+    out = pd.concat([left_part, right_part], axis=1)
+    record_order(out, [left_on if left_on not in overlap else f"{left_on}_x"], True)
+    return out
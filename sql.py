@@ -2,8 +2,13 @@ import streamlit as st
 from file_loader import upload_data, show_file_info, display_shared_columns
 from sql_steps import sql_pipeline_ui
 from dynamic_sql_pipeline import dynamic_sql_pipeline_ui 
+from run_pipeline import pipeline_to_json, parse_pipeline
+from pipeline_executor import begin_rerun
+from partial_rerun import begin_full_run, end_full_run, latency_panel
+from memory_manager import memory_panel
 #from trail import sql_pipeline_ui
 st.set_page_config(page_title="🧩 SQL Pipeline Builder", layout="wide")
+begin_full_run()
 
 
 
@@ -123,7 +128,24 @@ if has_data:
 
     with st.expander("🔍 Column Comparison Across Tables", expanded=True):
         display_shared_columns()
-    
+
+    # 🗃️ Pipelines saved here can be run headless with run_pipeline.py
+    with st.sidebar.expander("🗃️ Save / Load Pipeline"):
+        pipeline_labels = {"🧩 Basic": "basic_sql_pipeline", "🔗 Dynamic": "dynamic_sql_pipeline"}
+        pipeline_label = st.radio("Pipeline", list(pipeline_labels), horizontal=True, key="pipeline_file_target")
+        pipeline_key = pipeline_labels[pipeline_label]
+        st.download_button("💾 Save Pipeline (JSON)", pipeline_to_json(st.session_state.get(pipeline_key, [])),
+                           file_name="pipeline.json", mime="application/json")
+        pipeline_file = st.file_uploader("📂 Load Pipeline", type=["json", "yaml", "yml"], key="pipeline_file")
+        if pipeline_file is not None and st.button("Load", key="pipeline_load"):
+            try:
+                st.session_state[pipeline_key] = parse_pipeline(pipeline_file.getvalue().decode("utf-8"), pipeline_file.name)["steps"]
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ Could not load pipeline: {e}")
+
+    # ♻️ Both tabs share one execution per step per rerun
+    begin_rerun()
 
     tab1, tab2 = st.tabs(["🧩 Basic SQL Pipeline", "🔗 Dynamic SQL Pipeline"])
 
@@ -179,7 +201,6 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-
-
-
-
+end_full_run()
+latency_panel()
+memory_panel()
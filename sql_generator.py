@@ -3,6 +3,14 @@ import streamlit as st
 import numpy as np
 import re   
 
+from window_functions import RANKING_FUNCTIONS, AGGREGATE_FUNCTIONS, OFFSET_FUNCTIONS, FRAMES, RUNNING
+
+
+def sql_aggregate(func, col):
+    if func == "nunique":
+        return f"COUNT(DISTINCT {col})"
+    return f"{'AVG' if func == 'mean' else func.upper()}({col})"
+
 
 def generate_sql_query_for_step(step):
     if step["type"] == "Filter Rows":
@@ -24,13 +32,13 @@ def generate_sql_query_for_step(step):
         having_conditions = step.get("having_conditions", [])
 
         # SELECT aggregation parts
-        agg_select = ", ".join([f"{func.upper()}({col}) AS {func}_{col}" for col, func in aggregations.items()])
+        agg_select = ", ".join([f"{sql_aggregate(func, col)} AS {func}_{col}" for col, func in aggregations.items()])
 
         # HAVING clause
         having_clause = ""
         if having_conditions:
             having_parts = [
-                f"{cond['function'].upper()}({cond['column']}) {cond['operator']} {cond['value']}"
+                f"{sql_aggregate(cond['function'], cond['column'])} {cond['operator']} {cond['value']}"
                 for cond in having_conditions
             ]
             having_clause = " HAVING " + " AND ".join(having_parts)
@@ -48,6 +56,36 @@ def generate_sql_query_for_step(step):
         join_type = step["join_type"].upper()
         return f"SELECT * FROM {lt} {join_type} JOIN {rt} ON {lt}.{lcol} = {rt}.{rcol}"
 
+    elif step["type"] == "Deduplicate":
+        table = step["table"]
+        subset = step.get("subset", [])
+        keep = step.get("keep", "first")
+        table_columns = step.get("table_columns", [])
+        # Listed explicitly so the helper columns below stay out of the result
+        columns = ", ".join(table_columns) or "*"
+        if not subset and keep != "none":
+            return f"SELECT DISTINCT {columns} FROM {table}"
+        if not subset:
+            # Rows that occur exactly once
+            return f"SELECT {columns} FROM {table} GROUP BY {columns} HAVING COUNT(*) = 1"
+        partition = ", ".join(subset)
+        if keep == "none":
+            return (f"SELECT {columns} FROM (SELECT *, COUNT(*) OVER (PARTITION BY {partition}) AS copies "
+                    f"FROM {table}) d WHERE copies = 1")
+        # SQL tables have no row order: copies are ranked by their other columns, so the
+        # kept copy is deterministic but may not be the one pandas keeps by row position
+        direction = "ASC" if keep == "first" else "DESC"
+        order = ", ".join(f"{col} {direction}" for col in [c for c in table_columns if c not in subset] or subset)
+        return (f"-- keep {keep}: the copy with the {'smallest' if keep == 'first' else 'largest'} other column values\n"
+                f"SELECT {columns} FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY {order}) AS rn "
+                f"FROM {table}) d WHERE rn = 1")
+
+    elif step["type"] in ["Semi Join", "Anti Join"]:
+        lt = step["left_table"]
+        rt = step["right_table"]
+        exists = "EXISTS" if step["type"] == "Semi Join" else "NOT EXISTS"
+        return f"SELECT * FROM {lt} WHERE {exists} (SELECT 1 FROM {rt} WHERE {rt}.{step['right_on']} = {lt}.{step['left_on']})"
+
     elif step["type"] == "Modify Column":
         expr = step.get("expression", "")
         new_col = step.get("alias", "new_column")
@@ -83,7 +121,30 @@ def generate_sql_query_for_step(step):
         col = step["column"]
         func = step["function"]
         alias = step["alias"]
-        return f"SELECT {func.upper()}({col}) AS {alias} FROM {table}"
+        return f"SELECT {sql_aggregate(func, col)} AS {alias} FROM {table}"
+
+    elif step["type"] == "Window Function":
+        table = step["table"]
+        func = step["function"]
+        alias = step["alias"]
+        order_by = step.get("order_by", [])
+        direction = "ASC" if step.get("ascending", True) else "DESC"
+
+        if func in RANKING_FUNCTIONS:
+            args = ""
+        elif func in OFFSET_FUNCTIONS:
+            args = f"{step['column']}, {step.get('offset', 1)}"
+        else:
+            args = step["column"]
+
+        over = []
+        if step.get("partition_by"):
+            over.append("PARTITION BY " + ", ".join(step["partition_by"]))
+        if order_by:
+            over.append("ORDER BY " + ", ".join(f"{col} {direction}" for col in order_by))
+            if func in AGGREGATE_FUNCTIONS:
+                over.append(FRAMES[step.get("frame", RUNNING)].format(n=step.get("frame_rows", 2)))
+        return f"SELECT *, {func}({args}) OVER ({' '.join(over)}) AS {alias} FROM {table}"
 
     elif step["type"] == "Create New Table with Foreign Link":
         
@@ -95,39 +156,28 @@ def generate_sql_query_for_step(step):
         if not columns or not rows:
             return f"-- ❌ Cannot generate SQL: Missing data or columns for {table}"
 
-        # Map Python to SQL types
-        dtype_map = {
-            "int": "INTEGER",
-            "float": "FLOAT",
-            "str": "VARCHAR(255)",
-            "datetime": "TIMESTAMP"
-        }
+        create_sql = foreign_link_create_sql(table, columns, dtypes)
+        df = pd.DataFrame(rows, columns=columns)
+        batch_size = step.get("insert_batch_size", DEFAULT_INSERT_BATCH_SIZE)
+        return create_sql + "\n" + "\n".join(iter_insert_batches(table, df, dtypes, batch_size))
 
-        # CREATE TABLE
-        column_defs = []
-        for col in columns:
-            py_dtype = dtypes.get(col, "str")
-            sql_type = dtype_map.get(py_dtype, "VARCHAR(255)")
-            column_defs.append(f"{col} {sql_type}")
-        create_sql = f"CREATE TABLE {table} ({', '.join(column_defs)});"
-
-        # INSERT INTO
-        insert_stmts = []
-        for row in rows:
-            formatted = []
-            for idx, val in enumerate(row):
-                col = columns[idx]
-                dtype = dtypes.get(col, "str")
-                if val in [None, "", "null"]:
-                    formatted.append("NULL")
-                elif dtype in ["str", "datetime"]:
-                    val = str(val).replace("'", "''")
-                    formatted.append(f"'{val}'")
-                else:
-                    formatted.append(str(val))
-            insert_stmts.append(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(formatted)});")
-
-        return create_sql + "\n" + "\n".join(insert_stmts)
+    elif step["type"] == "Handle Missing Values" and step.get("batch_mode"):
+        table = step["table"]
+        fill_values = step.get("fill_values", {})
+        drop_cols = step.get("drop_columns", [])
+        if not fill_values and not drop_cols:
+            return f"-- No missing-value treatment configured for {table}"
+
+        # One SELECT: COALESCE every filled column, keep the rest untouched
+        table_columns = step.get("table_columns") or list(fill_values)
+        select_parts = [
+            f"COALESCE({col}, {sql_literal(fill_values[col])}) AS {col}" if col in fill_values else col
+            for col in table_columns
+        ]
+        sql = f"SELECT {', '.join(select_parts)}\nFROM {table}"
+        if drop_cols:
+            sql += "\nWHERE " + " AND ".join(f"{col} IS NOT NULL" for col in drop_cols)
+        return sql
 
     elif step["type"] == "Handle Missing Values":
         table = step["table"]
@@ -178,13 +228,10 @@ def generate_sql_query_for_step(step):
 
         # Generate INSERT INTO if data provided
         if row_data.strip():
-            rows = [row.strip() for row in row_data.strip().split("\n") if row.strip()]
-            for row in rows:
-                values = [val.strip() for val in row.split(",")]
-                val_str = ", ".join(
-                    [f"'{v}'" if dtypes[columns[i]] in ["TEXT", "DATE"] else v for i, v in enumerate(values)]
-                )
-                sql += f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({val_str});\n"
+            df = parse_pasted_rows(row_data, columns)
+            batch_size = step.get("insert_batch_size", DEFAULT_INSERT_BATCH_SIZE)
+            for stmt in iter_insert_batches(table, df, dtypes, batch_size):
+                sql += stmt + "\n"
 
         return sql
 
@@ -267,12 +314,141 @@ def generate_sql_query_for_step(step):
 
     return "-- Unsupported step or missing data"
 
+DEFAULT_INSERT_BATCH_SIZE = 1000
+
+# Column types whose values are written as quoted SQL strings
+QUOTED_DTYPES = {"STR", "DATETIME", "TEXT", "DATE", "VARCHAR", "OBJECT"}
+
+
+def _is_quoted_dtype(dtype):
+    name = getattr(dtype, "__name__", dtype)
+    return str(name).upper() in QUOTED_DTYPES
+
+
+def foreign_link_create_sql(table, columns, dtypes):
+    # Map Python to SQL types
+    dtype_map = {
+        "int": "INTEGER",
+        "float": "FLOAT",
+        "str": "VARCHAR(255)",
+        "datetime": "TIMESTAMP"
+    }
+    column_defs = []
+    for col in columns:
+        py_dtype = dtypes.get(col, "str")
+        sql_type = dtype_map.get(getattr(py_dtype, "__name__", py_dtype), "VARCHAR(255)")
+        column_defs.append(f"{col} {sql_type}")
+    return f"CREATE TABLE {table} ({', '.join(column_defs)});"
+
+
+def parse_pasted_rows(text, columns):
+    """Parse pasted comma-separated rows (one per line) into a string DataFrame.
+
+    Every comma separates values (quotes are kept as typed); a row with the
+    wrong number of values raises ValueError.
+    """
+    lines = pd.Series([line for line in (text or "").strip().splitlines() if line.strip()], dtype=object)
+    if lines.empty:
+        return pd.DataFrame(columns=columns, dtype=str)
+    counts = lines.str.count(",") + 1
+    bad = counts[counts != len(columns)]
+    if len(bad):
+        raise ValueError(f"Row `{lines[bad.index[0]].strip()}` has {bad.iloc[0]} values but there are {len(columns)} columns.")
+    df = lines.str.split(",", expand=True)
+    df.columns = columns
+    return df.apply(lambda s: s.str.strip())
+
+
+def render_sql_literals(series, quoted):
+    """Render a whole column as SQL literals (quoting, escaping and NULLs) without a Python loop."""
+    text = series.astype(str)
+    null_mask = series.isna()
+    if quoted:
+        text = "'" + text.str.replace("'", "''", regex=False) + "'"
+    return text.mask(null_mask, "NULL")
+
+
+def render_value_rows(df, dtypes):
+    """Render every row of df as a `(v1, v2, ...)` VALUES tuple."""
+    literals = [render_sql_literals(df[col], _is_quoted_dtype(dtypes.get(col, "str"))) for col in df.columns]
+    if not literals:
+        return pd.Series([], dtype=object)
+    rows = literals[0].str.cat(literals[1:], sep=", ") if len(literals) > 1 else literals[0]
+    return "(" + rows + ")"
+
+
+def iter_insert_batches(table, df, dtypes, batch_size=DEFAULT_INSERT_BATCH_SIZE):
+    """Yield multi-row INSERT statements, rendering one batch at a time."""
+    batch_size = max(int(batch_size), 1)
+    columns = ", ".join(map(str, df.columns))
+    for start in range(0, len(df), batch_size):
+        rows = render_value_rows(df.iloc[start:start + batch_size], dtypes)
+        yield f"INSERT INTO {table} ({columns}) VALUES\n" + ",\n".join(rows) + ";"
+
+
+def write_insert_sql(path, table, df, dtypes, batch_size=DEFAULT_INSERT_BATCH_SIZE, header=""):
+    """Stream CREATE/INSERT SQL for df to a file instead of building one giant string."""
+    with open(path, "w", encoding="utf-8") as f:
+        if header:
+            f.write(header + "\n")
+        for stmt in iter_insert_batches(table, df, dtypes, batch_size):
+            f.write(stmt + "\n")
+    return path
+
+
+def sql_literal(val):
+    if val is None or (not isinstance(val, str) and pd.isna(val)):
+        return "NULL"
+    if isinstance(val, (bool, np.bool_)):
+        return "TRUE" if val else "FALSE"
+    if isinstance(val, (int, float, np.integer, np.floating)):
+        return str(val)
+    if isinstance(val, pd.Timestamp):
+        val = val.isoformat(sep=" ")
+    escaped = str(val).replace("'", "''")
+    return f"'{escaped}'"
+
+
+def batched_fill_update_sql(table, fill_values, drop_cols):
+    statements = []
+    if drop_cols:
+        statements.append(f"DELETE FROM {table} WHERE " + " OR ".join(f"{col} IS NULL" for col in drop_cols) + ";")
+    if fill_values:
+        assignments = ", ".join(f"{col} = COALESCE({col}, {sql_literal(val)})" for col, val in fill_values.items())
+        statements.append(f"UPDATE {table} SET {assignments};")
+    return "\n".join(statements)
+
+
+def _code_lines(sql):
+    return [line for line in sql.splitlines() if line.strip() and not line.strip().startswith("--")]
+
+
+def _is_query(sql):
+    code = _code_lines(sql)
+    return bool(code) and code[0].split(None, 1)[0].upper() in ["SELECT", "WITH"]
+
+
 def chain_sql_steps(sql_list):
-    with_blocks = []
-    for i, sql in enumerate(sql_list[:-1]):
-        with_blocks.append(f"step_{i+1} AS (\n  {sql}\n)")
-    final = sql_list[-1]
-    if with_blocks:
-        return "WITH " + ",\n".join(with_blocks) + f"\nSELECT * FROM step_{len(sql_list)};"
-    else:
-        return final
+    """One script for the whole pipeline, each step's result named `step_i`.
+
+    A pipeline of queries becomes one WITH statement selecting the last step.
+    Once a step is a statement (INSERT, UPDATE, CREATE TABLE, ...), the steps
+    run in order instead, queries as temporary tables.
+    """
+    bodies = [sql.strip().rstrip(";").strip() for sql in sql_list]
+    if all(_is_query(sql) for sql in bodies):
+        with_blocks = [f"step_{i+1} AS (\n  {sql}\n)" for i, sql in enumerate(bodies)]
+        return "WITH " + ",\n".join(with_blocks) + f"\nSELECT * FROM step_{len(bodies)};"
+
+    statements = []
+    for i, sql in enumerate(bodies):
+        if _is_query(sql):
+            statements.append(f"CREATE TEMPORARY TABLE step_{i+1} AS\n{sql};")
+        elif _code_lines(sql):
+            statements.append(sql + ";")
+        elif sql:
+            # A step without SQL leaves its note
+            statements.append(sql)
+    if _is_query(bodies[-1]):
+        statements.append(f"SELECT * FROM step_{len(bodies)};")
+    return "\n\n".join(statements)
@@ -1,11 +1,46 @@
 import streamlit as st
 import os
-from sql_generator import generate_sql_query_for_step
+from sql_generator import (
+    generate_sql_query_for_step, batched_fill_update_sql, foreign_link_create_sql, parse_pasted_rows,
+    iter_insert_batches, write_insert_sql, DEFAULT_INSERT_BATCH_SIZE
+)
 import pandas as pd
 from datetime import datetime
 import numpy as np
 
 import io
+import hashlib
+from partial_rerun import scoped
+from step_output_store import (
+    persist_step_output, persist_file, frame_fingerprint, lazy_download_button, available_formats, arrow_available
+)
+from step_registry import (
+    step_type_names, column_range, column_stats, source_column,
+    register_form, register_apply, form_handler, apply_handler,
+)
+from column_stats import value_picker
+from shared_tables import copy_if_shared, register_view
+from table_index import (
+    KeyViolation, key_index, declare_key, drop_indexes, extend_indexes, check_primary_key, check_insert, check_update,
+    without_positions, key_set, matches_keys
+)
+from sort_order import range_slice, sort_rows, sorted_merge, keep_order
+from runtime_filter import RUNTIME_FILTER_MODES, prune_join_inputs
+from grace_join import (
+    SPILL_MODES, SpillUnsupported, estimate_join_bytes, should_spill, partition_count, grace_join, read_join_output,
+    output_name as spill_output_name
+)
+from memory_manager import headroom_bytes
+from approximate import approx_toggle, approx_aggregate, approx_group_by, approx_caption, DEFAULT_SAMPLE_ROWS, CI_SUFFIX
+from deduplicate import KEEP_OPTIONS, duplicate_mask
+from window_functions import (
+    WINDOW_FUNCTIONS, RANKING_FUNCTIONS, AGGREGATE_FUNCTIONS, OFFSET_FUNCTIONS, FRAMES, MOVING, apply_window
+)
+
+
+AGGREGATE_OPTIONS = ["sum", "mean", "count", "min", "max", "nunique"]
+AGGREGATE_LABELS = {"sum": "sum", "mean": "mean", "count": "count", "min": "min", "max": "max",
+                    "nunique": "count distinct"}
 
 
 sql_to_pandas_dtype = {
@@ -21,6 +56,123 @@ sql_to_pandas_dtype = {
 }
 
 
+# 🩹 Batch missing-value strategies, chosen once per dtype group
+MISSING_STRATEGIES_BY_GROUP = {
+    "numeric": ["Fill with Mean", "Fill with Median", "Fill with Mode", "Fill with Custom Value", "Drop Rows", "Leave As Is"],
+    "datetime": ["Fill with Mode", "Fill with Custom Value", "Drop Rows", "Leave As Is"],
+    "text": ["Fill with Mode", "Fill with Custom Value", "Drop Rows", "Leave As Is"],
+}
+
+
+def dtype_group(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return "text"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return "text"
+
+
+@st.cache_data(show_spinner=False)
+def null_counts(df):
+    # Cached per table version so the form doesn't rescan every rerun
+    return df.isna().sum()
+
+
+@st.cache_data(show_spinner=False)
+def compute_fill_statistics(df, columns, dtype_strategies):
+    """Compute every fill value for a batch of columns in one pass per statistic."""
+    by_strategy = {}
+    for col in columns:
+        strategy = dtype_strategies.get(dtype_group(df[col].dtype), "Leave As Is")
+        by_strategy.setdefault(strategy, []).append(col)
+
+    stats = {}
+    if by_strategy.get("Fill with Mean"):
+        stats.update(df[by_strategy["Fill with Mean"]].mean().to_dict())
+    if by_strategy.get("Fill with Median"):
+        stats.update(df[by_strategy["Fill with Median"]].median().to_dict())
+    if by_strategy.get("Fill with Mode"):
+        modes = df[by_strategy["Fill with Mode"]].mode(dropna=True)
+        if not modes.empty:
+            stats.update(modes.iloc[0].to_dict())
+
+    # Columns that are entirely null have no statistic to fill with
+    return {col: val for col, val in stats.items() if not pd.isna(val)}
+
+
+def plan_missing_value_batch(df, step):
+    """Resolve a batch step into ({column: fill value}, [columns to drop nulls on])."""
+    columns = [col for col in step.get("columns", []) if col in df.columns]
+    dtype_strategies = step.get("dtype_strategies", {})
+    custom_values = step.get("custom_values", {})
+
+    fill_values = compute_fill_statistics(df, columns, dtype_strategies)
+    drop_cols = []
+    for col in columns:
+        group = dtype_group(df[col].dtype)
+        strategy = dtype_strategies.get(group, "Leave As Is")
+        if strategy == "Drop Rows":
+            drop_cols.append(col)
+        elif strategy == "Fill with Custom Value":
+            raw = custom_values.get(group, "")
+            if group == "numeric":
+                fill_values[col] = pd.to_numeric(raw, errors="coerce")
+            elif group == "datetime":
+                fill_values[col] = pd.to_datetime(raw, errors="coerce")
+            else:
+                fill_values[col] = raw
+    fill_values = {col: val for col, val in fill_values.items() if col in columns and not pd.isna(val)}
+    return fill_values, drop_cols
+
+
+NEW_TABLE_PREVIEW_ROWS = 100
+
+
+def assemble_new_table(step, dataframes, limit=None):
+    """Build a Create & Save New Table result from its base-table reference and typed-in rows."""
+    custom_columns = step.get("custom_columns", [])
+    if step.get("rows") is None and step.get("data"):
+        # Pipelines saved before steps stored a reference carry the full records
+        manual = pd.DataFrame(step["data"], columns=step.get("columns") or None)
+        custom_columns = list(manual.columns)
+    else:
+        manual = pd.DataFrame(step.get("rows", []), columns=custom_columns or None)
+
+    for col, dtype in step.get("dtypes", {}).items():
+        if col not in manual.columns:
+            continue
+        try:
+            if dtype == "datetime":
+                manual[col] = pd.to_datetime(manual[col], errors="coerce")
+            else:
+                manual[col] = manual[col].astype(dtype)
+        except Exception as e:
+            st.warning(f"⚠️ Could not convert {col} to {dtype}: {e}")
+
+    base = dataframes.get(step.get("base_table")) if step.get("use_existing") else None
+    base_columns = [col for col in step.get("base_columns", []) if base is not None and col in base.columns]
+    if not base_columns:
+        return manual
+    if limit is not None:
+        base = base.iloc[:limit]
+    if len(manual) > len(base):
+        # More typed-in rows than base rows: base columns are padded with NaN
+        return pd.concat([base[base_columns].reset_index(drop=True), manual], axis=1)
+
+    # Base columns first, typed-in values fill the first rows. pandas may or may not copy
+    # the base columns here depending on its version, so treat the result as a possible alias
+    new_df = pd.DataFrame({col: base[col] for col in base_columns}, copy=False)
+    new_df.index = pd.RangeIndex(len(new_df))
+    for col in custom_columns:
+        if col not in base_columns:
+            new_df[col] = manual[col].reindex(new_df.index).to_numpy()
+    # It may share the base table's memory, so mutating steps must copy it first
+    register_view(new_df)
+    return new_df
+
+
 def sql_pipeline_ui(prefix="basic"):
 
     pipeline_key = f"{prefix}_sql_pipeline"
@@ -54,17 +206,17 @@ def sql_pipeline_ui(prefix="basic"):
         st.error(f"❌ Could not create step_outputs folder: {e}")
         return
 
-    # 💾 Store in session state so other steps/modules can access
-    st.session_state["step_output_dir"] = step_output_dir
+    # 💾 Store in session state so other steps/modules can access (one folder per tab)
+    st.session_state[f"{prefix}_step_output_dir"] = step_output_dir
+    output_format = st.sidebar.selectbox("💾 Step output format", available_formats(), key=f"{prefix}_output_format")
 
     
-    SQL_STEP_OPTIONS = ["Filter Rows", "Sort Rows", "Group By", "Join Tables", "Aggregate Column",
-                         "Modify Column","Create & Save New Table","INSERT", "UPDATE", "DELETE","Set Operation","Handle Missing Values",
-                         "Modify Table Structure","Create New Table with Foreign Link","Create Table with Primary Key"]
+    SQL_STEP_OPTIONS = step_type_names()
 
-    # Ensure pipeline exists
-    if "sql_pipeline" not in st.session_state:
-        st.session_state.sql_pipeline = []
+    # Ensure pipeline exists (each tab keeps its own)
+    if pipeline_key not in st.session_state:
+        st.session_state[pipeline_key] = []
+    pipeline = st.session_state[pipeline_key]
 
     
     dataframes = st.session_state.get("uploaded_tables", {})
@@ -109,15 +261,41 @@ def sql_pipeline_ui(prefix="basic"):
         for j, opt in enumerate(SQL_STEP_OPTIONS[i:i+num_cols]):
             with cols[j]:
                 if st.button(opt, key=f"step_btn_{opt}"):
-                    st.session_state.sql_pipeline.append({"type": opt})
-                    st.session_state.selected_step_index = len(st.session_state.sql_pipeline) - 1
+                    pipeline.append({"type": opt})
+                    st.session_state.selected_step_index = len(pipeline) - 1
                     st.rerun()
 
  
-    final_output = None
+    # 📈 Per-step instrumentation (previous run's badge shows on the expander)
+    trace_memory = st.sidebar.checkbox("📈 Track peak memory per step", value=False, key=f"{prefix}_trace_memory",
+                                       help="Traces Python allocations while each step runs; slows steps, and traced "
+                                            "steps of all sessions run one at a time.")
+
+    # ⚡ Editing a step reruns only this section (plan and chunked run included);
+    # unchanged steps reuse their results
+    render_pipeline_steps(pipeline, dataframes, step_output_dir, output_format, trace_memory, prefix)
+
+
+
+
+@scoped
+def render_pipeline_steps(pipeline, dataframes, step_output_dir, output_format, trace_memory, prefix="basic"):
+    from step_metrics import profile_toggle, render_profile, metrics_badge, pipeline_metrics_panel
+    from pipeline_executor import execute_step
+    from memory_manager import enforce_budget
+    from explain import explain_panel, output_names
+    from chunked_executor import chunked_run_ui
+
+    # 🧭 Estimated cost of each step before anything runs; filled in once the forms below
+    # have updated the steps
+    plan = st.container()
+
+    last_metrics = st.session_state.get(f"{prefix}_step_metrics", {})
+    run_metrics = {}
+
     # Show Forms for Each Step
-    for i, step in enumerate(st.session_state.sql_pipeline):
-        with st.expander(f"Step {i+1}: {step['type']}", expanded=True):
+    for i, step in enumerate(pipeline):
+        with st.expander(f"Step {i+1}: {step['type']}  {metrics_badge(last_metrics.get(i))}", expanded=True):
             
             build_step_form(i, step, dataframes,prefix="basic")
 
@@ -125,944 +303,1142 @@ def sql_pipeline_ui(prefix="basic"):
             
             with col2:
                 if st.button("❌ Delete", key=f"basic_delete_{i}"):
-                    st.session_state.sql_pipeline.pop(i)
+                    pipeline.pop(i)
                     st.rerun()
 
             # Apply step logic
-            df = apply_step(step, dataframes)
+            profile_on, use_sampler = profile_toggle(i, prefix)
+            df, run_metrics[i], profile = execute_step(step, dataframes, prefix, trace_memory, profile_on, use_sampler)
+            enforce_budget(protect=[df] if isinstance(df, pd.DataFrame) else [])
+            st.caption(metrics_badge(run_metrics[i]))
+            if profile is not None:
+                render_profile(profile, i, prefix)
             if df is not None:
                 st.markdown(f"#### 📄 Output of Step {i+1}")
                 st.dataframe(df)
-                step_filename = f"step_{i+1}_{step['type'].replace(' ', '_').lower()}.csv"
-                step_path = os.path.join(step_output_dir, step_filename)
-                df.to_csv(step_path, index=False)
-                with open(step_path, "rb") as f:
-                    st.download_button(f"⬇️ Download Step {i+1} Output", f, file_name=step_filename)
+                base_name = f"step_{i+1}_{step['type'].replace(' ', '_').lower()}"
+                step_path, fingerprint = persist_step_output(df, step_output_dir, base_name, output_format)
+                lazy_download_button(df, step_path, fingerprint, output_format,
+                                     f"⬇️ Download Step {i+1} Output", key=f"{prefix}_download_{i}")
 
+    st.session_state[f"{prefix}_step_metrics"] = run_metrics
+    pipeline_metrics_panel(run_metrics, prefix)
 
+    with plan:
+        explain_panel(pipeline, dataframes, output_names(pipeline), prefix)
 
+    # 🧱 Stream large files through row-local steps without loading them
+    chunked_run_ui(pipeline, prefix=prefix, tables=dataframes)
 
-def build_step_form(step_count, step, dataframes,prefix="basic"):
-    SQL_STEP_OPTIONS = ["Filter Rows", "Sort Rows", "Group By", "Join Tables"]
-    step_type = step.get("type", SQL_STEP_OPTIONS[0])
 
-    step["type"] = step_type
-    if step_type == "Filter Rows":
-        table = st.selectbox("Select Table", list(dataframes.keys()), 
-                            index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
-                            key=f"{prefix}_filter_table_{step_count}")
-        column = st.selectbox("Column", dataframes[table].columns, key=f"{prefix}_filter_col_{step_count}")
-        col_dtype = dataframes[table][column].dtype
+@register_form("Filter Rows")
+def _filter_rows_form(step_count, step, dataframes, prefix):
+    table = st.selectbox("Select Table", list(dataframes.keys()), 
+                        index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
+                        key=f"{prefix}_filter_table_{step_count}")
+    column = st.selectbox("Column", dataframes[table].columns, key=f"{prefix}_filter_col_{step_count}")
+    col_dtype = dataframes[table][column].dtype
 
-        if pd.api.types.is_numeric_dtype(col_dtype):
-            operator_options = ["==", "!=", ">", "<", ">=", "<=", "between", "not between"]
-        else:
-            operator_options = ["==", "!=", "contains"]
+    if pd.api.types.is_numeric_dtype(col_dtype):
+        operator_options = ["==", "!=", ">", "<", ">=", "<=", "between", "not between"]
+    else:
+        operator_options = ["==", "!=", "contains"]
 
-        operator = st.selectbox("Operator", operator_options, key=f"{prefix}_filter_op_{step_count}")
+    operator = st.selectbox("Operator", operator_options, key=f"{prefix}_filter_op_{step_count}")
 
-        use_manual = st.checkbox("Manual Input", key=f"{prefix}_manual_input_{step_count}")
+    use_manual = st.checkbox("Manual Input", key=f"{prefix}_manual_input_{step_count}")
 
-        if use_manual:
-            if operator in ["between", "not between"]:
-                value_low = st.text_input("Lower Bound", key=f"{prefix}_filter_val_manual_low_{step_count}")
-                value_high = st.text_input("Upper Bound", key=f"{prefix}_filter_val_manual_high_{step_count}")
-                if operator == "between":
-                    expr = f"({column} >= {value_low}) & ({column} <= {value_high})"
-                else:
-                    expr = f"({column} < {value_low}) | ({column} > {value_high})"
-                step.update({"value": (value_low, value_high)})
+    # Bounds and values come from the source column's cached statistics, so upstream steps needn't run
+    stats = column_stats(dataframes, table, column)
+    bounds = column_range(dataframes, table, column) if pd.api.types.is_numeric_dtype(col_dtype) else None
+    if not use_manual and (stats is None or (pd.api.types.is_numeric_dtype(col_dtype) and bounds is None)):
+        st.caption("ℹ️ Computed column — enter the value manually.")
+        use_manual = True
+
+    if use_manual:
+        if operator in ["between", "not between"]:
+            value_low = st.text_input("Lower Bound", key=f"{prefix}_filter_val_manual_low_{step_count}")
+            value_high = st.text_input("Upper Bound", key=f"{prefix}_filter_val_manual_high_{step_count}")
+            if operator == "between":
+                expr = f"({column} >= {value_low}) & ({column} <= {value_high})"
             else:
-                value = st.text_input("Enter value manually", key=f"{prefix}_filter_val_manual_{step_count}")
-                expr = f"{column}.str.contains('{value}')" if operator == "contains" else f"{column} {operator} {repr(value)}"
-                step.update({"value": value})
+                expr = f"({column} < {value_low}) | ({column} > {value_high})"
+            step.update({"value": (value_low, value_high)})
         else:
-            if pd.api.types.is_numeric_dtype(col_dtype):
-                min_val = float(dataframes[table][column].min())
-                max_val = float(dataframes[table][column].max())
-                if operator == "between":
-                    value = st.slider("Select range", min_value=min_val, max_value=max_val, value=(min_val, max_val), key=f"{prefix}_filter_val_range_{step_count}")
-                    expr = f"({column} >= {value[0]}) & ({column} <= {value[1]})"
-                elif operator == "not between":
-                    value = st.slider("Select excluded range", min_value=min_val, max_value=max_val, value=(min_val, max_val), key=f"{prefix}_filter_val_range_not_{step_count}")
-                    expr = f"({column} < {value[0]}) | ({column} > {value[1]})"
-                else:
-                    value = st.slider("Select value", min_value=min_val, max_value=max_val, value=min_val, key=f"{prefix}_filter_val_slider_{step_count}")
-                    expr = f"{column} {operator} {value}"
-                step.update({"value": value})
+            value = st.text_input("Enter value manually", key=f"{prefix}_filter_val_manual_{step_count}")
+            expr = f"{column}.str.contains('{value}')" if operator == "contains" else f"{column} {operator} {repr(value)}"
+            step.update({"value": value})
+    else:
+        if pd.api.types.is_numeric_dtype(col_dtype):
+            min_val, max_val = bounds
+            if operator == "between":
+                value = st.slider("Select range", min_value=min_val, max_value=max_val, value=(min_val, max_val), key=f"{prefix}_filter_val_range_{step_count}")
+                expr = f"({column} >= {value[0]}) & ({column} <= {value[1]})"
+            elif operator == "not between":
+                value = st.slider("Select excluded range", min_value=min_val, max_value=max_val, value=(min_val, max_val), key=f"{prefix}_filter_val_range_not_{step_count}")
+                expr = f"({column} < {value[0]}) | ({column} > {value[1]})"
             else:
-                options = dataframes[table][column].dropna().unique().tolist()
-                value = st.selectbox("Select value", options, key=f"{prefix}_filter_val_cat_{step_count}")
-                expr = f"{column}.str.contains('{value}')" if operator == "contains" else f"{column} {operator} '{value}'"
-                step.update({"value": value})
-
-        step.update({"table": table, "column": column, "operator": operator, "expression": expr})
-        
-
+                value = st.slider("Select value", min_value=min_val, max_value=max_val, value=min_val, key=f"{prefix}_filter_val_slider_{step_count}")
+                expr = f"{column} {operator} {value}"
+            step.update({"value": value})
+        else:
+            value = value_picker("Select value", source_column(dataframes, table, column), stats,
+                                 key=f"{prefix}_filter_val_cat_{step_count}")
+            expr = f"{column}.str.contains('{value}')" if operator == "contains" else f"{column} {operator} '{value}'"
+            step.update({"value": value})
+
+    step.update({"table": table, "column": column, "operator": operator, "expression": expr})
+
+
+@register_form("Group By")
+def _group_by_form(step_count, step, dataframes, prefix):
+    table = st.selectbox("Select Table", list(dataframes.keys()),
+                        index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
+                        key=f"{prefix}_group_table_{step_count}")
+
+    df = dataframes[table]
+    available_cols = df.columns.tolist()
+
+    # Group by columns
+    default_group_cols = [col for col in step.get("group_cols", []) if col in available_cols]
+    group_cols = st.multiselect("Group by columns", available_cols,
+                                default=default_group_cols,
+                                key=f"{prefix}_group_cols_{step_count}")
+
+    # Aggregation selection
+    numeric_cols = df.select_dtypes(include='number').columns.tolist()
+    selected_agg_cols = st.multiselect("Select numeric columns to aggregate", numeric_cols,
+                                    default=[col for col in step.get("aggregations", {}).keys() if col in numeric_cols],
+                                    key=f"{prefix}_agg_select_cols_{step_count}")
+
+    agg_dict = step.get("aggregations", {})
+    updated_agg = {}
+    st.markdown("### Aggregation Functions")
+    for col in selected_agg_cols:
+        func = st.selectbox(f"Aggregation for {col}", AGGREGATE_OPTIONS,
+                            index=AGGREGATE_OPTIONS.index(agg_dict.get(col, "sum")) if col in agg_dict else 0,
+                            format_func=AGGREGATE_LABELS.get,
+                            key=f"{prefix}_agg_{step_count}_{col}")
+        updated_agg[col] = func
+
+    # HAVING clause
+    st.markdown("### 📌 HAVING Clause (Optional)")
+    having_conditions = step.get("having_conditions", [])
+    new_having_conditions = []
+
+    for col in selected_agg_cols:
+        col_func = updated_agg[col]
+        use_having = st.checkbox(f"Apply HAVING on {col_func.upper()}({col})?", value=any(cond["column"] == col for cond in having_conditions),
+                                key=f"{prefix}_having_check_{step_count}_{col}")
+        if use_having:
+            comp_op = st.selectbox(f"Operator for {col}", [">", ">=", "<", "<=", "=", "!="],
+                                key=f"{prefix}_having_op_{step_count}_{col}")
+            value = st.number_input(f"Value for {col_func.upper()}({col})", key=f"{prefix}_having_val_{step_count}_{col}")
+            new_having_conditions.append({
+                "column": col,
+                "function": col_func,
+                "operator": comp_op,
+                "value": value
+            })
 
-    elif step_type == "Group By":
-        table = st.selectbox("Select Table", list(dataframes.keys()),
+    approx_toggle(step, prefix, step_count)
+
+    # Update step
+    step.update({
+        "table": table,
+        "group_cols": group_cols,
+        "aggregations": updated_agg,
+        "having_conditions": new_having_conditions
+    })
+
+
+@register_form("Sort Rows")
+def _sort_rows_form(step_count, step, dataframes, prefix):
+    table = st.selectbox("Select Table", list(dataframes.keys()),
+                         index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
+                         key=f"{prefix}_sort_table_{step_count}")
+    available_cols = dataframes[table].columns.tolist()
+    default_sort_cols = [col for col in step.get("columns", []) if col in available_cols]
+
+    sort_cols = st.multiselect("Sort by columns", available_cols,
+                                default=default_sort_cols,
+                                key=f"{prefix}_sort_cols_{step_count}")
+    order = st.radio("Sort Order", ["Ascending", "Descending"],
+                     index=0 if step.get("ascending", True) else 1,
+                     horizontal=True, key=f"{prefix}_sort_order_{step_count}")
+    step.update({"table": table, "columns": sort_cols, "ascending": order == "Ascending"})
+
+
+@register_form("Deduplicate")
+def _deduplicate_form(step_count, step, dataframes, prefix):
+    table = st.selectbox("Select Table", list(dataframes.keys()),
+                         index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
+                         key=f"{prefix}_dedup_table_{step_count}")
+    available_cols = dataframes[table].columns.tolist()
+    subset = st.multiselect("Compare columns (empty = all columns)", available_cols,
+                            default=[col for col in step.get("subset", []) if col in available_cols],
+                            key=f"{prefix}_dedup_subset_{step_count}")
+    keep_labels = list(KEEP_OPTIONS)
+    current_keep = next((label for label, keep in KEEP_OPTIONS.items() if keep == step.get("keep", "first")), keep_labels[0])
+    keep = st.radio("Keep", keep_labels, index=keep_labels.index(current_keep), horizontal=True,
+                    key=f"{prefix}_dedup_keep_{step_count}")
+    step.update({"table": table, "subset": subset, "keep": KEEP_OPTIONS[keep], "table_columns": available_cols})
+
+
+@register_form("Semi Join", "Anti Join")
+def _semi_join_form(step_count, step, dataframes, prefix):
+    st.caption("Keeps the left table's rows that have " + ("a" if step["type"] == "Semi Join" else "no") +
+               " matching key in the right table — no right columns, no duplicated rows.")
+    left_table = st.selectbox("Left Table", list(dataframes.keys()),
+                              index=list(dataframes.keys()).index(step.get("left_table", list(dataframes.keys())[0])),
+                              key=f"{prefix}_semi_left_{step_count}")
+    right_table = st.selectbox("Right Table (lookup)", list(dataframes.keys()),
+                               index=list(dataframes.keys()).index(step.get("right_table", list(dataframes.keys())[0])),
+                               key=f"{prefix}_semi_right_{step_count}")
+    left_cols = list(dataframes[left_table].columns)
+    right_cols = list(dataframes[right_table].columns)
+    left_on = st.selectbox("Left key", left_cols,
+                           index=left_cols.index(step["left_on"]) if step.get("left_on") in left_cols else 0,
+                           key=f"{prefix}_semi_left_on_{step_count}")
+    right_default = step.get("right_on", left_on)
+    right_on = st.selectbox("Right key", right_cols,
+                            index=right_cols.index(right_default) if right_default in right_cols else 0,
+                            key=f"{prefix}_semi_right_on_{step_count}")
+    if dataframes[left_table][left_on].dtype != dataframes[right_table][right_on].dtype:
+        st.warning(f"⚠️ Key types differ: `{dataframes[left_table][left_on].dtype}` vs "
+                   f"`{dataframes[right_table][right_on].dtype}` — values only match if they compare equal.")
+    step.update({"left_table": left_table, "right_table": right_table, "left_on": left_on, "right_on": right_on})
+
+
+@register_form("Join Tables")
+def _join_tables_form(step_count, step, dataframes, prefix):
+    left_table = st.selectbox("Left Table", list(dataframes.keys()),
+                            index=list(dataframes.keys()).index(step.get("left_table", list(dataframes.keys())[0])),
+                            key=f"{prefix}_join_left_{step_count}")
+
+    right_table = st.selectbox("Right Table", list(dataframes.keys()),
+                            index=list(dataframes.keys()).index(step.get("right_table", list(dataframes.keys())[0])),
+                            key=f"{prefix}_join_right_{step_count}")
+
+    join_type = st.selectbox("Join Type", ["inner", "left", "right", "outer"],
+                            index=["inner", "left", "right", "outer"].index(step.get("join_type", "inner")),
+                            key=f"{prefix}_join_type_{step_count}")
+
+    left_cols = list(dataframes[left_table].columns)
+    right_cols = list(dataframes[right_table].columns)
+
+    # Match columns ignoring case
+    left_cols_lower = {col.lower(): col for col in left_cols}
+    right_cols_lower = {col.lower(): col for col in right_cols}
+    common_keys = list(set(left_cols_lower.keys()) & set(right_cols_lower.keys()))
+    common_cols = [left_cols_lower[k] for k in common_keys]
+
+    join_mode = st.radio("Join Key Mode", ["Use Common Column", "Choose Custom Columns"],
+                        index=0 if step.get("left_on") in common_cols else 1,
+                        key=f"{prefix}_join_mode_{step_count}")
+
+    if join_mode == "Use Common Column":
+        default_common = step.get("left_on", common_cols[0] if common_cols else left_cols[0])
+        common_key = st.selectbox("Join Key (common in both tables)", common_cols,
+                                index=common_cols.index(default_common) if default_common in common_cols else 0,
+                                key=f"{prefix}_common_key_{step_count}")
+        left_on = right_on = common_key
+    else:
+        zipped_options = [f"{lcol} ↔ {rcol}" for lcol in left_cols for rcol in right_cols]
+        default_pair = f"{step.get('left_on', left_cols[0])} ↔ {step.get('right_on', right_cols[0])}"
+        selected_pair = st.selectbox("Match Columns", zipped_options,
+                                    index=zipped_options.index(default_pair) if default_pair in zipped_options else 0,
+                                    key=f"{prefix}_custom_join_pair_{step_count}")
+        left_on, right_on = selected_pair.split(" ↔ ")
+
+    # Show dtype mismatch warning
+    try:
+        dtype_left = dataframes[left_table][left_on].dtype
+        dtype_right = dataframes[right_table][right_on].dtype
+        if dtype_left != dtype_right:
+            st.warning(f"⚠️ Mismatched data types: `{left_on}` is {dtype_left}, `{right_on}` is {dtype_right}")
+    except Exception as e:
+        st.error(f"Error checking dtypes: {e}")
+
+    cast_to_str = st.checkbox("Convert join columns to string before joining?", value=True, key=f"{prefix}_cast_str_{step_count}")
+
+    filter_labels = list(RUNTIME_FILTER_MODES)
+    current_filter = next((label for label, mode in RUNTIME_FILTER_MODES.items() if mode == step.get("runtime_filter")), "Off")
+    runtime_filter = st.selectbox("🧹 Runtime filter", filter_labels, index=filter_labels.index(current_filter),
+                                  key=f"{prefix}_join_runtime_filter_{step_count}",
+                                  help="Before merging, drop rows of the larger table whose key can't match the other "
+                                       "table, using a Bloom filter and/or min/max range of the other table's keys.")
+
+    spill_labels = list(SPILL_MODES)
+    current_spill = next((label for label, mode in SPILL_MODES.items() if mode == step.get("spill_join", "auto")), spill_labels[0])
+    spill_join = st.selectbox("💽 Spill join to disk", spill_labels, index=spill_labels.index(current_spill),
+                              key=f"{prefix}_join_spill_{step_count}",
+                              help="Hash-partition both tables to disk and join one partition pair at a time, "
+                                   "streaming the result to the step output folder (needs pyarrow).")
+    join_workers = 1
+    if SPILL_MODES[spill_join] != "never":
+        join_workers = st.number_input("Partition workers (processes)", min_value=1, max_value=os.cpu_count() or 1,
+                                       value=step.get("join_workers", 1), key=f"{prefix}_join_workers_{step_count}")
+
+    step.update({
+        "left_table": left_table,
+        "right_table": right_table,
+        "join_type": join_type,
+        "left_on": left_on,
+        "right_on": right_on,
+        "cast_to_str": cast_to_str,
+        "runtime_filter": RUNTIME_FILTER_MODES[runtime_filter],
+        "spill_join": SPILL_MODES[spill_join],
+        "join_workers": int(join_workers),
+        "output_dir": st.session_state.get(f"{prefix}_step_output_dir"),
+        "is_foreign_key_link": True,
+        "depends_on": [left_table, right_table]
+
+    })
+
+
+@register_form("Aggregate Column")
+def _aggregate_column_form(step_count, step, dataframes, prefix):
+    table = st.selectbox("Select Table", list(dataframes.keys()), 
                             index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
-                            key=f"{prefix}_group_table_{step_count}")
-        
-        df = dataframes[table]
-        available_cols = df.columns.tolist()
-        
-        # Group by columns
-        default_group_cols = [col for col in step.get("group_cols", []) if col in available_cols]
-        group_cols = st.multiselect("Group by columns", available_cols,
-                                    default=default_group_cols,
-                                    key=f"{prefix}_group_cols_{step_count}")
-        
-        # Aggregation selection
-        numeric_cols = df.select_dtypes(include='number').columns.tolist()
-        selected_agg_cols = st.multiselect("Select numeric columns to aggregate", numeric_cols,
-                                        default=[col for col in step.get("aggregations", {}).keys() if col in numeric_cols],
-                                        key=f"{prefix}_agg_select_cols_{step_count}")
-        
-        agg_dict = step.get("aggregations", {})
-        updated_agg = {}
-        st.markdown("### Aggregation Functions")
-        for col in selected_agg_cols:
-            func = st.selectbox(f"Aggregation for {col}", ["sum", "mean", "count", "min", "max"],
-                                index=["sum", "mean", "count", "min", "max"].index(agg_dict.get(col, "sum")) if col in agg_dict else 0,
-                                key=f"{prefix}_agg_{step_count}_{col}")
-            updated_agg[col] = func
-        
-        # HAVING clause
-        st.markdown("### 📌 HAVING Clause (Optional)")
-        having_conditions = step.get("having_conditions", [])
-        new_having_conditions = []
-        
-        for col in selected_agg_cols:
-            col_func = updated_agg[col]
-            use_having = st.checkbox(f"Apply HAVING on {col_func.upper()}({col})?", value=any(cond["column"] == col for cond in having_conditions),
-                                    key=f"{prefix}_having_check_{step_count}_{col}")
-            if use_having:
-                comp_op = st.selectbox(f"Operator for {col}", [">", ">=", "<", "<=", "=", "!="],
-                                    key=f"{prefix}_having_op_{step_count}_{col}")
-                value = st.number_input(f"Value for {col_func.upper()}({col})", key=f"{prefix}_having_val_{step_count}_{col}")
-                new_having_conditions.append({
-                    "column": col,
-                    "function": col_func,
-                    "operator": comp_op,
-                    "value": value
-                })
-        
-        # Update step
+                            key=f"{prefix}_aggcol_table_{step_count}")
+    col = st.selectbox("Column to Aggregate", dataframes[table].select_dtypes(include='number').columns.tolist(),
+                        index=0, key=f"{prefix}_aggcol_col_{step_count}")
+    func = st.selectbox("Aggregation Function", AGGREGATE_OPTIONS, format_func=AGGREGATE_LABELS.get,
+                        index=0, key=f"{prefix}_aggcol_func_{step_count}")
+    alias = st.text_input("Output Column Name (alias)", f"{func}_{col}", key=f"{prefix}_aggcol_alias_{step_count}")
+    step.update({"table": table, "column": col, "function": func, "alias": alias})
+    approx_toggle(step, prefix, step_count)
+
+
+@register_form("Window Function")
+def _window_function_form(step_count, step, dataframes, prefix):
+    table = st.selectbox("Select Table", list(dataframes.keys()),
+                         index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
+                         key=f"{prefix}_window_table_{step_count}")
+    df = dataframes[table]
+    available_cols = df.columns.tolist()
+
+    func = st.selectbox("Window Function", WINDOW_FUNCTIONS,
+                        index=WINDOW_FUNCTIONS.index(step.get("function", "ROW_NUMBER")),
+                        key=f"{prefix}_window_func_{step_count}")
+    partition_by = st.multiselect("PARTITION BY", available_cols,
+                                  default=[col for col in step.get("partition_by", []) if col in available_cols],
+                                  key=f"{prefix}_window_partition_{step_count}")
+    order_by = st.multiselect("ORDER BY", available_cols,
+                              default=[col for col in step.get("order_by", []) if col in available_cols],
+                              key=f"{prefix}_window_order_{step_count}")
+    order = st.radio("Sort Order", ["Ascending", "Descending"], index=0 if step.get("ascending", True) else 1,
+                     horizontal=True, key=f"{prefix}_window_order_dir_{step_count}")
+    if func not in AGGREGATE_FUNCTIONS and not order_by:
+        st.warning(f"⚠️ {func} depends on row order — choose ORDER BY columns.")
+
+    update = {"table": table, "function": func, "partition_by": partition_by, "order_by": order_by,
+              "ascending": order == "Ascending"}
+    if func not in RANKING_FUNCTIONS:
+        value_cols = df.select_dtypes(include="number").columns.tolist() if func in ["SUM", "AVG"] else available_cols
+        update["column"] = st.selectbox("Column", value_cols, key=f"{prefix}_window_col_{step_count}")
+    if func in OFFSET_FUNCTIONS:
+        update["offset"] = int(st.number_input("Offset (rows)", min_value=1, value=int(step.get("offset", 1)),
+                                               step=1, key=f"{prefix}_window_offset_{step_count}"))
+    if func in AGGREGATE_FUNCTIONS:
+        frame_labels = list(FRAMES)
+        update["frame"] = st.selectbox("Frame", frame_labels,
+                                       index=frame_labels.index(step.get("frame", frame_labels[0])),
+                                       key=f"{prefix}_window_frame_{step_count}")
+        if update["frame"] == MOVING:
+            update["frame_rows"] = int(st.number_input("N preceding rows", min_value=1, value=int(step.get("frame_rows", 2)),
+                                                       step=1, key=f"{prefix}_window_frame_rows_{step_count}"))
+
+    default_alias = f"{func.lower()}_{update['column']}" if "column" in update else func.lower()
+    update["alias"] = st.text_input("Output Column Name (alias)", default_alias, key=f"{prefix}_window_alias_{step_count}")
+    step.update(update)
+
+
+@register_form("Modify Column")
+def _modify_column_form(step_count, step, dataframes, prefix):
+    st.subheader("🔧 Modify Column with Operation")
+
+    all_tables = list(dataframes.keys())
+    all_columns = {table: list(dataframes[table].columns) for table in all_tables}
+
+    use_manual_expr = st.checkbox("Use Manual Expression?", key=f"{prefix}_mod_expr_mode_{step_count}")
+
+    if use_manual_expr:
+        expr = st.text_area("Enter custom expression (e.g. tables['table1']['col1'] + tables['table2']['col2'])",
+                            value=step.get("expression", ""),
+                            key=f"{prefix}_mod_expr_{step_count}")
+        new_col = st.text_input("New Column Name", step.get("new_column", "new_col"),
+                                key=f"{prefix}_mod_expr_colname_{step_count}")
+
         step.update({
-            "table": table,
-            "group_cols": group_cols,
-            "aggregations": updated_agg,
-            "having_conditions": new_having_conditions
+            "type": "Modify Column",
+            "expression": expr,
+            "new_column": new_col,
+            "alias": new_col,
+            "mode": "manual",
+            "use_manual_expr": True
         })
 
-    elif step_type == "Sort Rows":
-        table = st.selectbox("Select Table", list(dataframes.keys()),
-                             index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
-                             key=f"{prefix}_sort_table_{step_count}")
-        available_cols = dataframes[table].columns.tolist()
-        default_sort_cols = [col for col in step.get("columns", []) if col in available_cols]
-            
-        sort_cols = st.multiselect("Sort by columns", available_cols,
-                                    default=default_sort_cols,
-                                    key=f"{prefix}_sort_cols_{step_count}")
-        order = st.radio("Sort Order", ["Ascending", "Descending"],
-                         index=0 if step.get("ascending", True) else 1,
-                         horizontal=True, key=f"{prefix}_sort_order_{step_count}")
-        step.update({"table": table, "columns": sort_cols, "ascending": order == "Ascending"})
-        
-    
-    elif step_type == "Join Tables":
-        left_table = st.selectbox("Left Table", list(dataframes.keys()),
-                                index=list(dataframes.keys()).index(step.get("left_table", list(dataframes.keys())[0])),
-                                key=f"{prefix}_join_left_{step_count}")
-
-        right_table = st.selectbox("Right Table", list(dataframes.keys()),
-                                index=list(dataframes.keys()).index(step.get("right_table", list(dataframes.keys())[0])),
-                                key=f"{prefix}_join_right_{step_count}")
-
-        join_type = st.selectbox("Join Type", ["inner", "left", "right", "outer"],
-                                index=["inner", "left", "right", "outer"].index(step.get("join_type", "inner")),
-                                key=f"{prefix}_join_type_{step_count}")
-
-        left_cols = list(dataframes[left_table].columns)
-        right_cols = list(dataframes[right_table].columns)
-
-        # Match columns ignoring case
-        left_cols_lower = {col.lower(): col for col in left_cols}
-        right_cols_lower = {col.lower(): col for col in right_cols}
-        common_keys = list(set(left_cols_lower.keys()) & set(right_cols_lower.keys()))
-        common_cols = [left_cols_lower[k] for k in common_keys]
-
-        join_mode = st.radio("Join Key Mode", ["Use Common Column", "Choose Custom Columns"],
-                            index=0 if step.get("left_on") in common_cols else 1,
-                            key=f"{prefix}_join_mode_{step_count}")
-
-        if join_mode == "Use Common Column":
-            default_common = step.get("left_on", common_cols[0] if common_cols else left_cols[0])
-            common_key = st.selectbox("Join Key (common in both tables)", common_cols,
-                                    index=common_cols.index(default_common) if default_common in common_cols else 0,
-                                    key=f"{prefix}_common_key_{step_count}")
-            left_on = right_on = common_key
+    else:
+        table1 = st.selectbox("Table 1", all_tables, index=0, key=f"{prefix}_mod_table1_{step_count}")
+        col1 = st.selectbox("Column from Table 1", all_columns[table1], index=0, key=f"{prefix}_mod_col1_{step_count}")
+        col1_dtype = str(dataframes[table1][col1].dtype)
+
+        mode = st.radio("Use another column or constant?", ["Column from another table", "Manual constant"],
+                        key=f"{prefix}_mod_rhs_mode_{step_count}")
+
+        if mode == "Column from another table":
+            table2 = st.selectbox("Table 2", all_tables, index=0, key=f"{prefix}_mod_table2_{step_count}")
+            col2 = st.selectbox("Column from Table 2", all_columns[table2], index=0, key=f"{prefix}_mod_col2_{step_count}")
+            col2_dtype = str(dataframes[table2][col2].dtype)
+            right_expr = f"tables['{table2}']['{col2}']"
         else:
-            zipped_options = [f"{lcol} ↔ {rcol}" for lcol in left_cols for rcol in right_cols]
-            default_pair = f"{step.get('left_on', left_cols[0])} ↔ {step.get('right_on', right_cols[0])}"
-            selected_pair = st.selectbox("Match Columns", zipped_options,
-                                        index=zipped_options.index(default_pair) if default_pair in zipped_options else 0,
-                                        key=f"{prefix}_custom_join_pair_{step_count}")
-            left_on, right_on = selected_pair.split(" ↔ ")
-
-        # Show dtype mismatch warning
-        try:
-            dtype_left = dataframes[left_table][left_on].dtype
-            dtype_right = dataframes[right_table][right_on].dtype
-            if dtype_left != dtype_right:
-                st.warning(f"⚠️ Mismatched data types: `{left_on}` is {dtype_left}, `{right_on}` is {dtype_right}")
-        except Exception as e:
-            st.error(f"Error checking dtypes: {e}")
+            const_value = st.text_input("Enter constant value", key=f"{prefix}_mod_const_{step_count}")
+            col2_dtype = type(const_value).__name__
+            right_expr = const_value
 
-        cast_to_str = st.checkbox("Convert join columns to string before joining?", value=True, key=f"{prefix}_cast_str_{step_count}")
+        # Determine allowed operations
+        numeric_ops = {"+": "Addition (+)", "-": "Subtraction (-)", "*": "Multiplication (*)", "/": "Division (/)", "%": "Modulo (%)", "**": "Power (**)","==": "Equal (==)", "!=": "Not Equal (!=)", ">": "Greater Than (>)", "<": "Less Than (<)", ">=": "Greater or Equal (>=)", "<=": "Less or Equal (<=)"}
+        string_ops = {"+": "Concatenate (+)", "==": "Equal (==)", "!=": "Not Equal (!=)"}
 
-        step.update({
-            "left_table": left_table,
-            "right_table": right_table,
-            "join_type": join_type,
-            "left_on": left_on,
-            "right_on": right_on,
-            "cast_to_str": cast_to_str,
-            "is_foreign_key_link": True,
-            "depends_on": [left_table, right_table]
+        if ("object" in col1_dtype or "str" in col1_dtype) or ("object" in col2_dtype or "str" in col2_dtype):
+            operator_display = string_ops
+        else:
+            operator_display = numeric_ops
+
+        operator = st.selectbox(
+            "Operation",
+            options=list(operator_display.keys()),
+            format_func=lambda op: operator_display[op],
+            index=0,
+            key=f"{prefix}_mod_op_{step_count}"
+        )
 
-        })
+        new_col = st.text_input("New Column Name", f"{col1}_{operator}_new", key=f"{prefix}_mod_new_col_{step_count}")
+        full_expr = f"tables['{table1}']['{col1}'] {operator} {right_expr}"
 
-    elif step_type == "Aggregate Column":
-        table = st.selectbox("Select Table", list(dataframes.keys()), 
-                                index=list(dataframes.keys()).index(step.get("table", list(dataframes.keys())[0])),
-                                key=f"{prefix}_aggcol_table_{step_count}")
-        col = st.selectbox("Column to Aggregate", dataframes[table].select_dtypes(include='number').columns.tolist(),
-                            index=0, key=f"{prefix}_aggcol_col_{step_count}")
-        func = st.selectbox("Aggregation Function", ["sum", "mean", "count", "min", "max"],
-                            index=0, key=f"{prefix}_aggcol_func_{step_count}")
-        alias = st.text_input("Output Column Name (alias)", f"{func}_{col}", key=f"{prefix}_aggcol_alias_{step_count}")
-        step.update({"table": table, "column": col, "function": func, "alias": alias})
-
-    elif step_type == "Modify Column":
-        st.subheader("🔧 Modify Column with Operation")
-
-        all_tables = list(dataframes.keys())
-        all_columns = {table: list(dataframes[table].columns) for table in all_tables}
-
-        use_manual_expr = st.checkbox("Use Manual Expression?", key=f"{prefix}_mod_expr_mode_{step_count}")
-
-        if use_manual_expr:
-            expr = st.text_area("Enter custom expression (e.g. tables['table1']['col1'] + tables['table2']['col2'])",
-                                value=step.get("expression", ""),
-                                key=f"{prefix}_mod_expr_{step_count}")
-            new_col = st.text_input("New Column Name", step.get("new_column", "new_col"),
-                                    key=f"{prefix}_mod_expr_colname_{step_count}")
-
-            step.update({
-                "type": "Modify Column",
-                "expression": expr,
-                "new_column": new_col,
-                "alias": new_col,
-                "mode": "manual",
-                "use_manual_expr": True
-            })
+        st.code(f"{new_col} = {full_expr}", language="python")
 
-        else:
-            table1 = st.selectbox("Table 1", all_tables, index=0, key=f"{prefix}_mod_table1_{step_count}")
-            col1 = st.selectbox("Column from Table 1", all_columns[table1], index=0, key=f"{prefix}_mod_col1_{step_count}")
-            col1_dtype = str(dataframes[table1][col1].dtype)
-
-            mode = st.radio("Use another column or constant?", ["Column from another table", "Manual constant"],
-                            key=f"{prefix}_mod_rhs_mode_{step_count}")
-
-            if mode == "Column from another table":
-                table2 = st.selectbox("Table 2", all_tables, index=0, key=f"{prefix}_mod_table2_{step_count}")
-                col2 = st.selectbox("Column from Table 2", all_columns[table2], index=0, key=f"{prefix}_mod_col2_{step_count}")
-                col2_dtype = str(dataframes[table2][col2].dtype)
-                right_expr = f"tables['{table2}']['{col2}']"
-            else:
-                const_value = st.text_input("Enter constant value", key=f"{prefix}_mod_const_{step_count}")
-                col2_dtype = type(const_value).__name__
-                right_expr = const_value
+        step.update({
+            "type": "Modify Column",
+            "table": table1,
+            "table1": table1,
+            "col1": col1,
+            "operator": operator,
+            "rhs_mode": mode,
+            "table2": table2 if mode == "Column from another table" else "",
+            "col2": col2 if mode == "Column from another table" else "",
+            "constant": const_value if mode == "Manual constant" else "",
+            "new_column": new_col,
+            "alias": new_col,
+            "mode": "standard",
+            "expression": full_expr,
+            "use_manual_expr": False,
+            "col1_table": table1,
+            "col2_table": table2 if mode == "Column from another table" else None,
+            "col1_dtype": col1_dtype,
+            "col2_dtype": col2_dtype
+        })
 
-            # Determine allowed operations
-            numeric_ops = {"+": "Addition (+)", "-": "Subtraction (-)", "*": "Multiplication (*)", "/": "Division (/)", "%": "Modulo (%)", "**": "Power (**)","==": "Equal (==)", "!=": "Not Equal (!=)", ">": "Greater Than (>)", "<": "Less Than (<)", ">=": "Greater or Equal (>=)", "<=": "Less or Equal (<=)"}
-            string_ops = {"+": "Concatenate (+)", "==": "Equal (==)", "!=": "Not Equal (!=)"}
 
-            if ("object" in col1_dtype or "str" in col1_dtype) or ("object" in col2_dtype or "str" in col2_dtype):
-                operator_display = string_ops
-            else:
-                operator_display = numeric_ops
-
-            operator = st.selectbox(
-                "Operation",
-                options=list(operator_display.keys()),
-                format_func=lambda op: operator_display[op],
-                index=0,
-                key=f"{prefix}_mod_op_{step_count}"
-            )
+@register_form("Create & Save New Table")
+def _create_save_new_table_form(step_count, step, dataframes, prefix):
+    st.markdown("### 🧱 Create and Save a New Table")
 
-            new_col = st.text_input("New Column Name", f"{col1}_{operator}_new", key=f"{prefix}_mod_new_col_{step_count}")
-            full_expr = f"tables['{table1}']['{col1}'] {operator} {right_expr}"
-
-            st.code(f"{new_col} = {full_expr}", language="python")
-
-            step.update({
-                "type": "Modify Column",
-                "table": table1,
-                "table1": table1,
-                "col1": col1,
-                "operator": operator,
-                "rhs_mode": mode,
-                "table2": table2 if mode == "Column from another table" else "",
-                "col2": col2 if mode == "Column from another table" else "",
-                "constant": const_value if mode == "Manual constant" else "",
-                "new_column": new_col,
-                "alias": new_col,
-                "mode": "standard",
-                "expression": full_expr,
-                "use_manual_expr": False,
-                "col1_table": table1,
-                "col2_table": table2 if mode == "Column from another table" else None,
-                "col1_dtype": col1_dtype,
-                "col2_dtype": col2_dtype
-            })
+    table_names = list(dataframes.keys())
+    use_existing = st.checkbox("Use columns from existing table?", key=f"{prefix}_use_existing_{id(step)}")
 
-    elif step_type == "Create & Save New Table":
-        st.markdown("### 🧱 Create and Save a New Table")
-
-        table_names = list(dataframes.keys())
-        use_existing = st.checkbox("Use columns from existing table?", key=f"{prefix}_use_existing_{id(step)}")
-
-        base_df = None
-        base_columns = []
-        if use_existing and table_names:
-            base_table = st.selectbox("Select Base Table", table_names, key=f"{prefix}_base_table_{id(step)}")
-            base_df = dataframes[base_table]
-            base_columns = st.multiselect(
-                "Select Columns from Base Table",
-                options=base_df.columns.tolist(),
-                default=base_df.columns.tolist(),
-                key=f"base_table_selected_cols_{id(step)}"
-            )
+    base_df = None
+    base_columns = []
+    if use_existing and table_names:
+        base_table = st.selectbox("Select Base Table", table_names, key=f"{prefix}_base_table_{id(step)}")
+        base_df = dataframes[base_table]
+        base_columns = st.multiselect(
+            "Select Columns from Base Table",
+            options=base_df.columns.tolist(),
+            default=base_df.columns.tolist(),
+            key=f"base_table_selected_cols_{id(step)}"
+        )
 
-        st.markdown("#### ➕ Define New Columns")
-        custom_columns_str = st.text_input(
-            "Enter New Column Names (comma-separated)",
-            value=step.get("custom_columns_str", "col1, col2"),
-            key=f"{prefix}_custom_columns_str_{id(step)}"
+    st.markdown("#### ➕ Define New Columns")
+    custom_columns_str = st.text_input(
+        "Enter New Column Names (comma-separated)",
+        value=step.get("custom_columns_str", "col1, col2"),
+        key=f"{prefix}_custom_columns_str_{id(step)}"
+    )
+    custom_columns = [col.strip() for col in custom_columns_str.split(",") if col.strip()]
+
+    st.markdown("#### 🧬 Select Data Types for Custom Columns")
+    dtypes = {}
+    for col in custom_columns:
+        dtype = st.selectbox(
+            f"Data Type for {col}",
+            ["str", "int", "float", "datetime"],
+            key=f"{prefix}_dtype_{col}_{id(step)}"
         )
-        custom_columns = [col.strip() for col in custom_columns_str.split(",") if col.strip()]
+        dtypes[col] = dtype
+
+    st.markdown("#### 📝 Enter Row Data for New Columns")
+    st.caption("Separate rows with `;` and values with `,` — e.g. `a,1.5; b,2.3`")
+    row_data_input = st.text_area(
+        "Enter Data",
+        value=step.get("row_data_input", ""),
+        key=f"{prefix}_row_data_input_{id(step)}"
+    )
 
-        st.markdown("#### 🧬 Select Data Types for Custom Columns")
-        dtypes = {}
-        for col in custom_columns:
-            dtype = st.selectbox(
-                f"Data Type for {col}",
-                ["str", "int", "float", "datetime"],
-                key=f"{prefix}_dtype_{col}_{id(step)}"
-            )
-            dtypes[col] = dtype
+    # Parse rows only if input is not empty
+    rows = []
+    if row_data_input.strip():
+        for row in row_data_input.strip().split(";"):
+            values = [val.strip() for val in row.strip().split(",")]
+            if len(values) == len(custom_columns):
+                rows.append(values)
+
+    # Only proceed if base table or manual rows are available
+    if (use_existing and base_df is not None and base_columns) or rows:
+        # Save a reference to the base table plus the typed-in delta; rows are assembled at execution
+        use_base = bool(use_existing and base_df is not None and base_columns)
+        step["use_existing"] = use_base
+        step["base_table"] = base_table if use_base else ""
+        step["base_columns"] = base_columns if use_base else []
+        step["custom_columns"] = custom_columns
+        step["rows"] = rows
+        step["columns"] = step["base_columns"] + [col for col in custom_columns if col not in step["base_columns"]]
+        step["dtypes"] = dtypes
+        step["custom_columns_str"] = custom_columns_str
+        step["row_data_input"] = row_data_input
+        step.pop("data", None)
+
+        st.markdown("#### ✅ Final Preview")
+        st.dataframe(assemble_new_table(step, dataframes, limit=NEW_TABLE_PREVIEW_ROWS))
+        if use_base and len(base_df) > NEW_TABLE_PREVIEW_ROWS:
+            st.caption(f"Showing the first {NEW_TABLE_PREVIEW_ROWS} of {len(base_df):,} rows.")
+
+        output_name = st.text_input("Output Table Name", value=step.get("output_name", "new_table"), key=f"{prefix}_output_name_{id(step)}")
+        step["output_name"] = output_name
+    else:
+        st.error("❌ Please select a base table or enter row data manually to create a new table.")
 
-        st.markdown("#### 📝 Enter Row Data for New Columns")
-        st.caption("Separate rows with `;` and values with `,` — e.g. `a,1.5; b,2.3`")
-        row_data_input = st.text_area(
-            "Enter Data",
-            value=step.get("row_data_input", ""),
-            key=f"{prefix}_row_data_input_{id(step)}"
-        )
 
-        # Parse rows only if input is not empty
-        rows = []
-        if row_data_input.strip():
-            for row in row_data_input.strip().split(";"):
-                values = [val.strip() for val in row.strip().split(",")]
-                if len(values) == len(custom_columns):
-                    rows.append(values)
+@register_form("INSERT")
+def _insert_form(step_count, step, dataframes, prefix):
+    st.markdown("### ➕ INSERT INTO Table")
+    table_name = st.selectbox("Select Table to Insert Into", list(dataframes.keys()), key=f"{prefix}_insert_table")
+    insert_df = dataframes[table_name]
+    all_columns = insert_df.columns.tolist()
 
-        # Only proceed if base table or manual rows are available
-        if (use_existing and base_df is not None and base_columns) or rows:
-            new_df = pd.DataFrame(rows, columns=custom_columns if custom_columns else None)
+    columns = st.multiselect("Select Columns to Insert", options=all_columns, key=f"{prefix}_insert_columns")
 
-            # Convert data types
-            for col, dtype in dtypes.items():
-                try:
-                    if dtype == "datetime":
-                        new_df[col] = pd.to_datetime(new_df[col], errors="coerce")
-                    else:
-                        new_df[col] = new_df[col].astype(dtype)
-                except Exception as e:
-                    st.warning(f"⚠️ Could not convert {col} to {dtype}: {e}")
-
-            # Merge with base columns if needed
-            if use_existing and base_df is not None and base_columns:
-                new_df = pd.concat([base_df[base_columns].reset_index(drop=True), new_df], axis=1)
-
-            st.markdown("#### ✅ Final Preview")
-            st.dataframe(new_df)
-
-            # Save step info
-            step["data"] = new_df.to_dict(orient="records")
-            step["columns"] = new_df.columns.tolist()
-            step["dtypes"] = dtypes
-            step["custom_columns_str"] = custom_columns_str
-            step["row_data_input"] = row_data_input
-            output_name = st.text_input("Output Table Name", value=step.get("output_name", "new_table"), key=f"{prefix}_output_name_{id(step)}")
-            step["output_name"] = output_name
-        else:
-            st.error("❌ Please select a base table or enter row data manually to create a new table.")
+    if columns:
+        values = {}
+        for col in columns:
+            values[col] = st.text_input(f"Enter value for `{col}`", key=f"{prefix}_insert_value_{col}")
 
-    elif step_type == "INSERT":
-        st.markdown("### ➕ INSERT INTO Table")
-        table_name = st.selectbox("Select Table to Insert Into", list(dataframes.keys()), key=f"{prefix}_insert_table")
-        insert_df = dataframes[table_name]
-        all_columns = insert_df.columns.tolist()
+        if st.button("Run INSERT", key=f"{prefix}_run_insert"):
+            try:
+                # Step 1: Build a full row with None for missing columns
+                full_row = {col: values.get(col, None) for col in all_columns}
 
-        columns = st.multiselect("Select Columns to Insert", options=all_columns, key=f"{prefix}_insert_columns")
+                # Step 2: Append safely using pd.concat
+                new_row_df = pd.DataFrame([full_row])
+                insert_df = pd.concat([insert_df, new_row_df], ignore_index=True)
 
-        if columns:
-            values = {}
-            for col in columns:
-                values[col] = st.text_input(f"Enter value for `{col}`", key=f"{prefix}_insert_value_{col}")
+                st.success("✅ Row inserted successfully.")
+                st.dataframe(insert_df)
 
-            if st.button("Run INSERT", key=f"{prefix}_run_insert"):
-                try:
-                    # Step 1: Build a full row with None for missing columns
-                    full_row = {col: values.get(col, None) for col in all_columns}
+                # Step 3: Save updated dataframe
+                dataframes[table_name] = insert_df
 
-                    # Step 2: Append safely using pd.concat
-                    new_row_df = pd.DataFrame([full_row])
-                    insert_df = pd.concat([insert_df, new_row_df], ignore_index=True)
+                # Optional: save step SQL
+                step["sql"] = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join([repr(values[col]) for col in columns])});"
+                step["table"] = table_name
+                step["columns"] = columns
+                step["values"] = values
 
-                    st.success("✅ Row inserted successfully.")
-                    st.dataframe(insert_df)
+            except Exception as e:
+                st.error(f"❌ Error during insert: {e}")
 
-                    # Step 3: Save updated dataframe
-                    dataframes[table_name] = insert_df
 
-                    # Optional: save step SQL
-                    step["sql"] = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join([repr(values[col]) for col in columns])});"
-                    step["table"] = table_name
-                    step["columns"] = columns
-                    step["values"] = values
+@register_form("UPDATE")
+def _update_form(step_count, step, dataframes, prefix):
+    st.markdown("### 🔄 UPDATE Table")
 
-                except Exception as e:
-                    st.error(f"❌ Error during insert: {e}")
+    table_name = st.selectbox("Select Table to Update", list(dataframes.keys()), key=f"{prefix}_update_table")
+    df = dataframes[table_name]
+    col_options = df.columns.tolist()
 
-    elif step_type == "UPDATE":
-        st.markdown("### 🔄 UPDATE Table")
+    # Condition to filter matching rows
+    condition_col = st.selectbox("Update where Column =", col_options, key=f"{prefix}_cond_col")
+    st.dataframe(df)
+    condition_val = st.text_input("Match value (WHERE column = ...)", key=f"{prefix}_cond_val")
 
-        table_name = st.selectbox("Select Table to Update", list(dataframes.keys()), key=f"{prefix}_update_table")
-        df = dataframes[table_name]
-        col_options = df.columns.tolist()
+    update_col = st.selectbox("Select Column to Update", col_options, key=f"{prefix}_update_col")
+    new_value = st.text_input("New Value for selected column", key=f"{prefix}_new_val")
 
-        # Condition to filter matching rows
-        condition_col = st.selectbox("Update where Column =", col_options, key=f"{prefix}_cond_col")
-        st.dataframe(df)
-        condition_val = st.text_input("Match value (WHERE column = ...)", key=f"{prefix}_cond_val")
+    step["type"] = "UPDATE"
+    step["table"] = table_name
+    step["condition_col"] = condition_col
+    step["condition_val"] = condition_val
+    step["update_col"] = update_col
+    step["new_value"] = new_value
 
-        update_col = st.selectbox("Select Column to Update", col_options, key=f"{prefix}_update_col")
-        new_value = st.text_input("New Value for selected column", key=f"{prefix}_new_val")
+    if condition_col and condition_val:
+        mask = df[condition_col].astype(str).str.strip() == condition_val.strip()
+        matched_df = df[mask]
 
-        step["type"] = "UPDATE"
-        step["table"] = table_name
-        step["condition_col"] = condition_col
-        step["condition_val"] = condition_val
-        step["update_col"] = update_col
-        step["new_value"] = new_value
-
-        if condition_col and condition_val:
-            mask = df[condition_col].astype(str).str.strip() == condition_val.strip()
-            matched_df = df[mask]
-
-            if not matched_df.empty:
-                st.write("🔍 Matching Rows Found:")
-                st.dataframe(matched_df)
-
-                # Allow user to select which row indices to update
-                selectable_indices = matched_df.index.tolist()
-                selected_indices = st.multiselect(
-                    "✅ Select rows (by index) to apply the update:", 
-                    options=selectable_indices,
-                    default=selectable_indices  # default to all
-                )
-            else:
-                st.warning("⚠️ No rows matched. Try checking the condition value.")
-                selected_indices = []
+        if not matched_df.empty:
+            st.write("🔍 Matching Rows Found:")
+            st.dataframe(matched_df)
 
+            # Allow user to select which row indices to update
+            selectable_indices = matched_df.index.tolist()
+            selected_indices = st.multiselect(
+                "✅ Select rows (by index) to apply the update:", 
+                options=selectable_indices,
+                default=selectable_indices  # default to all
+            )
         else:
+            st.warning("⚠️ No rows matched. Try checking the condition value.")
             selected_indices = []
 
-        if st.button("Run UPDATE", key=f"{prefix}_run_update"):
-            try:
-                if not selected_indices:
-                    st.warning("⚠️ No rows selected to update.")
-                else:
-                    # Show before update
-                    st.write("🟡 Rows BEFORE update:")
-                    st.dataframe(df.loc[selected_indices])
+    else:
+        selected_indices = []
+
+    if st.button("Run UPDATE", key=f"{prefix}_run_update"):
+        try:
+            if not selected_indices:
+                st.warning("⚠️ No rows selected to update.")
+            else:
+                # Show before update
+                st.write("🟡 Rows BEFORE update:")
+                st.dataframe(df.loc[selected_indices])
+
+                # Apply update to only selected rows (on a private copy if the table is shared)
+                df = copy_if_shared(df)
+                df.loc[selected_indices, update_col] = new_value
+                drop_indexes(df, update_col)
+                dataframes[table_name] = df  # save to session
+
+                st.success(f"✅ UPDATE applied to `{len(selected_indices)}` row(s) in `{table_name}`.")
+
+                # Show after update
+                st.write("🟢 Rows AFTER update:")
+                st.dataframe(df.loc[selected_indices])
+
+        except Exception as e:
+            st.error(f"❌ Error applying UPDATE: {e}")
+
 
-                    # Apply update to only selected rows
-                    df.loc[selected_indices, update_col] = new_value
-                    dataframes[table_name] = df  # save to session
+@register_form("DELETE")
+def _delete_form(step_count, step, dataframes, prefix):
+    st.markdown("### ❌ DELETE From Table")
 
-                    st.success(f"✅ UPDATE applied to `{len(selected_indices)}` row(s) in `{table_name}`.")
+    table_name = st.selectbox("Select Table to Delete From", list(dataframes.keys()), key=f"{prefix}_delete_table")
+    step["table"] = table_name
+    delete_df = dataframes[table_name]
 
-                    # Show after update
-                    st.write("🟢 Rows AFTER update:")
-                    st.dataframe(df.loc[selected_indices])
+    condition_col = st.selectbox("Select Condition Column", delete_df.columns, key=f"{prefix}_delete_cond_col")
+    condition_val = st.text_input(f"Delete where `{condition_col}` =", key=f"{prefix}_delete_cond_val")
 
+    # ✅ Save condition to step
+    step["condition_col"] = condition_col
+    step["condition_val"] = condition_val
+
+    # ✅ Type-safe comparison
+    try:
+        val_casted = delete_df[condition_col].dtype.type(condition_val)
+    except:
+        val_casted = condition_val
+
+    matching_rows = delete_df[delete_df[condition_col] == val_casted]
+
+    if not matching_rows.empty:
+        st.write("### Matching Rows:")
+        matching_rows_display = matching_rows.reset_index()
+        selected_indices = st.multiselect(
+            "Select row(s) to delete",
+            options=matching_rows_display["index"].tolist(),
+            format_func=lambda i: f"Row {i}: {delete_df.loc[i].to_dict()}"
+        )
+
+        if st.button("Run DELETE", key=f"{prefix}_run_delete"):
+            try:
+                before_count = len(delete_df)
+                delete_df = delete_df.drop(index=selected_indices)
+                after_count = len(delete_df)
+                dataframes[table_name] = delete_df.reset_index(drop=True)
+
+                step["sql"] = f"DELETE FROM {table_name} WHERE {condition_col} = '{condition_val}' AND index IN ({','.join(map(str, selected_indices))})"
+                st.success(f"✅ Deleted {before_count - after_count} row(s).")
+                st.dataframe(dataframes[table_name])
             except Exception as e:
-                st.error(f"❌ Error applying UPDATE: {e}")
+                st.error(f"❌ Error during delete: {e}")
+    else:
+        st.info("ℹ️ No matching rows found.")
 
 
-    elif step_type == "DELETE":
-        st.markdown("### ❌ DELETE From Table")
+@register_form("Set Operation")
+def _set_operation_form(step_count, step, dataframes, prefix):
+    st.markdown("### 📊 Set Operation (UNION / INTERSECT / EXCEPT)")
 
-        table_name = st.selectbox("Select Table to Delete From", list(dataframes.keys()), key=f"{prefix}_delete_table")
-        step["table"] = table_name
-        delete_df = dataframes[table_name]
+    # 👈 Select first table
+    table1 = st.selectbox(
+        "Select First Table",
+        options=list(dataframes.keys()),
+        key=f"{prefix}_setop_table1"
+    )
 
-        condition_col = st.selectbox("Select Condition Column", delete_df.columns, key=f"{prefix}_delete_cond_col")
-        condition_val = st.text_input(f"Delete where `{condition_col}` =", key=f"{prefix}_delete_cond_val")
+    # 👈 Select second table (exclude same table)
+    table2 = st.selectbox(
+        "Select Second Table",
+        options=[t for t in dataframes.keys() if t != table1],
+        key=f"{prefix}_setop_table2"
+    )
 
-        # ✅ Save condition to step
-        step["condition_col"] = condition_col
-        step["condition_val"] = condition_val
+    # 👈 Select set operation
+    operation = st.selectbox(
+        "Select Set Operation",
+        options=["UNION", "UNION ALL", "INTERSECT", "EXCEPT"],
+        key=f"{prefix}_setop_operation"
+    )
 
-        # ✅ Type-safe comparison
-        try:
-            val_casted = delete_df[condition_col].dtype.type(condition_val)
-        except:
-            val_casted = condition_val
+    # ✅ Save selected values into the step dictionary
+    step["table1"] = table1
+    step["table2"] = table2
+    step["operation"] = operation
+    step["output_name"] = f"{table1}_{operation.replace(' ', '_')}_{table2}"
 
-        matching_rows = delete_df[delete_df[condition_col] == val_casted]
 
-        if not matching_rows.empty:
-            st.write("### Matching Rows:")
-            matching_rows_display = matching_rows.reset_index()
-            selected_indices = st.multiselect(
-                "Select row(s) to delete",
-                options=matching_rows_display["index"].tolist(),
-                format_func=lambda i: f"Row {i}: {delete_df.loc[i].to_dict()}"
-            )
+@register_form("Create Table with Primary Key")
+def _create_table_with_primary_key_form(step_count, step, dataframes, prefix):
+    st.markdown("### 🏗️ Create New Table with Primary Key")
+    table_name = st.text_input("🆕 Table name", key=f"{prefix}_table_name")
 
-            if st.button("Run DELETE", key=f"{prefix}_run_delete"):
-                try:
-                    before_count = len(delete_df)
-                    delete_df = delete_df.drop(index=selected_indices)
-                    after_count = len(delete_df)
-                    dataframes[table_name] = delete_df.reset_index(drop=True)
-
-                    step["sql"] = f"DELETE FROM {table_name} WHERE {condition_col} = '{condition_val}' AND index IN ({','.join(map(str, selected_indices))})"
-                    st.success(f"✅ Deleted {before_count - after_count} row(s).")
-                    st.dataframe(dataframes[table_name])
-                except Exception as e:
-                    st.error(f"❌ Error during delete: {e}")
-        else:
-            st.info("ℹ️ No matching rows found.")
+    cols_input = st.text_area("📋 Enter column names (comma-separated)", key=f"{prefix}_cols")
 
-    elif step_type == "Set Operation":
-        st.markdown("### 📊 Set Operation (UNION / INTERSECT / EXCEPT)")
+    if cols_input:
+        columns = [col.strip() for col in cols_input.split(",") if col.strip()]
+        dtypes = {}
+        st.markdown("### 🧬 Select Data Types for Each Column")
 
-        # 👈 Select first table
-        table1 = st.selectbox(
-            "Select First Table",
-            options=list(dataframes.keys()),
-            key=f"{prefix}_setop_table1"
-        )
+        # Step 2: Choose data type per column
+        for col in columns:
+            dtype = st.selectbox(
+                f"📌 Data type for `{col}`",
+                ["INT", "TEXT", "FLOAT", "DATE", "BOOLEAN"],
+                key=f"{prefix}_dtype_{col}"
+            )
+            dtypes[col] = dtype
 
-        # 👈 Select second table (exclude same table)
-        table2 = st.selectbox(
-            "Select Second Table",
-            options=[t for t in dataframes.keys() if t != table1],
-            key=f"{prefix}_setop_table2"
-        )
+        # Step 3: Choose primary key
+        pk_column = st.selectbox("🔑 Select Primary Key", options=columns, key=f"{prefix}_pk_select")
 
-        # 👈 Select set operation
-        operation = st.selectbox(
-            "Select Set Operation",
-            options=["UNION", "UNION ALL", "INTERSECT", "EXCEPT"],
-            key=f"{prefix}_setop_operation"
+        row_input = st.text_area(
+            "📝 Enter row values (one row per line, comma-separated)",
+            placeholder="e.g.\n1, Alice, 100.5\n2, Bob, 200.3",
+            key=f"{prefix}_row_input"
         )
+        step["data"] = row_input 
+        step["insert_batch_size"] = st.number_input("Rows per INSERT statement", min_value=1,
+                                                    value=step.get("insert_batch_size", DEFAULT_INSERT_BATCH_SIZE),
+                                                    key=f"{prefix}_pk_batch_size")
 
-        # ✅ Save selected values into the step dictionary
-        step["table1"] = table1
-        step["table2"] = table2
-        step["operation"] = operation
-        step["output_name"] = f"{table1}_{operation.replace(' ', '_')}_{table2}"
-
-    elif step_type == "Create Table with Primary Key":
-        st.markdown("### 🏗️ Create New Table with Primary Key")
-        table_name = st.text_input("🆕 Table name", key=f"{prefix}_table_name")
+        parsed_rows = pd.DataFrame()
+        if row_input:
+            try:
+                parsed_rows = parse_pasted_rows(row_input, columns)
+            except Exception as e:
+                st.error(f"❌ Error parsing row values: {e}")
+                parsed_rows = pd.DataFrame()
 
-        cols_input = st.text_area("📋 Enter column names (comma-separated)", key=f"{prefix}_cols")
 
-        if cols_input:
-            columns = [col.strip() for col in cols_input.split(",") if col.strip()]
-            dtypes = {}
-            st.markdown("### 🧬 Select Data Types for Each Column")
 
-            # Step 2: Choose data type per column
-            for col in columns:
-                dtype = st.selectbox(
-                    f"📌 Data type for `{col}`",
-                    ["INT", "TEXT", "FLOAT", "DATE", "BOOLEAN"],
-                    key=f"{prefix}_dtype_{col}"
+        if st.button("✅ Confirm Table Definition", key=f"{prefix}_confirm_create_table"):
+            step["columns"] = columns
+            step["dtypes"] = dtypes
+            step["primary_key"] = pk_column
+            step["output_name"] = table_name
+            step["data"] = row_input
+            st.success(f"✅ Table `{table_name}` with primary key `{pk_column}` defined.")
+
+
+@register_form("Handle Missing Values")
+def _handle_missing_values_form(step_count, step, dataframes, prefix):
+    st.markdown("### 🩹 Handle Missing Values")
+
+    # Select table
+    table_name = st.selectbox("Select Table", list(dataframes.keys()), key=f"{prefix}_missing_table")
+    df = dataframes[table_name]
+
+    # Show null summary
+    st.subheader("🔍 Null Summary")
+    null_summary = null_counts(df)
+    null_df = null_summary[null_summary > 0].to_frame(name="Null Count")
+    if not null_df.empty:
+        st.dataframe(null_df)
+    else:
+        st.success("✅ No missing values in the dataset.")
+
+    batch_mode = st.checkbox("🧺 Batch mode (many columns, one strategy per data type)",
+                             value=step.get("batch_mode", False), key=f"{prefix}_missing_batch_{step_count}")
+
+    if not null_df.empty and batch_mode:
+        null_cols = null_df.index.tolist()
+        default_cols = [col for col in step.get("columns", null_cols) if col in null_cols]
+        cols = st.multiselect("Columns to Treat", null_cols, default=default_cols,
+                              key=f"{prefix}_missing_batch_cols_{step_count}")
+
+        groups_present = sorted({dtype_group(df[col].dtype) for col in cols})
+        dtype_strategies = {}
+        custom_values = {}
+        for group in groups_present:
+            options = MISSING_STRATEGIES_BY_GROUP[group]
+            prev = step.get("dtype_strategies", {}).get(group, options[0])
+            dtype_strategies[group] = st.selectbox(
+                f"Strategy for {group} columns", options,
+                index=options.index(prev) if prev in options else 0,
+                key=f"{prefix}_missing_batch_strategy_{group}_{step_count}"
+            )
+            if dtype_strategies[group] == "Fill with Custom Value":
+                custom_values[group] = st.text_input(
+                    f"Custom fill value for {group} columns",
+                    value=step.get("custom_values", {}).get(group, ""),
+                    key=f"{prefix}_missing_batch_custom_{group}_{step_count}"
                 )
-                dtypes[col] = dtype
 
-            # Step 3: Choose primary key
-            pk_column = st.selectbox("🔑 Select Primary Key", options=columns, key=f"{prefix}_pk_select")
+        step.update({
+            "table": table_name,
+            "batch_mode": True,
+            "columns": cols,
+            "dtype_strategies": dtype_strategies,
+            "custom_values": custom_values,
+            "table_columns": df.columns.tolist(),
+        })
+        fill_values, drop_cols = plan_missing_value_batch(df, step)
+        step["fill_values"] = fill_values
+        step["drop_columns"] = drop_cols
+
+        if fill_values:
+            st.caption("🧮 Fill values")
+            st.dataframe(pd.Series(fill_values, name="Fill Value").astype(str).to_frame())
+
+    # Proceed only if nulls exist
+    elif not null_df.empty:
+        step["batch_mode"] = False
+        # Select column to handle
+        col = st.selectbox("Select Column to Apply Strategy", null_df.index.tolist(), key=f"{prefix}_missing_column")
+
+        # Select strategy
+        strategy = st.selectbox("Fill Strategy", ["Drop Rows", "Fill with Mean", "Fill with Median", "Fill with Mode", "Fill with Custom Value"], key=f"{prefix}_missing_strategy")
+
+        # Custom input if selected
+        custom_value = None
+        if strategy == "Fill with Custom Value":
+            custom_value = st.text_input("Enter Custom Fill Value", key=f"{prefix}_missing_custom")
+        # Custom input if selected
+
+        # ✅ Always save to step (important for execution engine)
+        step["table"] = table_name
+        step["column"] = col
+        step["strategy"] = strategy
+        if custom_value:
+            step["custom_value"] = custom_value
+
+        # Run button
+        if st.button("Run Missing Value Treatment", key=f"{prefix}_missing_run"):
+            st.success("✅ Step configured.")
 
-            row_input = st.text_area(
-                "📝 Enter row values (one row per line, comma-separated)",
-                placeholder="e.g.\n1, Alice, 100.5\n2, Bob, 200.3",
-                key=f"{prefix}_row_input"
-            )
-            step["data"] = row_input 
 
-            parsed_rows = []
-            if row_input:
-                try:
-                    for line in row_input.strip().splitlines():
-                        values = [val.strip() for val in line.split(",")]
-                        if len(values) != len(columns):
-                            st.error(f"❌ Row `{line}` does not match number of columns.")
-                            parsed_rows = []
-                            break
-                        parsed_rows.append(values)
-                except Exception as e:
-                    st.error(f"❌ Error parsing row values: {e}")
-                    parsed_rows = []
-                
-
-
-            if st.button("✅ Confirm Table Definition", key=f"{prefix}_confirm_create_table"):
-                step["columns"] = columns
-                step["dtypes"] = dtypes
-                step["primary_key"] = pk_column
-                step["output_name"] = table_name
-                step["data"] = row_input
-                st.success(f"✅ Table `{table_name}` with primary key `{pk_column}` defined.")
-
-    elif step_type == "Handle Missing Values":
-        st.markdown("### 🩹 Handle Missing Values")
-
-        # Select table
-        table_name = st.selectbox("Select Table", list(dataframes.keys()), key=f"{prefix}_missing_table")
-        df = dataframes[table_name]
-
-        # Show null summary
-        st.subheader("🔍 Null Summary")
-        null_summary = df.isnull().sum()
-        null_df = null_summary[null_summary > 0].to_frame(name="Null Count")
-        if not null_df.empty:
-            st.dataframe(null_df)
-        else:
-            st.success("✅ No missing values in the dataset.")
-
-        # Proceed only if nulls exist
-        if not null_df.empty:
-            # Select column to handle
-            col = st.selectbox("Select Column to Apply Strategy", null_df.index.tolist(), key=f"{prefix}_missing_column")
-
-            # Select strategy
-            strategy = st.selectbox("Fill Strategy", ["Drop Rows", "Fill with Mean", "Fill with Median", "Fill with Mode", "Fill with Custom Value"], key=f"{prefix}_missing_strategy")
-
-            # Custom input if selected
-            custom_value = None
-            if strategy == "Fill with Custom Value":
-                custom_value = st.text_input("Enter Custom Fill Value", key=f"{prefix}_missing_custom")
-            # Custom input if selected
-
-            # ✅ Always save to step (important for execution engine)
-            step["table"] = table_name
-            step["column"] = col
-            step["strategy"] = strategy
-            if custom_value:
-                step["custom_value"] = custom_value
-
-            # Run button
-            if st.button("Run Missing Value Treatment", key=f"{prefix}_missing_run"):
-                st.success("✅ Step configured.")
-
-    elif step_type == "Modify Table Structure":
-        st.markdown("### 🛠️ Modify Table Structure")
-        
-        table = st.selectbox("Select Table", list(dataframes.keys()), key=f"{prefix}_modstruct_table_{id(step)}")
-        df = dataframes[table]
-        st.markdown("#### 🔍 Table Preview Before Modification")
-        st.dataframe(df, use_container_width=True)
-        
-        action = st.radio(
-            "Select Action",
-            ["Add Column", "Delete Column", "Add Row", "Delete Row", "Rename Columns", "Convert Data Types"],
-            key=f"{prefix}_modstruct_action_{id(step)}"
+@register_form("Modify Table Structure")
+def _modify_table_structure_form(step_count, step, dataframes, prefix):
+    st.markdown("### 🛠️ Modify Table Structure")
+
+    table = st.selectbox("Select Table", list(dataframes.keys()), key=f"{prefix}_modstruct_table_{id(step)}")
+    df = dataframes[table]
+    st.markdown("#### 🔍 Table Preview Before Modification")
+    st.dataframe(df, use_container_width=True)
+
+    action = st.radio(
+        "Select Action",
+        ["Add Column", "Delete Column", "Add Row", "Delete Row", "Rename Columns", "Convert Data Types"],
+        key=f"{prefix}_modstruct_action_{id(step)}"
+    )
+
+    step["table"] = table
+    step["action"] = action
+
+    # 🔹 Add Column
+
+    # 🔹 Add Column
+    if action == "Add Column":
+        new_col = st.text_input("🆕 New Column Name", key=f"{prefix}_modstruct_addcol_name_{id(step)}_{step.get('action', '')}")
+        dtype = st.selectbox("🧬 Select Data Type", ["str", "int", "float"], key=f"{prefix}_modstruct_addcol_dtype_{id(step)}")
+
+        # 🔘 Choose input mode
+        value_mode = st.radio(
+            "How do you want to assign values?",
+            ["Use a single default value for all rows", "Enter different values per row"],
+            key=f"{prefix}_modstruct_addcol_mode_{id(step)}"
         )
-        
-        step["table"] = table
-        step["action"] = action
+        step["value_mode"] = value_mode
 
-        # 🔹 Add Column
+        # 🧬 Column name and type
+        new_col = st.text_input("🆕 New Column Name", key=f"{prefix}_modstruct_addcol_name_{id(step)}")
+        dtype = st.selectbox("🧬 Select Data Type", ["str", "int", "float"], key=f"{prefix}_modstruct_addcol_dtype_{id(step)}_{step.get('action', '')}")
+        step["new_column"] = new_col
+        step["dtype"] = dtype
 
-        # 🔹 Add Column
-        if action == "Add Column":
-            new_col = st.text_input("🆕 New Column Name", key=f"{prefix}_modstruct_addcol_name_{id(step)}_{step.get('action', '')}")
-            dtype = st.selectbox("🧬 Select Data Type", ["str", "int", "float"], key=f"{prefix}_modstruct_addcol_dtype_{id(step)}")
+        df = step.get("data")
 
-            # 🔘 Choose input mode
-            value_mode = st.radio(
-                "How do you want to assign values?",
-                ["Use a single default value for all rows", "Enter different values per row"],
-                key=f"{prefix}_modstruct_addcol_mode_{id(step)}"
+        # 📥 Mode 1: Use a default value for all rows
+        if value_mode == "Use a single default value for all rows":
+            default_value = st.text_input(
+                "📝 Default Value for All Rows",
+                key=f"{prefix}_modstruct_addcol_default_{id(step)}"
             )
-            step["value_mode"] = value_mode
+            step["default"] = default_value
+            step["values"] = []
+            step["raw_values"] = ""
 
-            # 🧬 Column name and type
-            new_col = st.text_input("🆕 New Column Name", key=f"{prefix}_modstruct_addcol_name_{id(step)}")
-            dtype = st.selectbox("🧬 Select Data Type", ["str", "int", "float"], key=f"{prefix}_modstruct_addcol_dtype_{id(step)}_{step.get('action', '')}")
-            step["new_column"] = new_col
-            step["dtype"] = dtype
+            # Preview
+            if isinstance(df, pd.DataFrame) and new_col:
+                df[new_col] = default_value
+                st.success(f"✅ Column `{new_col}` added with default value `{default_value}` and type `{dtype}`.")
+                st.dataframe(df.head())
 
-            df = step.get("data")
+        # 📥 Mode 2: Use per-row values
+        else:
+            values_text = st.text_input(
+                "📋 Enter Values (comma-separated for each row)",
+                value="1,2,3,,5",
+                key=f"{prefix}_modstruct_addcol_vals_{id(step)}",
+                help="Use commas to separate values. Leave blank between commas to insert NaN."
+            )
+            step["raw_values"] = values_text
 
-            # 📥 Mode 1: Use a default value for all rows
-            if value_mode == "Use a single default value for all rows":
-                default_value = st.text_input(
-                    "📝 Default Value for All Rows",
-                    key=f"{prefix}_modstruct_addcol_default_{id(step)}"
-                )
-                step["default"] = default_value
-                step["values"] = []
-                step["raw_values"] = ""
+            # Parse and convert values
+            raw_list = values_text.strip().split(",") if values_text.strip() else []
 
-                # Preview
-                if isinstance(df, pd.DataFrame) and new_col:
-                    df[new_col] = default_value
-                    st.success(f"✅ Column `{new_col}` added with default value `{default_value}` and type `{dtype}`.")
-                    st.dataframe(df.head())
+            def convert(val):
+                val = val.strip()
+                if val == "":
+                    return np.nan
+                try:
+                    return {"int": int, "float": float, "str": str}[dtype](val)
+                except:
+                    return np.nan
 
-            # 📥 Mode 2: Use per-row values
-            else:
-                values_text = st.text_input(
-                    "📋 Enter Values (comma-separated for each row)",
-                    value="1,2,3,,5",
-                    key=f"{prefix}_modstruct_addcol_vals_{id(step)}",
-                    help="Use commas to separate values. Leave blank between commas to insert NaN."
-                )
-                step["raw_values"] = values_text
+            values_list = [convert(v) for v in raw_list]
+            step["values"] = values_list
+            default_value = next((v for v in values_list if pd.notna(v)), None)
+            step["default"] = default_value  # For SQL default fallback
 
-                # Parse and convert values
-                raw_list = values_text.strip().split(",") if values_text.strip() else []
+            # Preview
+            st.write(f"✅ Will add column `{new_col}` with `{len(values_list)}` values and type `{dtype}`.")
 
-                def convert(val):
-                    val = val.strip()
-                    if val == "":
-                        return np.nan
-                    try:
-                        return {"int": int, "float": float, "str": str}[dtype](val)
-                    except:
-                        return np.nan
+            if isinstance(df, pd.DataFrame) and new_col:
+                padded_values = values_list + [np.nan] * (len(df) - len(values_list))
+                df[new_col] = pd.Series(padded_values[:len(df)]).astype(dtype if dtype != "str" else "object")
+                st.dataframe(df.head())
 
-                values_list = [convert(v) for v in raw_list]
-                step["values"] = values_list
-                default_value = next((v for v in values_list if pd.notna(v)), None)
-                step["default"] = default_value  # For SQL default fallback
+    # 🔹 Delete Columns
+    elif action == "Delete Column":
+        del_cols = st.multiselect("Select Columns to Delete", df.columns, key=f"{prefix}_modstruct_delcols")
+        step["columns"] = del_cols
 
-                # Preview
-                st.write(f"✅ Will add column `{new_col}` with `{len(values_list)}` values and type `{dtype}`.")
+    # 🔹 Add Row
+    elif action == "Add Row":
+        st.markdown("### ➕ Add Row to Table")
 
-                if isinstance(df, pd.DataFrame) and new_col:
-                    padded_values = values_list + [np.nan] * (len(df) - len(values_list))
-                    df[new_col] = pd.Series(padded_values[:len(df)]).astype(dtype if dtype != "str" else "object")
-                    st.dataframe(df.head())
+        all_table_names = list(dataframes.keys())  # ✅ Fix here
 
-        # 🔹 Delete Columns
-        elif action == "Delete Column":
-            del_cols = st.multiselect("Select Columns to Delete", df.columns, key=f"{prefix}_modstruct_delcols")
-            step["columns"] = del_cols
+        table = st.selectbox("Select Table", all_table_names, key=f"{prefix}_addrow_table_{id(step)}")
+        step["table"] = table
 
-        # 🔹 Add Row
-        elif action == "Add Row":
-            st.markdown("### ➕ Add Row to Table")
+        if table and table in dataframes:
+            columns = dataframes[table].columns.tolist()
 
-            all_table_names = list(dataframes.keys())  # ✅ Fix here
+            # 🧾 Show expected input format
+            example = ', '.join([col for col in columns])
+            st.info(f"📌 **Expected order:** `{example}`")
 
-            table = st.selectbox("Select Table", all_table_names, key=f"{prefix}_addrow_table_{id(step)}")
-            step["table"] = table
 
-            if table and table in dataframes:
-                columns = dataframes[table].columns.tolist()
+        input_str = st.text_input(f"📝 Enter row values (comma-separated)", key=f"{prefix}_addrow_input_{id(step)}")
 
-                # 🧾 Show expected input format
-                example = ', '.join([col for col in columns])
-                st.info(f"📌 **Expected order:** `{example}`")
+        if input_str:
+            try:
+                row_values = [x.strip() for x in input_str.split(",")]
+                st.success("✅ Row parsed successfully!")
+                step["values"] = row_values
+            except Exception as e:
+                st.error(f"❌ Error parsing row values: {e}")
 
 
-            input_str = st.text_input(f"📝 Enter row values (comma-separated)", key=f"{prefix}_addrow_input_{id(step)}")
 
-            if input_str:
-                try:
-                    row_values = [x.strip() for x in input_str.split(",")]
-                    st.success("✅ Row parsed successfully!")
-                    step["values"] = row_values
-                except Exception as e:
-                    st.error(f"❌ Error parsing row values: {e}")
-
-
-
-        # 🔹 Delete Row
-        elif action == "Delete Row":
-            condition_col = st.selectbox("Condition Column", df.columns, key=f"{prefix}_modstruct_delrow_col")
-            condition_val = st.text_input("Value to Match for Deletion", key=f"{prefix}_modstruct_delrow_val")
-            step["condition_col"] = condition_col
-            step["condition_val"] = condition_val
-
-        # 🔹 Rename Columns
-        elif action == "Rename Columns":
-            st.markdown("Enter new names for columns (leave blank to keep original):")
-            rename_dict = {}
-            for col in df.columns:
-                new_name = st.text_input(f"Rename `{col}` to:", key=f"{prefix}_modstruct_rename_{col}")
-                if new_name and new_name != col:
-                    rename_dict[col] = new_name
-            step["rename_dict"] = rename_dict
-
-        # 🔹 Convert Data Types
-        elif action == "Convert Data Types":
-            selected_cols = st.multiselect(
-                "Select Columns to Convert",
-                df.columns.tolist(),
-                key=f"{prefix}_modstruct_dtype_cols"
-            )
+    # 🔹 Delete Row
+    elif action == "Delete Row":
+        condition_col = st.selectbox("Condition Column", df.columns, key=f"{prefix}_modstruct_delrow_col")
+        condition_val = st.text_input("Value to Match for Deletion", key=f"{prefix}_modstruct_delrow_val")
+        step["condition_col"] = condition_col
+        step["condition_val"] = condition_val
 
-            dtype_options = ["int", "float", "str", "bool", "datetime"]
-            dtype_dict = {}
-
-            if selected_cols:
-                st.markdown("#### Select Target Data Type for Each Column:")
-                for col in selected_cols:
-                    dtype = st.selectbox(
-                        f"→ `{col}`:",
-                        dtype_options,
-                        key=f"{prefix}_modstruct_dtype_for_{col}"
-                    )
-                    dtype_dict[col] = dtype
-
-                step["dtype_dict"] = dtype_dict
-
-    elif step_type == "Create New Table with Foreign Link":
-        st.markdown("### 🧱 Create and Save a New Table (with Optional Foreign Key Column)")
-
-        table_names = list(dataframes.keys())
-        use_fk = st.checkbox("🔗 Add Foreign Key Column from Existing Table", key=f"{prefix}_use_fk_{id(step)}")
-        step["is_foreign_key_link"] = use_fk
-
-        fk_values = []
-        fk_column_name_in_new_table = None
-        if use_fk and table_names:
-            base_table = st.selectbox("Select Foreign Key Table", table_names, key=f"{prefix}_fk_base_table_{id(step)}")
-            base_df = dataframes[base_table]
-            fk_column = st.selectbox("Select Foreign Key Column", base_df.columns.tolist(), key=f"{prefix}_fk_column_{id(step)}")
-            fk_values = base_df[fk_column].drop_duplicates().tolist()
-            
-            fk_column_name_in_new_table = fk_column
-            step["fk_column_name"] = fk_column_name_in_new_table
-
-        st.markdown("#### ➕ Define Custom Columns (excluding FK)")
-        custom_columns_str = st.text_input(
-            "Enter Custom Column Names (comma-separated)",
-            value=step.get("custom_columns_str", "col1, col2"),
-            key=f"{prefix}_custom_columns_str_{id(step)}"
+    # 🔹 Rename Columns
+    elif action == "Rename Columns":
+        st.markdown("Enter new names for columns (leave blank to keep original):")
+        rename_dict = {}
+        for col in df.columns:
+            new_name = st.text_input(f"Rename `{col}` to:", key=f"{prefix}_modstruct_rename_{col}")
+            if new_name and new_name != col:
+                rename_dict[col] = new_name
+        step["rename_dict"] = rename_dict
+
+    # 🔹 Convert Data Types
+    elif action == "Convert Data Types":
+        selected_cols = st.multiselect(
+            "Select Columns to Convert",
+            df.columns.tolist(),
+            key=f"{prefix}_modstruct_dtype_cols"
         )
-        custom_columns = [col.strip() for col in custom_columns_str.split(",") if col.strip()]
 
-        if use_fk and fk_values:
-            full_columns = [fk_column_name_in_new_table] + custom_columns
-        else:
-            full_columns = custom_columns
+        dtype_options = ["int", "float", "str", "bool", "datetime"]
+        dtype_dict = {}
 
-        st.markdown("#### 🧬 Select Data Types for Custom Columns")
-        dtypes = {}
-        if use_fk:
-            dtypes[fk_column_name_in_new_table] = str  # Assume FK is string or int
-        for col in custom_columns:
-            dtype = st.selectbox(
-                f"Data Type for {col}",
-                ["str", "int", "float", "datetime"],
-                key=f"{prefix}_dtype_{col}_{id(step)}"
-            )
-            dtypes[col] = dtype
+        if selected_cols:
+            st.markdown("#### Select Target Data Type for Each Column:")
+            for col in selected_cols:
+                dtype = st.selectbox(
+                    f"→ `{col}`:",
+                    dtype_options,
+                    key=f"{prefix}_modstruct_dtype_for_{col}"
+                )
+                dtype_dict[col] = dtype
+
+            step["dtype_dict"] = dtype_dict
 
-        st.markdown("#### 📝 Enter Row Data")
-        if use_fk:
-            st.caption(f"Include {len(full_columns)} columns per row: FK + your custom columns")
-            st.caption(f"Example: `{fk_values[0]},{'value1'},10`")
-        else:
-            st.caption("Separate rows with `;` and values with `,` — e.g. `val1,1.5; val2,2.3`")
 
-        row_data_input = st.text_area(
-            "Enter Data",
-            value=step.get("row_data_input", ""),
-            key=f"{prefix}_row_data_input_{id(step)}"
+@register_form("Create New Table with Foreign Link")
+def _create_new_table_with_foreign_link_form(step_count, step, dataframes, prefix):
+    st.markdown("### 🧱 Create and Save a New Table (with Optional Foreign Key Column)")
+
+    table_names = list(dataframes.keys())
+    use_fk = st.checkbox("🔗 Add Foreign Key Column from Existing Table", key=f"{prefix}_use_fk_{id(step)}")
+    step["is_foreign_key_link"] = use_fk
+
+    fk_values = []
+    fk_column_name_in_new_table = None
+    if use_fk and table_names:
+        base_table = st.selectbox("Select Foreign Key Table", table_names, key=f"{prefix}_fk_base_table_{id(step)}")
+        base_df = dataframes[base_table]
+        fk_column = st.selectbox("Select Foreign Key Column", base_df.columns.tolist(), key=f"{prefix}_fk_column_{id(step)}")
+        fk_values = base_df[fk_column].drop_duplicates().tolist()
+
+        fk_column_name_in_new_table = fk_column
+        step["fk_column_name"] = fk_column_name_in_new_table
+        step["fk_table"] = base_table
+
+    st.markdown("#### ➕ Define Custom Columns (excluding FK)")
+    custom_columns_str = st.text_input(
+        "Enter Custom Column Names (comma-separated)",
+        value=step.get("custom_columns_str", "col1, col2"),
+        key=f"{prefix}_custom_columns_str_{id(step)}"
+    )
+    custom_columns = [col.strip() for col in custom_columns_str.split(",") if col.strip()]
+
+    if use_fk and fk_values:
+        full_columns = [fk_column_name_in_new_table] + custom_columns
+    else:
+        full_columns = custom_columns
+
+    st.markdown("#### 🧬 Select Data Types for Custom Columns")
+    dtypes = {}
+    if use_fk:
+        dtypes[fk_column_name_in_new_table] = str  # Assume FK is string or int
+    for col in custom_columns:
+        dtype = st.selectbox(
+            f"Data Type for {col}",
+            ["str", "int", "float", "datetime"],
+            key=f"{prefix}_dtype_{col}_{id(step)}"
         )
+        dtypes[col] = dtype
+
+    st.markdown("#### 📝 Enter Row Data")
+    if use_fk:
+        st.caption(f"Include {len(full_columns)} columns per row: FK + your custom columns")
+        st.caption(f"Example: `{fk_values[0]},{'value1'},10`")
+    else:
+        st.caption("Separate rows with `;` and values with `,` — e.g. `val1,1.5; val2,2.3`")
+
+    row_data_input = st.text_area(
+        "Enter Data",
+        value=step.get("row_data_input", ""),
+        key=f"{prefix}_row_data_input_{id(step)}"
+    )
 
-        # Parse input rows
-        rows = []
-        if row_data_input.strip():
-            for row in row_data_input.strip().split(";"):
-                row = row.strip()
-                if not row:  # 🔒 Skip empty rows (from trailing ;)
-                    continue
-                values = [val.strip() for val in row.split(",")]
-                if len(values) == len(full_columns):
-                    rows.append(values)
+    # Parse input rows
+    rows = []
+    if row_data_input.strip():
+        for row in row_data_input.strip().split(";"):
+            row = row.strip()
+            if not row:  # 🔒 Skip empty rows (from trailing ;)
+                continue
+            values = [val.strip() for val in row.split(",")]
+            if len(values) == len(full_columns):
+                rows.append(values)
+            else:
+                st.warning(f"⚠️ Skipped row due to column mismatch: `{row}`")
+
+    if not rows:
+        st.error("❌ No valid rows detected. Please ensure all rows have correct number of values.")
+        return
+
+    if rows:
+        new_df = pd.DataFrame(rows, columns=full_columns)
+
+        # Convert column dtypes
+        for col, dtype in dtypes.items():
+            try:
+                if dtype == "datetime":
+                    new_df[col] = pd.to_datetime(new_df[col], errors="coerce")
                 else:
-                    st.warning(f"⚠️ Skipped row due to column mismatch: `{row}`")
-        
-        if not rows:
-            st.error("❌ No valid rows detected. Please ensure all rows have correct number of values.")
-            return
-        
-        if rows:
-            new_df = pd.DataFrame(rows, columns=full_columns)
+                    new_df[col] = new_df[col].astype(dtype)
+            except Exception as e:
+                st.warning(f"⚠️ Could not convert {col} to {dtype}: {e}")
 
-            # Convert column dtypes
-            for col, dtype in dtypes.items():
-                try:
-                    if dtype == "datetime":
-                        new_df[col] = pd.to_datetime(new_df[col], errors="coerce")
-                    else:
-                        new_df[col] = new_df[col].astype(dtype)
-                except Exception as e:
-                    st.warning(f"⚠️ Could not convert {col} to {dtype}: {e}")
-
-            st.markdown("#### ✅ Final Preview of New Table")
-            st.dataframe(new_df)
-            # 🧾 SQL Preview
-
-            # ✅ Let user enter the table name
-      
-          
-            # Save all info
-            step["data"] = new_df.to_dict(orient="records")
-            step["columns"] = new_df.columns.tolist()
-            step["dtypes"] = dtypes
-            step["custom_columns_str"] = custom_columns_str
-            step["row_data_input"] = row_data_input
+        st.markdown("#### ✅ Final Preview of New Table")
+        st.dataframe(new_df)
+        # 🧾 SQL Preview
 
-            output_name = st.text_input("Output Table Name", value=step.get("output_name", "new_table"), key=f"{prefix}_output_name_{id(step)}")
-            step["output_name"] = output_name
-            step["data"] = new_df.to_dict(orient="records")
-            step["columns"] = new_df.columns.tolist()
-            
-        else:
-            st.error("❌ Please enter row data with the correct number of values.")
+        # ✅ Let user enter the table name
+
+
+        # Save all info
+        step["data"] = new_df.to_dict(orient="records")
+        step["columns"] = new_df.columns.tolist()
+        step["dtypes"] = dtypes
+        step["custom_columns_str"] = custom_columns_str
+        step["row_data_input"] = row_data_input
+
+        output_name = st.text_input("Output Table Name", value=step.get("output_name", "new_table"), key=f"{prefix}_output_name_{id(step)}")
+        step["output_name"] = output_name
+        step["insert_batch_size"] = st.number_input("Rows per INSERT statement", min_value=1,
+                                                    value=step.get("insert_batch_size", DEFAULT_INSERT_BATCH_SIZE),
+                                                    key=f"{prefix}_fk_batch_size_{id(step)}")
+        step["data"] = new_df.to_dict(orient="records")
+        step["columns"] = new_df.columns.tolist()
+
+    else:
+        st.error("❌ Please enter row data with the correct number of values.")
+
+
+def build_step_form(step_count, step, dataframes,prefix="basic"):
+    SQL_STEP_OPTIONS = ["Filter Rows", "Sort Rows", "Group By", "Join Tables"]
+    step_type = step.get("type", SQL_STEP_OPTIONS[0])
+
+    step["type"] = step_type
+    form = form_handler(step_type)
+    if form is not None:
+        form(step_count, step, dataframes, prefix)
 
     # Inside build_step_form, just do:
         
@@ -1075,547 +1451,682 @@ def build_step_form(step_count, step, dataframes,prefix="basic"):
     st.code(sql_code, language="sql")
 
 
+@register_apply("Filter Rows")
+def _apply_filter_rows(step, dataframes):
+    df = dataframes[step["table"]]
+    # A range on a sorted column is a binary search and a slice, not a scan
+    sliced = range_slice(df, step.get("column"), step.get("operator"), step.get("value"))
+    if sliced is not None:
+        return sliced
+    filtered = df.query(step["expression"])
+    keep_order(df, filtered)
+    return filtered
+
+
+@register_apply("Group By")
+def _apply_group_by(step, dataframes):
+    table = step["table"]
+    df = dataframes[table]
+    group_cols = step["group_cols"]
+    aggregations = step["aggregations"]
+
+    if step.get("approximate"):
+        rows = step.get("sample_rows", DEFAULT_SAMPLE_ROWS)
+        grouped = approx_group_by(df, group_cols, aggregations, rows)
+        approx_caption(df, rows, grouped=True)
+    else:
+        # Do groupby
+        grouped = df.groupby(group_cols).agg(aggregations).reset_index()
+
+        # Rename columns like SUM_width
+        grouped.columns = [
+            col if col in group_cols else f"{aggregations[col]}_{col}"
+            for col in grouped.columns
+        ]
+
+    # Apply HAVING
+    having_conditions = step.get("having_conditions", [])
+    if having_conditions:
+        try:
+            # Build a compound query string
+            queries = []
+            for cond in having_conditions:
+                agg_col = f"{cond['function']}_{cond['column']}"
+                op = cond["operator"]
+                val = cond["value"]
+                queries.append(f"`{agg_col}` {op} {val}")
+            query_str = " and ".join(queries)
+            grouped = grouped.query(query_str)
+        except Exception as e:
+            return pd.DataFrame({"Error": [f"Invalid HAVING clause: {e}"]})
+
+    return grouped
+
+
+@register_apply("Sort Rows")
+def _apply_sort_rows(step, dataframes):
+    df = dataframes[step["table"]]
+    sorted_df, skipped = sort_rows(df, step["columns"], step["ascending"])
+    if skipped:
+        st.caption(f"⏭️ `{step['table']}` is already sorted by {', '.join(step['columns'])} — sort skipped.")
+    return sorted_df
+
+
+@register_apply("Deduplicate")
+def _apply_deduplicate(step, dataframes):
+    df = dataframes[step["table"]]
+    subset = [col for col in step.get("subset", []) if col in df.columns]
+    dropped = duplicate_mask(df, subset, step.get("keep", "first"))
+    if not dropped.any():
+        st.caption("🧬 No duplicate rows found.")
+        # A shallow view, copied before any later in-place change
+        out = df.copy(deep=False)
+        register_view(out)
+        keep_order(df, out)
+        return out
+    result = df[~dropped]
+    keep_order(df, result)
+    st.caption(f"🧬 Removed {int(dropped.sum()):,} duplicate rows.")
+    return result
+
+
+@register_apply("Semi Join", "Anti Join")
+def _apply_semi_join(step, dataframes):
+    left = dataframes[step["left_table"]]
+    # The right side's distinct keys are hashed once per table version and probed per left row
+    keys = key_set(dataframes[step["right_table"]], step["right_on"])
+    found = matches_keys(left[step["left_on"]], keys)
+    result = left[found if step["type"] == "Semi Join" else ~found]
+    keep_order(left, result)
+    return result
+
+
+@register_apply("Join Tables")
+def _apply_join_tables(step, dataframes):
+
+    left = dataframes[step["left_table"]]
+    right = dataframes[step["right_table"]]
+    left_on = step["left_on"]
+    right_on = step["right_on"]
+    join_type = step["join_type"]
+    is_foreign_key = step.get("is_foreign_key_link", False)
+    # A declared key on the right side answers the FK pre-filter by lookup instead of a scan
+    right_index = None if step.get("cast_to_str", False) else key_index(step["right_table"], right, right_on)
+    spill = step.get("spill_join", "auto")
+    if spill != "never" and arrow_available():
+        # Estimated on the stored tables, whose distinct keys are cached, before any cast or filter
+        estimate = estimate_join_bytes(left, right, join_type, left_on, right_on)
+        spill = should_spill(spill, estimate)
+    else:
+        spill = False
 
-def apply_step(step, dataframes):
-    try:
-        if step["type"] == "Filter Rows":
-            df = dataframes[step["table"]]
-            return df.query(step["expression"])
+    # Optional casting to string
+    if step.get("cast_to_str", False):
+        try:
+            left = left.assign(**{left_on: left[left_on].astype(str)})
+            right = right.assign(**{right_on: right[right_on].astype(str)})
+        except Exception as e:
+            st.error(f"⚠️ Failed to convert join columns to string: {e}")
+            return None
 
-        
-        elif step["type"] == "Group By":
-            table = step["table"]
-            df = dataframes[table]
-            group_cols = step["group_cols"]
-            aggregations = step["aggregations"]
-
-            # Do groupby
-            grouped = df.groupby(group_cols).agg(aggregations).reset_index()
-
-            # Rename columns like SUM_width
-            grouped.columns = [
-                col if col in group_cols else f"{aggregations[col]}_{col}"
-                for col in grouped.columns
-            ]
-
-            # Apply HAVING
-            having_conditions = step.get("having_conditions", [])
-            if having_conditions:
-                try:
-                    # Build a compound query string
-                    queries = []
-                    for cond in having_conditions:
-                        agg_col = f"{cond['function']}_{cond['column']}"
-                        op = cond["operator"]
-                        val = cond["value"]
-                        queries.append(f"`{agg_col}` {op} {val}")
-                    query_str = " and ".join(queries)
-                    grouped = grouped.query(query_str)
-                except Exception as e:
-                    return pd.DataFrame({"Error": [f"Invalid HAVING clause: {e}"]})
-
-            return grouped
-
-        elif step["type"] == "Sort Rows":
-            df = dataframes[step["table"]]
-            return df.sort_values(by=step["columns"], ascending=step["ascending"])
-
-        elif step["type"] == "Join Tables":
-
-            left = dataframes[step["left_table"]].copy()
-            right = dataframes[step["right_table"]].copy()
-            left_on = step["left_on"]
-            right_on = step["right_on"]
-            right_on = step["right_on"]
-            join_type = step["join_type"]
-            is_foreign_key = step.get("is_foreign_key_link", False)
-
-            # Optional casting to string
-            if step.get("cast_to_str", False):
-                try:
-                    left[left_on] = left[left_on].astype(str)
-                    right[right_on] = right[right_on].astype(str)
-                except Exception as e:
-                    st.error(f"⚠️ Failed to convert join columns to string: {e}")
-                    return None
-                
-            if left_on not in left.columns or right_on not in right.columns:
-                    st.error("❌ Foreign key columns not found.")
-                    return None
-                
-
-                # Foreign key filtering (only if explicitly selected)
-            if is_foreign_key:
-                
-                original_count = len(right)
-                right = right[right[right_on].isin(left[left_on])]
-                filtered_count = len(right)
-
-                st.info(f"🔗 Foreign key mode: Filtered right table from {original_count} to {filtered_count} rows based on foreign key match.")
+    if left_on not in left.columns or right_on not in right.columns:
+            st.error("❌ Foreign key columns not found.")
+            return None
 
 
-            try:
-                return pd.merge(left, right, how=step["join_type"], left_on=left_on, right_on=right_on)
-            except Exception as e:
-                st.error(f"❌ Join error: {e}")
-                return None
+        # Foreign key filtering (only if explicitly selected)
+    if is_foreign_key:
 
-        elif step["type"] == "Aggregate Column":
-            df = dataframes[step["table"]]
-            col = step["column"]
-            func = step["function"]
-            alias = step["alias"]
+        original_count = len(right)
+        unfiltered = right
+        if right_index is not None:
+            right = right.iloc[right_index.positions_many(left[left_on].unique())]
+        else:
+            right = right[right[right_on].isin(left[left_on])]
+        keep_order(unfiltered, right)
+        filtered_count = len(right)
 
-            # Perform aggregation and return as 1-row DataFrame
-            result_value = getattr(df[col], func)()
-            return pd.DataFrame({alias: [result_value]})
+        st.info(f"🔗 Foreign key mode: Filtered right table from {original_count} to {filtered_count} rows based on foreign key match.")
 
-        elif step["type"] == "Modify Column":
-            table = step["table"]
-            alias = step["alias"]
-            result_df = dataframes[table].copy()
+    if step.get("runtime_filter"):
+        left, right, pruned = prune_join_inputs(left, right, left_on, right_on, join_type, step["runtime_filter"])
+        if pruned is not None:
+            side, dropped, rows = pruned
+            st.info(f"🧹 Runtime filter pruned {dropped:,} of {rows:,} {side}-table rows before the merge.")
 
+    try:
+        if spill:
+            partitions = partition_count(estimate, headroom_bytes())
+            output_dir = step.get("output_dir") or os.path.abspath("sql_outputs")
+            output_path = os.path.join(output_dir, spill_output_name(step, left, right))
             try:
-                if step.get("use_manual_expr", False):
-                    tables = dataframes  # required for eval scope
-                    result = eval(step["expression"])
+                with st.spinner(f"Joining {partitions} partition pairs on disk..."):
+                    rows = grace_join(left, right, join_type, left_on, right_on, output_path, partitions,
+                                      step.get("join_workers", 1))
+            except SpillUnsupported as e:
+                st.caption(f"💽 Can't spill this join to disk ({e}) — joining in memory.")
+            else:
+                st.info(f"💽 Estimated ~{estimate / 2**20:,.0f} MB for the merge — joined {partitions} hash partitions "
+                        f"from disk; {rows:,} rows streamed to `{output_path}` (rows are grouped by partition).")
+                return read_join_output(output_path)
+        if not step.get("cast_to_str", False):
+            # Both sides sorted on their keys: merge the sorted runs instead of hashing
+            merged = sorted_merge(left, right, join_type, left_on, right_on)
+            if merged is not None:
+                st.caption("🔀 Both tables are sorted on the join keys — used a sort-merge join.")
+                return merged
+        return pd.merge(left, right, how=step["join_type"], left_on=left_on, right_on=right_on)
+    except Exception as e:
+        st.error(f"❌ Join error: {e}")
+        return None
 
-                else:
-                    operator = step.get("operator", "+")
-                    rhs_mode = step.get("rhs_mode", "Manual constant")
-                    is_string_op = operator in ["+", "==", "!="]
-
-                    # --- Prepare Left-Hand Side
-                    if is_string_op:
-                        col1_series = dataframes[step["col1_table"]][step["col1"]].astype(str)
-                    else:
-                        col1_series = pd.to_numeric(dataframes[step["col1_table"]][step["col1"]], errors="coerce").fillna(0)
-
-                    # --- Prepare Right-Hand Side
-                    if rhs_mode == "Column from another table":
-                        if is_string_op:
-                            col2_series = dataframes[step["col2_table"]][step["col2"]].astype(str)
-                        else:
-                            col2_series = pd.to_numeric(dataframes[step["col2_table"]][step["col2"]], errors="coerce").fillna(0)
-                    else:
-                        const = step.get("constant", "0")
-                        if is_string_op:
-                            col2_series = str(const)
-                        else:
-                            try:
-                                col2_series = float(const)
-                            except:
-                                col2_series = 0.0
-
-                    # --- Perform the Operation
-                    if isinstance(col2_series, pd.Series):
-                        result = eval(f"col1_series {operator} col2_series")
-                    else:
-                        # constant value
-                        result = eval(f"col1_series {operator} col2_series")
-
-                # --- Store result
-                result_df[alias] = result
-                return result_df
 
-            except Exception as e:
-                st.error(f"❌ Error applying operation: {e}")
-                return result_df
+@register_apply("Aggregate Column")
+def _apply_aggregate_column(step, dataframes):
+    df = dataframes[step["table"]]
+    col = step["column"]
+    func = step["function"]
+    alias = step["alias"]
 
+    if step.get("approximate"):
+        rows = step.get("sample_rows", DEFAULT_SAMPLE_ROWS)
+        estimate, half_width = approx_aggregate(df, col, func, rows)
+        approx_caption(df, rows)
+        return pd.DataFrame({alias: [estimate], alias + CI_SUFFIX: [half_width]})
 
+    # Perform aggregation and return as 1-row DataFrame
+    result_value = getattr(df[col], func)()
+    return pd.DataFrame({alias: [result_value]})
 
-            except Exception as e:
-                st.error(f"❌ Failed to create new table: {e}")
-                return pd.DataFrame()
 
-        elif step["type"] == "Create & Save New Table":
-            try:
-                # Use existing data
-                use_existing = step.get("use_existing", False)
-                base_table = step.get("base_table", "")
-                base_columns = step.get("base_columns", [])
+@register_apply("Window Function")
+def _apply_window_function(step, dataframes):
+    return apply_window(dataframes[step["table"]], step)
 
-                # Get base dataframe if applicable
-                base_df = dataframes.get(base_table) if use_existing and base_table in dataframes else None
 
-                # Convert stored row data to DataFrame
-                custom_columns = step.get("columns", [])
-                row_data = step.get("data", [])
-                dtypes = step.get("dtypes", {})
+@register_apply("Modify Column")
+def _apply_modify_column(step, dataframes):
+    table = step["table"]
+    alias = step["alias"]
+    result_df = dataframes[table].copy()
 
-                # If no base_df and no row data, throw error
-                if (not row_data or len(row_data) == 0) and base_df is None:
-                    raise ValueError("No data provided from base table or manual input.")
+    try:
+        if step.get("use_manual_expr", False):
+            tables = dataframes  # required for eval scope
+            result = eval(step["expression"])
 
-                # Build custom DataFrame from row data
-                new_df = pd.DataFrame(row_data, columns=custom_columns)
+        else:
+            operator = step.get("operator", "+")
+            rhs_mode = step.get("rhs_mode", "Manual constant")
+            is_string_op = operator in ["+", "==", "!="]
+
+            # --- Prepare Left-Hand Side
+            if is_string_op:
+                col1_series = dataframes[step["col1_table"]][step["col1"]].astype(str)
+            else:
+                col1_series = pd.to_numeric(dataframes[step["col1_table"]][step["col1"]], errors="coerce").fillna(0)
 
-                # Apply datatypes
-                for col, dtype in dtypes.items():
+            # --- Prepare Right-Hand Side
+            if rhs_mode == "Column from another table":
+                if is_string_op:
+                    col2_series = dataframes[step["col2_table"]][step["col2"]].astype(str)
+                else:
+                    col2_series = pd.to_numeric(dataframes[step["col2_table"]][step["col2"]], errors="coerce").fillna(0)
+            else:
+                const = step.get("constant", "0")
+                if is_string_op:
+                    col2_series = str(const)
+                else:
                     try:
-                        if dtype == "datetime":
-                            new_df[col] = pd.to_datetime(new_df[col], errors="coerce")
-                        else:
-                            new_df[col] = new_df[col].astype(dtype)
-                    except Exception as e:
-                        st.warning(f"⚠️ Could not convert {col} to {dtype}: {e}")
-
-                # Merge with base table columns if needed
-                if base_df is not None and base_columns:
-                    new_df = pd.concat([base_df[base_columns].reset_index(drop=True), new_df], axis=1)
-
-                # Save result
-                output_name = step.get("output_name", "new_table")
-                dataframes[output_name] = new_df
-                st.success(f"✅ Created new table: `{output_name}`")
-                st.dataframe(new_df)
+                        col2_series = float(const)
+                    except:
+                        col2_series = 0.0
 
-            except Exception as e:
-                st.error(f"❌ Error applying step: {e}")
+            # --- Perform the Operation
+            if isinstance(col2_series, pd.Series):
+                result = eval(f"col1_series {operator} col2_series")
+            else:
+                # constant value
+                result = eval(f"col1_series {operator} col2_series")
 
-        elif step["type"] == "INSERT":
-            try:
-                table = step["table"]
-                if table not in dataframes:
-                    raise ValueError(f"❌ Table `{table}` not found.")
+        # --- Store result
+        result_df[alias] = result
+        return result_df
 
-                df = dataframes[table]
-                columns = step.get("columns", [])
-                values = step.get("values", {})  # dict of {col: val}
+    except Exception as e:
+        st.error(f"❌ Error applying operation: {e}")
+        return result_df
 
-                # Create new row aligned with df columns
-                new_row = [values.get(col, None) for col in df.columns]
-                new_df = pd.concat([df, pd.DataFrame([new_row], columns=df.columns)], ignore_index=True)
 
-                dataframes[table] = new_df
-                st.success(f"✅ INSERT applied: Row added to `{table}`")
-                st.dataframe(new_df)
-                return new_df
 
-            except Exception as e:
-                st.error(f"❌ Error applying INSERT: {e}")
-                return df if "df" in locals() else pd.DataFrame()
+    except Exception as e:
+        st.error(f"❌ Failed to create new table: {e}")
+        return pd.DataFrame()
 
-        elif step["type"] == "UPDATE":
-            try:
-                table = step["table"]
-                if table not in dataframes:
-                    raise ValueError(f"❌ Table `{table}` not found.")
 
-                df = dataframes[table]
-                condition_col = step.get("condition_col")
-                condition_val = step.get("condition_val")
-                update_col = step.get("update_col")
-                new_value = step.get("new_value")
+@register_apply("Create & Save New Table")
+def _apply_create_save_new_table(step, dataframes):
+    try:
+        if not step.get("rows") and not step.get("data") and not step.get("use_existing"):
+            raise ValueError("No data provided from base table or manual input.")
+        new_df = assemble_new_table(step, dataframes)
 
-                if not condition_col or not update_col:
-                    raise ValueError("⚠️ Missing condition or update column.")
+        # Save result
+        output_name = step.get("output_name", "new_table")
+        dataframes[output_name] = new_df
+        st.success(f"✅ Created new table: `{output_name}`")
+        st.dataframe(new_df)
 
-                updated_rows = df[condition_col] == condition_val
-                df.loc[updated_rows, update_col] = new_value
+    except Exception as e:
+        st.error(f"❌ Error applying step: {e}")
 
-                dataframes[table] = df
-                st.success(f"✅ UPDATE applied on `{table}`: {updated_rows.sum()} row(s) modified.")
-                st.dataframe(df)
-                return df
 
-            except Exception as e:
-                st.error(f"❌ Error applying UPDATE: {e}")
-                return df if "df" in locals() else pd.DataFrame()
+@register_apply("INSERT")
+def _apply_insert(step, dataframes):
+    try:
+        table = step["table"]
+        if table not in dataframes:
+            raise ValueError(f"❌ Table `{table}` not found.")
 
-        elif step["type"] == "DELETE":
-            try:
-                table = step["table"]
-                if table not in dataframes:
-                    raise ValueError(f"❌ Table `{table}` not found.")
+        df = dataframes[table]
+        columns = step.get("columns", [])
+        values = step.get("values", {})  # dict of {col: val}
 
-                df = dataframes[table]
-                condition_col = step.get("condition_col")
-                condition_val = step.get("condition_val")
+        check_insert(table, df, values)
 
-                if not condition_col:
-                    raise ValueError("⚠️ DELETE step missing condition column.")
+        # Create new row aligned with df columns
+        new_row = pd.DataFrame([[values.get(col, None) for col in df.columns]], columns=df.columns)
+        new_df = pd.concat([df, new_row], ignore_index=True)
+        extend_indexes(df, new_df, new_row)
 
-                before_count = len(df)
-                df = df[df[condition_col] != condition_val].reset_index(drop=True)
-                after_count = len(df)
+        dataframes[table] = new_df
+        st.success(f"✅ INSERT applied: Row added to `{table}`")
+        st.dataframe(new_df)
+        return new_df
 
-                deleted = before_count - after_count
-                dataframes[table] = df
-                st.success(f"🗑️ DELETE applied on `{table}`: {deleted} row(s) removed.")
-                st.dataframe(df)
-                return df
+    except KeyViolation as e:
+        st.error(f"🔑 INSERT rejected: {e}")
+        return df
+    except Exception as e:
+        st.error(f"❌ Error applying INSERT: {e}")
+        return df if "df" in locals() else pd.DataFrame()
 
-            except Exception as e:
-                st.error(f"❌ Error applying DELETE: {e}")
-                return df if "df" in locals() else pd.DataFrame()
 
-        elif step["type"] == "Set Operation":
-   
-            table1 = step["table1"]
-            table2 = step["table2"]
-            operation = step["operation"]
+@register_apply("UPDATE")
+def _apply_update(step, dataframes):
+    try:
+        table = step["table"]
+        if table not in dataframes:
+            raise ValueError(f"❌ Table `{table}` not found.")
+
+        df = dataframes[table]
+        condition_col = step.get("condition_col")
+        condition_val = step.get("condition_val")
+        update_col = step.get("update_col")
+        new_value = step.get("new_value")
 
-            if table1 not in dataframes or table2 not in dataframes:
-                st.error("❌ One or both tables not found.")
-                return dataframes
+        if not condition_col or not update_col:
+            raise ValueError("⚠️ Missing condition or update column.")
 
-            df1 = dataframes[table1]
-            df2 = dataframes[table2]
+        index = key_index(table, df, condition_col)
+        if index is not None:
+            positions = index.positions(condition_val)
+        else:
+            positions = np.flatnonzero(df[condition_col] == condition_val)
 
-            try:
-                if not df1.columns.equals(df2.columns):
-                    st.error("❌ Columns must match in name and order for Set Operation.")
-                    return dataframes
-
-                if operation == "UNION":
-                    result = pd.concat([df1, df2]).drop_duplicates().reset_index(drop=True)
-                elif operation == "UNION ALL":
-                    result = pd.concat([df1, df2]).reset_index(drop=True)
-                elif operation == "INTERSECT":
-                    result = pd.merge(df1, df2, how="inner")
-                elif operation == "EXCEPT":
-                    result = df1.merge(df2, how="outer", indicator=True).query("_merge == 'left_only'").drop(columns=["_merge"])
+        check_update(table, df, positions, update_col, new_value)
+        df.iloc[positions, df.columns.get_loc(update_col)] = new_value
+        # Indexes on other columns still hold; the updated column's are rebuilt on next use
+        drop_indexes(df, update_col)
+
+        dataframes[table] = df
+        st.success(f"✅ UPDATE applied on `{table}`: {len(positions)} row(s) modified.")
+        st.dataframe(df)
+        return df
+
+    except KeyViolation as e:
+        st.error(f"🔑 UPDATE rejected: {e}")
+        return df
+    except Exception as e:
+        st.error(f"❌ Error applying UPDATE: {e}")
+        return df if "df" in locals() else pd.DataFrame()
+
+
+@register_apply("DELETE")
+def _apply_delete(step, dataframes):
+    try:
+        table = step["table"]
+        if table not in dataframes:
+            raise ValueError(f"❌ Table `{table}` not found.")
+
+        df = dataframes[table]
+        condition_col = step.get("condition_col")
+        condition_val = step.get("condition_val")
+
+        if not condition_col:
+            raise ValueError("⚠️ DELETE step missing condition column.")
+
+        before_count = len(df)
+        index = key_index(table, df, condition_col)
+        if index is not None:
+            df = df[without_positions(df, index.positions(condition_val))].reset_index(drop=True)
+        else:
+            df = df[df[condition_col] != condition_val].reset_index(drop=True)
+        after_count = len(df)
+
+        deleted = before_count - after_count
+        dataframes[table] = df
+        st.success(f"🗑️ DELETE applied on `{table}`: {deleted} row(s) removed.")
+        st.dataframe(df)
+        return df
+
+    except Exception as e:
+        st.error(f"❌ Error applying DELETE: {e}")
+        return df if "df" in locals() else pd.DataFrame()
+
+
+@register_apply("Set Operation")
+def _apply_set_operation(step, dataframes):
+
+    table1 = step["table1"]
+    table2 = step["table2"]
+    operation = step["operation"]
+
+    if table1 not in dataframes or table2 not in dataframes:
+        st.error("❌ One or both tables not found.")
+        return dataframes
+
+    df1 = dataframes[table1]
+    df2 = dataframes[table2]
+
+    try:
+        if not df1.columns.equals(df2.columns):
+            st.error("❌ Columns must match in name and order for Set Operation.")
+            return dataframes
+
+        if operation == "UNION":
+            combined = pd.concat([df1, df2], ignore_index=True)
+            result = combined[~duplicate_mask(combined)].reset_index(drop=True)
+        elif operation == "UNION ALL":
+            result = pd.concat([df1, df2]).reset_index(drop=True)
+        elif operation == "INTERSECT":
+            result = pd.merge(df1, df2, how="inner")
+        elif operation == "EXCEPT":
+            result = df1.merge(df2, how="outer", indicator=True).query("_merge == 'left_only'").drop(columns=["_merge"])
+        else:
+            st.warning("⚠️ Invalid Set Operation selected.")
+            return dataframes
+
+        new_name = f"{table1}_{operation.replace(' ', '_')}_{table2}"
+        dataframes[new_name] = result
+        st.success(f"✅ Set Operation completed. Result saved as `{new_name}`.")
+        st.dataframe(result)
+
+    except Exception as e:
+        st.error(f"❌ Error in Set Operation: {e}")
+
+
+def _apply_missing_values_batch(step, dataframes):
+    table = step["table"]
+    df = dataframes[table]
+
+    fill_values, drop_cols = plan_missing_value_batch(df, step)
+    if drop_cols:
+        df = df.dropna(subset=drop_cols)
+    if fill_values:
+        df = df.fillna(value=fill_values)
+
+    step["sql"] = batched_fill_update_sql(table, fill_values, drop_cols)
+    return df
+
+
+@register_apply("Handle Missing Values")
+def _apply_handle_missing_values(step, dataframes):
+    if step.get("batch_mode"):
+        return _apply_missing_values_batch(step, dataframes)
+
+    table = step["table"]
+    col = step["column"]
+    strategy = step["strategy"]
+    custom_value = step.get("custom_value")
+
+    df = dataframes[table]
+
+    if strategy == "Drop Rows":
+        df = df[df[col].notnull()]
+        sql = f"DELETE FROM {table} WHERE {col} IS NULL"
+
+    elif strategy == "Fill with Mean":
+        fill_val = df[col].mean()
+        df[col] = df[col].fillna(fill_val)
+        sql = f"UPDATE {table} SET {col} = {fill_val} WHERE {col} IS NULL"
+
+    elif strategy == "Fill with Median":
+        fill_val = df[col].median()
+        df[col] = df[col].fillna(fill_val)
+        sql = f"UPDATE {table} SET {col} = {fill_val} WHERE {col} IS NULL"
+
+    elif strategy == "Fill with Mode":
+        fill_val = df[col].mode().iloc[0]
+        df[col] = df[col].fillna(fill_val)
+        sql = f"UPDATE {table} SET {col} = '{fill_val}' WHERE {col} IS NULL"
+
+    elif strategy == "Fill with Custom Value":
+        fill_val = custom_value
+        df[col] = df[col].fillna(fill_val)
+        sql = f"UPDATE {table} SET {col} = '{fill_val}' WHERE {col} IS NULL"
+
+    drop_indexes(df, col)
+    dataframes[table] = df
+    step["sql"] = sql
+
+
+@register_apply("Modify Table Structure")
+def _apply_modify_table_structure(step, dataframes):
+    table = step["table"]
+    action = step["action"]
+    df = dataframes[table]
+
+    if step["type"] == "Modify Table Structure" and step.get("action")== "Add Column":
+        new_col = step["new_column"]
+        dtype = step.get("dtype", "str")
+        values = step.get("values", [])
+        # Ensure values are padded/truncated to match DataFrame length
+        values_padded = values + [np.nan] * (len(df) - len(values))
+        df[new_col] = pd.Series(values_padded[:len(df)])
+
+        # Cast to correct dtype
+        if dtype == "int":
+            df[new_col] = pd.to_numeric(df[new_col], errors="coerce").astype("Int64")
+        elif dtype == "float":
+            df[new_col] = pd.to_numeric(df[new_col], errors="coerce")
+        else:
+            df[new_col] = df[new_col].astype(str).replace("nan", np.nan)
+        drop_indexes(df, new_col)
+
+    elif step["type"] == "Modify Table Structure" and step.get("action") == "Delete Column":
+        cols = step["columns"]
+        df.drop(columns=cols, inplace=True)
+
+    elif step["type"] == "Modify Table Structure" and step.get("action") == "Add Row":
+        table_name = step.get("table")
+        row_values = step.get("values", [])
+
+        if table_name and row_values:
+            df = dataframes.get(step["table"])
+            if df is not None:
+                if len(row_values) == len(df.columns):
+                    new_row_df = pd.DataFrame([row_values], columns=df.columns)
+                    try:
+                        check_insert(table_name, df, dict(zip(df.columns, row_values)))
+                    except KeyViolation as e:
+                        st.error(f"🔑 Row rejected: {e}")
+                        return None
+                    dataframes[table_name]  = pd.concat([df, new_row_df], ignore_index=True)
+                    extend_indexes(df, dataframes[table_name], new_row_df)
+                    df = dataframes[table_name]
+                    st.success(f"✅ Row added to {table_name}")
                 else:
-                    st.warning("⚠️ Invalid Set Operation selected.")
-                    return dataframes
+                    st.error("❌ Row length does not match number of columns in the table")
+            else:
+                st.error(f"❌ Table '{table_name}' not found")
 
-                new_name = f"{table1}_{operation.replace(' ', '_')}_{table2}"
-                dataframes[new_name] = result
-                st.success(f"✅ Set Operation completed. Result saved as `{new_name}`.")
-                st.dataframe(result)
 
-            except Exception as e:
-                st.error(f"❌ Error in Set Operation: {e}")
-
-
-        elif step["type"] == "Handle Missing Values":
-            table = step["table"]
-            col = step["column"]
-            strategy = step["strategy"]
-            custom_value = step.get("custom_value")
-
-            df = dataframes[table]
-
-            if strategy == "Drop Rows":
-                df = df[df[col].notnull()]
-                sql = f"DELETE FROM {table} WHERE {col} IS NULL"
-
-            elif strategy == "Fill with Mean":
-                fill_val = df[col].mean()
-                df[col] = df[col].fillna(fill_val)
-                sql = f"UPDATE {table} SET {col} = {fill_val} WHERE {col} IS NULL"
-
-            elif strategy == "Fill with Median":
-                fill_val = df[col].median()
-                df[col] = df[col].fillna(fill_val)
-                sql = f"UPDATE {table} SET {col} = {fill_val} WHERE {col} IS NULL"
-
-            elif strategy == "Fill with Mode":
-                fill_val = df[col].mode().iloc[0]
-                df[col] = df[col].fillna(fill_val)
-                sql = f"UPDATE {table} SET {col} = '{fill_val}' WHERE {col} IS NULL"
-
-            elif strategy == "Fill with Custom Value":
-                fill_val = custom_value
-                df[col] = df[col].fillna(fill_val)
-                sql = f"UPDATE {table} SET {col} = '{fill_val}' WHERE {col} IS NULL"
-
-            dataframes[table] = df
-            step["sql"] = sql
-
-        elif step["type"] == "Modify Table Structure":
-            table = step["table"]
-            action = step["action"]
-            df = dataframes[table]
-
-            if step["type"] == "Modify Table Structure" and step.get("action")== "Add Column":
-                new_col = step["new_column"]
-                dtype = step.get("dtype", "str")
-                values = step.get("values", [])
-                # Ensure values are padded/truncated to match DataFrame length
-                values_padded = values + [np.nan] * (len(df) - len(values))
-                df[new_col] = pd.Series(values_padded[:len(df)])
-
-                # Cast to correct dtype
-                if dtype == "int":
-                    df[new_col] = pd.to_numeric(df[new_col], errors="coerce").astype("Int64")
+    elif step["type"] == "Modify Table Structure" and step.get("action") == "Delete Row":
+            col = step["condition_col"]
+            val = step["condition_val"].strip()
+
+            # Try to cast to the same type as column
+            try:
+                val_casted = df[col].dtype.type(val)
+            except Exception:
+                val_casted = val
+
+            if df[col].dtype == "O":  # object/string column
+                # Keys are indexed normalized once, instead of normalizing every value per delete
+                index = key_index(table, df, col, casefold=True)
+                if index is not None:
+                    df = df[without_positions(df, index.positions(str(val_casted).strip().lower()))]
+                else:
+                    df = df[~df[col].astype(str).str.strip().str.lower().eq(str(val_casted).strip().lower())]
+            else:
+                index = key_index(table, df, col)
+                if index is not None:
+                    df = df[without_positions(df, index.positions(val_casted))]
+                else:
+                    df = df[df[col] != val_casted]
+
+    elif step["type"] == "Modify Table Structure" and step.get("action") == "Rename Columns":
+        rename_dict = step.get("rename_dict", {})
+        if rename_dict:
+            df.rename(columns=rename_dict, inplace=True)
+            drop_indexes(df)
+
+    elif step["type"] == "Modify Table Structure" and step.get("action")== "Convert Data Types":
+        dtype_dict = step.get("dtype_dict", {})
+        for col, dtype in dtype_dict.items():
+            drop_indexes(df, col)
+            try:
+                if dtype == "datetime":
+                    df[col] = pd.to_datetime(df[col], errors="coerce")
+                elif dtype == "int":
+                    df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
                 elif dtype == "float":
-                    df[new_col] = pd.to_numeric(df[new_col], errors="coerce")
+                    df[col] = pd.to_numeric(df[col], errors="coerce")
+                elif dtype == "bool":
+                    df[col] = df[col].astype("bool")
                 else:
-                    df[new_col] = df[new_col].astype(str).replace("nan", np.nan)
-
-            elif step["type"] == "Modify Table Structure" and step.get("action") == "Delete Column":
-                cols = step["columns"]
-                df.drop(columns=cols, inplace=True)
-
-            elif step["type"] == "Modify Table Structure" and step.get("action") == "Add Row":
-                table_name = step.get("table")
-                row_values = step.get("values", [])
-
-                if table_name and row_values:
-                    df = dataframes.get(step["table"])
-                    if df is not None:
-                        if len(row_values) == len(df.columns):
-                            new_row_df = pd.DataFrame([row_values], columns=df.columns)
-                            dataframes[table_name]  = pd.concat([df, new_row_df], ignore_index=True)
-                            st.success(f"✅ Row added to {table_name}")
-                        else:
-                            st.error("❌ Row length does not match number of columns in the table")
-                    else:
-                        st.error(f"❌ Table '{table_name}' not found")
-
-
-            elif step["type"] == "Modify Table Structure" and step.get("action") == "Delete Row":
-                    col = step["condition_col"]
-                    val = step["condition_val"].strip()
-
-                    # Try to cast to the same type as column
-                    try:
-                        val_casted = df[col].dtype.type(val)
-                    except Exception:
-                        val_casted = val
-
-                    if df[col].dtype == "O":  # object/string column
-                        df = df[~df[col].astype(str).str.strip().str.lower().eq(str(val_casted).strip().lower())]
-                    else:
-                        df = df[df[col] != val_casted]
-                
-            elif step["type"] == "Modify Table Structure" and step.get("action") == "Rename Columns":
-                rename_dict = step.get("rename_dict", {})
-                if rename_dict:
-                    df.rename(columns=rename_dict, inplace=True)
-
-            elif step["type"] == "Modify Table Structure" and step.get("action")== "Convert Data Types":
-                dtype_dict = step.get("dtype_dict", {})
-                for col, dtype in dtype_dict.items():
-                    try:
-                        if dtype == "datetime":
-                            df[col] = pd.to_datetime(df[col], errors="coerce")
-                        elif dtype == "int":
-                            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
-                        elif dtype == "float":
-                            df[col] = pd.to_numeric(df[col], errors="coerce")
-                        elif dtype == "bool":
-                            df[col] = df[col].astype("bool")
-                        else:
-                            df[col] = df[col].astype(dtype)
-                    except Exception as e:
-                        st.warning(f"⚠️ Failed to convert `{col}` to {dtype}: {e}")
-
-            dataframes[table] = df
-            st.markdown(f"### 📄 Updated `{table}` Table Preview")
-            st.dataframe(df)
-
-        elif step["type"] ==  "Create New Table with Foreign Link":
-            table = step.get("output_name") or step.get("new_table_name", "new_table")
-            # Load metadata
-            rows = step.get("data", [])
-            columns = step.get("columns", [])
-            dtypes = step.get("dtypes", {})
-            output_name = step.get("Output Table Name", "new_table")
-
-            # Create DataFrame from stored rows
-            if not rows or not columns:
-                raise ValueError("No data provided to create the new table.")
-            
-            df = pd.DataFrame(rows,columns=columns)
+                    df[col] = df[col].astype(dtype)
+            except Exception as e:
+                st.warning(f"⚠️ Failed to convert `{col}` to {dtype}: {e}")
 
-            # Apply column names if not already set
-            if df.columns.tolist() != columns:
-                df.columns = columns
+    dataframes[table] = df
+    st.markdown(f"### 📄 Updated `{table}` Table Preview")
+    st.dataframe(df)
 
-            # Apply dtypes
-            for col, dtype in dtypes.items():
-                try:
-                    if dtype == "datetime":
-                        df[col] = pd.to_datetime(df[col], errors="coerce")
-                    else:
-                        df[col] = df[col].astype(dtype)
-                except Exception as e:
-                    print(f"[Warning] Failed to cast {col} to {dtype}: {e}")
-            
-                    # ✅ Generate SQL
-            dtype_map = {
-                "int": "INTEGER",
-                "float": "FLOAT",
-                "str": "VARCHAR(255)",
-                "datetime": "TIMESTAMP"
-            }
-
-
-                # CREATE TABLE
-            column_defs = []
-            for col in columns:
-                dtype = dtypes.get(col, "str")
-                sql_dtype = dtype_map.get(dtype, "VARCHAR(255)")
-                column_defs.append(f"{col} {sql_dtype}")
-            create_sql = f"CREATE TABLE {table} ({', '.join(column_defs)});"
-
-            # INSERT INTO
-            insert_statements = []
-            for _, row in df.iterrows():
-                formatted_values = []
-                for col in columns:
-                    val = row[col]
-                    dtype = dtypes.get(col, "str")
-                    if pd.isnull(val):
-                        formatted_values.append("NULL")
-                    elif dtype in ["str", "datetime"]:
-                        val = str(val).replace("'", "''")
-                        formatted_values.append(f"'{val}'")
-                    else:
-                        formatted_values.append(str(val))
-                insert_statements.append(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(formatted_values)});")
-
-            # Save full SQL
-            step["sql_code"] = create_sql + "\n" + "\n".join(insert_statements)
-
-
-
-            # Return named output
-            return df
-
-        elif step["type"] == "Create Table with Primary Key":
-            try:
-                columns = step.get("columns", [])
-                dtypes_sql = step.get("dtypes", {})
-                pk = step.get("primary_key", "")
-                table_name = step.get("output_name", "new_table")
-                rows_input = step.get("data", "")  # 🆕 get raw row input
-
-                # Convert to pandas dtypes
-                pandas_dtypes = {
-                    col: sql_to_pandas_dtype.get(dtype.upper(), "object")
-                    for col, dtype in dtypes_sql.items()
-                }
-
-                # Parse input rows
-                rows = []
-                if rows_input:
-                    for line in rows_input.strip().split("\n"):
-                        row = [val.strip() for val in line.split(",")]
-                        rows.append(row)
-
-                # Create DataFrame
-                df = pd.DataFrame(rows, columns=columns).astype(pandas_dtypes)
-                dataframes[table_name] = df
-
-                for col, dtype in pandas_dtypes.items():
-                    try:
-                        df[col] = df[col].astype(dtype)
-                    except Exception as e:
-                        st.warning(f"⚠️ Failed to convert `{col}` to `{dtype}`: {e}")
 
-                dataframes[table_name] = df
+@register_apply("Create New Table with Foreign Link")
+def _apply_create_new_table_with_foreign_link(step, dataframes):
+    table = step.get("output_name") or step.get("new_table_name", "new_table")
+    # Load metadata
+    rows = step.get("data", [])
+    columns = step.get("columns", [])
+    dtypes = step.get("dtypes", {})
+    output_name = step.get("Output Table Name", "new_table")
 
-                st.success(f"✅ Table `{table_name}` created with primary key `{pk}`.")
-                st.write("📊 Preview of created table:")
-                st.dataframe(df)
+    # Create DataFrame from stored rows
+    if not rows or not columns:
+        raise ValueError("No data provided to create the new table.")
 
+    df = pd.DataFrame(rows,columns=columns)
+
+    # Apply column names if not already set
+    if df.columns.tolist() != columns:
+        df.columns = columns
+
+    # Apply dtypes
+    for col, dtype in dtypes.items():
+        try:
+            if dtype == "datetime":
+                df[col] = pd.to_datetime(df[col], errors="coerce")
+            else:
+                df[col] = df[col].astype(dtype)
+        except Exception as e:
+            print(f"[Warning] Failed to cast {col} to {dtype}: {e}")
+
+    if step.get("is_foreign_key_link") and step.get("fk_column_name"):
+        # Both ends of the link are indexed for lookups and FK joins
+        declare_key(table, step["fk_column_name"], unique=False)
+        declare_key(step.get("fk_table"), step["fk_column_name"], unique=False)
+
+    # ✅ Generate SQL (column-wise rendering, multi-row INSERT batches)
+    create_sql = foreign_link_create_sql(table, columns, dtypes)
+    batch_size = step.get("insert_batch_size", DEFAULT_INSERT_BATCH_SIZE)
+    output_dir = step.get("output_dir") or st.session_state.get("step_output_dir")
+    if output_dir:
+        # Stream to disk rather than holding the whole script in session state
+        sql_path = os.path.join(output_dir, f"{table}_create_insert.sql")
+        # Rewritten (in the background) only when the rows or the script's shape change
+        fingerprint = hashlib.sha1(f"{frame_fingerprint(df)}|{create_sql}|{batch_size}".encode()).hexdigest()
+        persist_file(sql_path, fingerprint,
+                     lambda target: write_insert_sql(target, table, df, dtypes, batch_size, header=create_sql))
+        step["sql_file"] = sql_path
+        step.pop("sql_code", None)
+        st.caption(f"💾 SQL script is written to `{sql_path}` in the background")
+    else:
+        step["sql_code"] = create_sql + "\n" + "\n".join(iter_insert_batches(table, df, dtypes, batch_size))
+
+
+
+    # Return named output
+    return df
+
+
+@register_apply("Create Table with Primary Key")
+def _apply_create_table_with_primary_key(step, dataframes):
+    try:
+        columns = step.get("columns", [])
+        dtypes_sql = step.get("dtypes", {})
+        pk = step.get("primary_key", "")
+        table_name = step.get("output_name", "new_table")
+        rows_input = step.get("data", "")  # 🆕 get raw row input
+
+        # Convert to pandas dtypes
+        pandas_dtypes = {
+            col: sql_to_pandas_dtype.get(dtype.upper(), "object")
+            for col, dtype in dtypes_sql.items()
+        }
+
+        # Parse input rows and create DataFrame
+        df = parse_pasted_rows(rows_input, columns).astype(pandas_dtypes)
+
+        for col, dtype in pandas_dtypes.items():
+            try:
+                df[col] = df[col].astype(dtype)
             except Exception as e:
-                st.error(f"❌ Error creating table: {e}")
+                st.warning(f"⚠️ Failed to convert `{col}` to `{dtype}`: {e}")
+
+        if pk:
+            # Builds the key's index; later INSERTs and lookups reuse it
+            check_primary_key(df, pk)
+            declare_key(table_name, pk, unique=True)
+        dataframes[table_name] = df
+
+        st.success(f"✅ Table `{table_name}` created with primary key `{pk}`.")
+        st.write("📊 Preview of created table:")
+        st.dataframe(df)
 
+    except KeyViolation as e:
+        st.error(f"🔑 Table `{table_name}` not created: {e}")
+    except Exception as e:
+        st.error(f"❌ Error creating table: {e}")
+
+
+def apply_step(step, dataframes):
+    try:
+        apply = apply_handler(step["type"])
+        if apply is not None:
+            return apply(step, dataframes)
     except Exception as e:
         st.error(f"❌ Error executing step {step['type']}: {e}")
         return None
@@ -0,0 +1,205 @@
+import streamlit as st
+import pandas as pd
+import cProfile
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from sql_steps import apply_step
+
+
+# Step keys that name an input table
+INPUT_KEYS = ["table", "left_table", "right_table", "table1", "table2", "col1_table", "col2_table", "input_source"]
+
+# tracemalloc is process-wide: one traced step at a time, so sessions don't reset or stop each other's tracing
+_trace_lock = threading.Lock()
+# cProfile on Python 3.12+ hooks sys.monitoring, which is process-wide, and a second enable() raises
+_profile_lock = threading.Lock()
+
+
+def step_inputs(step, dataframes):
+    names = []
+    for key in INPUT_KEYS:
+        name = step.get(key)
+        if name and name in dataframes and name not in names:
+            names.append(name)
+    return [dataframes[name] for name in names]
+
+
+def instrumented_apply(step, dataframes, trace_memory=False):
+    """Run apply_step and measure it; returns (df, metrics).
+
+    With `trace_memory`, the peak covers every Python allocation made while the
+    step ran, including other threads', and traced steps wait for each other.
+    """
+    if trace_memory:
+        with _trace_lock:
+            return _measured_apply(step, dataframes, True)
+    return _measured_apply(step, dataframes, False)
+
+
+def _measured_apply(step, dataframes, trace_memory):
+    inputs = step_inputs(step, dataframes)
+    started_tracing = False
+    if trace_memory:
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+            started_tracing = True
+
+    start_ts = time.time()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        df = apply_step(step, dataframes)
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if started_tracing:
+            tracemalloc.stop()
+
+    is_frame = isinstance(df, pd.DataFrame)
+    metrics = {
+        "type": step.get("type"),
+        "start_ts": start_ts,
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "peak_mb": None if peak is None else peak / 2**20,
+        "rows_in": sum(len(d) for d in inputs),
+        "cols_in": sum(d.shape[1] for d in inputs),
+        "rows_out": len(df) if is_frame else None,
+        "cols_out": df.shape[1] if is_frame else None,
+        "output_mb": df.memory_usage(deep=True).sum() / 2**20 if is_frame else None,
+    }
+    return df, metrics
+
+
+def sampling_profiler_available():
+    try:
+        import pyinstrument  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def profiled_apply(step, dataframes, trace_memory=False, sampler=False):
+    """instrumented_apply under cProfile (or pyinstrument); returns (df, metrics, profile).
+
+    One profile runs at a time across all sessions; others wait. On Python
+    3.12+ cProfile also records other threads running meanwhile.
+    """
+    with _profile_lock:
+        return _profiled_apply(step, dataframes, trace_memory, sampler)
+
+
+def _profiled_apply(step, dataframes, trace_memory, sampler):
+    if sampler and sampling_profiler_available():
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            df, metrics = instrumented_apply(step, dataframes, trace_memory)
+        finally:
+            profiler.stop()
+        return df, metrics, {"kind": "sampling", "text": profiler.output_text(unicode=True, color=False)}
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        df, metrics = instrumented_apply(step, dataframes, trace_memory)
+    finally:
+        profiler.disable()
+    return df, metrics, {"kind": "cprofile", "stats": pstats.Stats(profiler)}
+
+
+def top_functions(stats, limit=25):
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append({
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "calls": nc,
+            "tottime_s": tt,
+            "cumtime_s": ct,
+        })
+    return pd.DataFrame(rows).sort_values("cumtime_s", ascending=False).head(limit).reset_index(drop=True)
+
+
+def pstats_bytes(stats):
+    fd, path = tempfile.mkstemp(suffix=".pstats")
+    os.close(fd)
+    try:
+        stats.dump_stats(path)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def render_profile(profile, step_index, prefix="basic"):
+    st.markdown(f"#### 🔬 Profile of Step {step_index+1}")
+    st.caption("Timings above include profiler overhead.")
+    if profile["kind"] == "sampling":
+        st.code(profile["text"], language="text")
+        return
+    st.dataframe(top_functions(profile["stats"]), use_container_width=True)
+    st.download_button("⬇️ Download .pstats", pstats_bytes(profile["stats"]),
+                       file_name=f"step_{step_index+1}.pstats", key=f"{prefix}_pstats_{step_index}")
+
+
+def profile_toggle(step_index, prefix="basic"):
+    """Per-step "profile this step" controls; returns (profile?, use sampler?)."""
+    enabled = st.checkbox("🔬 Profile this step", key=f"{prefix}_profile_{step_index}")
+    sampler = False
+    if enabled and sampling_profiler_available():
+        sampler = st.checkbox("Use sampling profiler (pyinstrument)", key=f"{prefix}_profile_sampler_{step_index}")
+    return enabled, sampler
+
+
+def metrics_badge(metrics):
+    if not metrics:
+        return ""
+    parts = [f"⏱️ {metrics['wall_s']:.2f}s"]
+    if metrics.get("peak_mb") is not None:
+        parts.append(f"🧠 {metrics['peak_mb']:.1f} MB peak")
+    if metrics.get("rows_out") is not None:
+        parts.append(f"{metrics['rows_in']:,} → {metrics['rows_out']:,} rows")
+    if metrics.get("shared"):
+        parts.append("♻️ reused result")
+    return " · ".join(parts)
+
+
+def chrome_trace(metrics_by_step):
+    """Export step metrics in Chrome trace format (chrome://tracing, Perfetto)."""
+    events = []
+    for i, m in sorted(metrics_by_step.items()):
+        events.append({
+            "name": f"Step {i+1}: {m['type']}",
+            "cat": "apply_step",
+            "ph": "X",
+            "ts": int(m["start_ts"] * 1e6),
+            "dur": int(m["wall_s"] * 1e6),
+            "pid": 1,
+            "tid": 1,
+            "args": {k: v for k, v in m.items() if k not in ["type", "start_ts"]},
+        })
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, indent=2)
+
+
+def pipeline_metrics_panel(metrics_by_step, prefix="basic"):
+    if not metrics_by_step:
+        return
+    with st.expander("📈 Pipeline Performance Summary", expanded=False):
+        summary = pd.DataFrame([
+            {"step": i + 1, **{k: v for k, v in m.items() if k != "start_ts"}}
+            for i, m in sorted(metrics_by_step.items())
+        ]).set_index("step")
+        st.dataframe(summary.style.format(precision=3, na_rep="—").highlight_max(subset=["wall_s"], color="#fde68a"))
+        st.caption(f"Total wall time: {summary['wall_s'].sum():.3f}s")
+        st.download_button("⬇️ Download Run Trace (Chrome JSON)", chrome_trace(metrics_by_step),
+                           file_name="pipeline_trace.json", mime="application/json", key=f"{prefix}_trace_download")
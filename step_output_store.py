@@ -0,0 +1,120 @@
+import streamlit as st
+import pandas as pd
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+OUTPUT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "feather": (".feather", "application/vnd.apache.arrow.file"),
+}
+
+_WRITER = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vq-step-writer")
+_lock = threading.Lock()
+_written = {}   # path -> fingerprint of the frame currently on disk
+_pending = {}   # path -> (fingerprint, future) of the latest queued write
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def available_formats():
+    return list(OUTPUT_FORMATS) if arrow_available() else ["csv"]
+
+
+def frame_fingerprint(df):
+    """Order-sensitive content fingerprint; much cheaper than serializing the frame."""
+    schema = f"{list(df.columns)}|{list(map(str, df.dtypes))}|{df.shape}"
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        content = hashlib.sha1(hashed.tobytes()).hexdigest()
+    except TypeError:
+        # Unhashable cells (lists, dicts): fall back to object identity
+        content = f"id{id(df)}"
+    return hashlib.sha1(f"{schema}|{content}".encode()).hexdigest()
+
+
+def serialize_frame(df, target, fmt):
+    if fmt == "parquet":
+        df.to_parquet(target, index=False)
+    elif fmt == "feather":
+        df.reset_index(drop=True).to_feather(target)
+    else:
+        df.to_csv(target, index=False)
+
+
+def _write_and_record(write, path, fingerprint):
+    tmp_path = f"{path}.{fingerprint[:8]}.tmp"
+    write(tmp_path)
+    with _lock:
+        latest = _pending.get(path)
+        if latest is not None and latest[0] != fingerprint:
+            # A newer result was queued meanwhile; don't clobber it
+            os.remove(tmp_path)
+            return path
+        os.replace(tmp_path, path)
+        _written[path] = fingerprint
+    return path
+
+
+def persist_step_output(df, output_dir, base_name, fmt="csv"):
+    """Queue a background write of df only if its content changed since the last write.
+
+    Returns (path, fingerprint) immediately.
+    """
+    ext = OUTPUT_FORMATS[fmt][0]
+    path = os.path.join(output_dir, base_name + ext)
+    fingerprint = frame_fingerprint(df)
+    persist_file(path, fingerprint, lambda target: serialize_frame(df, target, fmt))
+    return path, fingerprint
+
+
+def persist_file(path, fingerprint, write):
+    """Queue `write(target)` in the background unless `path` already holds (or is getting) `fingerprint`."""
+    with _lock:
+        if _written.get(path) == fingerprint and os.path.exists(path):
+            return
+        pending = _pending.get(path)
+        if pending is not None and pending[0] == fingerprint:
+            return
+        _pending[path] = (fingerprint, _WRITER.submit(_write_and_record, write, path, fingerprint))
+
+
+def download_payload(df, path, fingerprint, fmt):
+    with _lock:
+        pending = _pending.get(path)
+    if pending is not None and pending[0] == fingerprint:
+        try:
+            pending[1].result()
+        except Exception as e:
+            st.warning(f"⚠️ Background write failed, serializing in memory: {e}")
+    if _written.get(path) == fingerprint and os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    buf = io.BytesIO()
+    serialize_frame(df, buf, fmt)
+    return buf.getvalue()
+
+
+def lazy_download_button(df, path, fingerprint, fmt, label, key):
+    """Two-click download: the payload is only built once the user asks for it."""
+    ready_key = f"{key}_ready"
+    ready = st.session_state.get(ready_key)
+    if ready is None or ready[0] != fingerprint:
+        st.session_state.pop(ready_key, None)
+        if not st.button(f"📦 Prepare: {label}", key=f"{key}_prepare"):
+            return
+        # Built once and kept until downloaded, not re-read on every rerun in between
+        ready = st.session_state[ready_key] = (fingerprint, download_payload(df, path, fingerprint, fmt))
+
+    if st.download_button(label, data=ready[1], file_name=os.path.basename(path), mime=OUTPUT_FORMATS[fmt][1], key=key):
+        st.session_state.pop(ready_key, None)
@@ -0,0 +1,388 @@
+import pandas as pd
+
+from column_stats import table_catalog
+
+
+# Step type → {"output_schema": fn(step, schemas) -> schema, "form_needs_rows": bool,
+#              "form": fn(step_count, step, dataframes, prefix), "apply": fn(step, dataframes) -> frame}
+# Schemas are registered here; sql_steps registers each type's form and apply handlers.
+STEP_TYPES = {}
+
+FORM_TO_PANDAS_DTYPE = {"str": "object", "int": "int64", "float": "float64", "datetime": "datetime64[ns]", "bool": "bool"}
+
+
+def register_step(step_type, form_needs_rows=False):
+    """Declare a step type and the function that derives its output schema.
+
+    Forms of steps with `form_needs_rows` preview or pick actual rows, so they
+    are given real frames when one is available instead of a schema.
+    """
+    def register(fn):
+        STEP_TYPES[step_type] = {"output_schema": fn, "form_needs_rows": form_needs_rows}
+        return fn
+    return register
+
+
+def register_form(*step_types):
+    """Attach the form builder of already registered step types."""
+    def register(fn):
+        for step_type in step_types:
+            STEP_TYPES[step_type]["form"] = fn
+        return fn
+    return register
+
+
+def register_apply(*step_types):
+    """Attach the function executing already registered step types."""
+    def register(fn):
+        for step_type in step_types:
+            STEP_TYPES[step_type]["apply"] = fn
+        return fn
+    return register
+
+
+def form_handler(step_type):
+    return STEP_TYPES.get(step_type, {}).get("form")
+
+
+def apply_handler(step_type):
+    return STEP_TYPES.get(step_type, {}).get("apply")
+
+
+def step_type_names():
+    return list(STEP_TYPES)
+
+
+def form_needs_rows(step_type):
+    return STEP_TYPES.get(step_type, {}).get("form_needs_rows", True)
+
+
+# --- Schemas ---------------------------------------------------------------
+# A schema is a zero-row frame with the output's columns and dtypes, so forms
+# can call `.columns`, `.dtype` and `select_dtypes` on it unchanged. Its attrs
+# record, per column, the uploaded (table, column) its values come from; value
+# pickers and slider bounds read statistics from that source column.
+
+def make_schema(frame, lineage=None, sorted_by=None):
+    schema = frame.iloc[:0].copy()
+    schema.attrs = {"schema": True, "lineage": dict(lineage or {})}
+    if sorted_by:
+        # (columns, ascending) the rows will be sorted by
+        schema.attrs["sorted_by"] = sorted_by
+    return schema
+
+
+def schema_from_dtypes(dtypes, lineage=None, sorted_by=None):
+    frame = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in dtypes.items()})
+    return make_schema(frame, lineage, sorted_by)
+
+
+def is_schema(frame):
+    return isinstance(frame, pd.DataFrame) and frame.attrs.get("schema", False)
+
+
+def lineage_of(frame):
+    return frame.attrs.get("lineage", {}) if is_schema(frame) else {}
+
+
+def table_schema(name, df):
+    return make_schema(df, {col: (name, col) for col in df.columns})
+
+
+def table_schemas(tables):
+    return {name: table_schema(name, df) for name, df in tables.items()}
+
+
+def output_schema(step, schemas):
+    """Output schema of `step` given the schemas of the tables it can read, or None."""
+    spec = STEP_TYPES.get(step.get("type"))
+    if spec is None:
+        return None
+    try:
+        return spec["output_schema"](step, schemas)
+    except (KeyError, TypeError, ValueError):
+        # Step not fully configured yet
+        return None
+
+
+def propagate_schemas(pipeline, tables, names=None):
+    """Schema of every step output, derived without executing any step.
+
+    `names[i]` is what step i's output is called (defaults to `step_{i+1}`,
+    as in the dynamic pipeline). Dynamic steps read their `input_source`.
+    """
+    schemas = table_schemas(tables)
+    out = {}
+    for i, step in enumerate(pipeline):
+        name = names[i] if names else f"step_{i+1}"
+        schema = output_schema(step, schemas)
+        if schema is not None:
+            schemas[name] = out[name] = schema
+    return out
+
+
+def form_tables(step, tables, schemas, step_outputs=None):
+    """Tables a step's form may choose from: uploads, plus upstream schemas (or rows if it needs them)."""
+    available = dict(tables)
+    available.update(schemas)
+    if step_outputs and form_needs_rows(step.get("type")):
+        available.update(step_outputs)
+    return available
+
+
+# --- Column values without executing upstream steps ------------------------
+
+def source_of(dataframes, table, column):
+    """The real (frame, column) whose values `table[column]` takes, or None if derived."""
+    frame = dataframes.get(table)
+    if frame is None:
+        return None
+    if not is_schema(frame):
+        return (frame, column) if column in frame.columns else None
+    origin = lineage_of(frame).get(column)
+    if origin is None:
+        return None
+    root, root_col = origin
+    source = dataframes.get(root)
+    if source is None or is_schema(source) or root_col not in source.columns:
+        return None
+    return source, root_col
+
+
+def source_column(dataframes, table, column):
+    source = source_of(dataframes, table, column)
+    return None if source is None else source[0][source[1]]
+
+
+def column_stats(dataframes, table, column):
+    """Catalog statistics of the column's source, or None when it can't be known without executing."""
+    source = source_of(dataframes, table, column)
+    if source is None:
+        return None
+    frame, col = source
+    return table_catalog(frame)[col]
+
+
+def column_range(dataframes, table, column):
+    """(min, max) for a numeric column, or None when unknown."""
+    stats = column_stats(dataframes, table, column)
+    if stats is None or stats["min"] is None or not pd.api.types.is_numeric_dtype(stats["dtype"]):
+        return None
+    return float(stats["min"]), float(stats["max"])
+
+
+# --- Step types ------------------------------------------------------------
+
+def _passthrough(schemas, table):
+    return schemas[table]
+
+
+def _form_dtype(dtype):
+    # Forms store dtype names ("int", "datetime"); the foreign-key column stores `str` itself
+    name = dtype if isinstance(dtype, str) else getattr(dtype, "__name__", "str")
+    return FORM_TO_PANDAS_DTYPE.get(name, "object")
+
+
+@register_step("Filter Rows")
+def _filter_schema(step, schemas):
+    return _passthrough(schemas, step["table"])
+
+
+@register_step("Sort Rows")
+def _sort_schema(step, schemas):
+    source = schemas[step["table"]]
+    return make_schema(source, lineage_of(source), (tuple(step["columns"]), step.get("ascending", True)))
+
+
+@register_step("Group By")
+def _group_by_schema(step, schemas):
+    source = schemas[step["table"]]
+    lineage = lineage_of(source)
+    dtypes = {col: source[col].dtype for col in step["group_cols"]}
+    out_lineage = {col: lineage[col] for col in step["group_cols"] if col in lineage}
+    approximate = step.get("approximate", False)
+    for col, func in step["aggregations"].items():
+        name = f"{func}_{col}"
+        if func in ["count", "nunique"]:
+            dtypes[name] = "float64" if approximate else "int64"
+        elif func == "mean" or (approximate and func == "sum"):
+            dtypes[name] = "float64"
+        else:
+            dtypes[name] = source[col].dtype
+            if func in ["min", "max"] and col in lineage:
+                out_lineage[name] = lineage[col]
+        if approximate:
+            # 95% confidence half-width of the estimate
+            dtypes[name + " ±"] = "float64"
+    return schema_from_dtypes(dtypes, out_lineage)
+
+
+@register_step("Join Tables")
+def _join_schema(step, schemas):
+    left, right = schemas[step["left_table"]], schemas[step["right_table"]]
+    left_on, right_on = step["left_on"], step["right_on"]
+    left_lineage, right_lineage = dict(lineage_of(left)), dict(lineage_of(right))
+    if step.get("cast_to_str", False):
+        left, right = left.copy(), right.copy()
+        left[left_on] = left[left_on].astype(str)
+        right[right_on] = right[right_on].astype(str)
+        left_lineage.pop(left_on, None)
+        right_lineage.pop(right_on, None)
+
+    # Merging the zero-row schemas gives pandas' exact output columns (suffixes included)
+    merged = pd.merge(left, right, how=step["join_type"], left_on=left_on, right_on=right_on)
+    lineage = {}
+    for col in merged.columns:
+        if col in left_lineage and col not in right.columns:
+            lineage[col] = left_lineage[col]
+        elif col in right_lineage and col not in left.columns:
+            lineage[col] = right_lineage[col]
+        elif col.endswith("_x") and col[:-2] in left_lineage:
+            lineage[col] = left_lineage[col[:-2]]
+        elif col.endswith("_y") and col[:-2] in right_lineage:
+            lineage[col] = right_lineage[col[:-2]]
+        elif col in left_lineage:
+            # Shared key column: merge keeps the left side's values
+            lineage[col] = left_lineage[col]
+    return make_schema(merged, lineage)
+
+
+@register_step("Semi Join")
+def _semi_join_schema(step, schemas):
+    return _passthrough(schemas, step["left_table"])
+
+
+@register_step("Anti Join")
+def _anti_join_schema(step, schemas):
+    return _passthrough(schemas, step["left_table"])
+
+
+@register_step("Deduplicate")
+def _deduplicate_schema(step, schemas):
+    return _passthrough(schemas, step["table"])
+
+
+@register_step("Aggregate Column")
+def _aggregate_column_schema(step, schemas):
+    dtypes = {step["alias"]: "int64" if step["function"] in ["count", "nunique"] else "float64"}
+    if step.get("approximate", False):
+        dtypes = {step["alias"]: "float64", step["alias"] + " ±": "float64"}
+    return schema_from_dtypes(dtypes)
+
+
+@register_step("Modify Column")
+def _modify_column_schema(step, schemas):
+    source = schemas[step["table"]]
+    operator = step.get("operator", "+")
+    if step.get("use_manual_expr", False):
+        dtype = "object"
+    elif operator in ["==", "!=", ">", "<", ">=", "<="]:
+        dtype = "bool"
+    elif operator == "+":
+        dtype = "object"
+    else:
+        dtype = "float64"
+    dtypes = dict(source.dtypes)
+    dtypes[step["alias"]] = dtype
+    lineage = {col: origin for col, origin in lineage_of(source).items() if col != step["alias"]}
+    return schema_from_dtypes(dtypes, lineage)
+
+
+@register_step("Create & Save New Table", form_needs_rows=True)
+def _create_table_schema(step, schemas):
+    dtypes = step.get("dtypes", {})
+    base = schemas.get(step.get("base_table")) if step.get("use_existing") else None
+    base_columns = [col for col in step.get("base_columns", []) if base is not None and col in base.columns]
+    out = {col: base[col].dtype for col in base_columns}
+    out.update({col: _form_dtype(dtypes.get(col)) for col in step["columns"] if col not in out})
+    lineage = {col: origin for col, origin in lineage_of(base).items() if col in base_columns} if base is not None else {}
+    return schema_from_dtypes(out, lineage)
+
+
+@register_step("INSERT", form_needs_rows=True)
+def _insert_schema(step, schemas):
+    return _passthrough(schemas, step["table"])
+
+
+@register_step("UPDATE", form_needs_rows=True)
+def _update_schema(step, schemas):
+    source = schemas[step["table"]]
+    lineage = {col: origin for col, origin in lineage_of(source).items() if col != step.get("update_col")}
+    return make_schema(source, lineage)
+
+
+@register_step("DELETE", form_needs_rows=True)
+def _delete_schema(step, schemas):
+    return _passthrough(schemas, step["table"])
+
+
+@register_step("Set Operation")
+def _set_operation_schema(step, schemas):
+    return _passthrough(schemas, step["table1"])
+
+
+@register_step("Handle Missing Values", form_needs_rows=True)
+def _missing_values_schema(step, schemas):
+    return _passthrough(schemas, step["table"])
+
+
+@register_step("Modify Table Structure", form_needs_rows=True)
+def _modify_structure_schema(step, schemas):
+    source = schemas[step["table"]]
+    dtypes = dict(source.dtypes)
+    lineage = dict(lineage_of(source))
+    action = step.get("action")
+    if action == "Add Column" and step.get("new_column"):
+        dtypes[step["new_column"]] = {"int": "Int64", "float": "float64"}.get(step.get("dtype"), "object")
+    elif action == "Delete Column":
+        for col in step.get("columns", []):
+            dtypes.pop(col, None)
+            lineage.pop(col, None)
+    elif action == "Rename Columns":
+        rename = step.get("rename_dict", {})
+        dtypes = {rename.get(col, col): dtype for col, dtype in dtypes.items()}
+        lineage = {rename.get(col, col): origin for col, origin in lineage.items()}
+    elif action == "Convert Data Types":
+        for col, dtype in step.get("dtype_dict", {}).items():
+            dtypes[col] = {"int": "Int64"}.get(dtype, FORM_TO_PANDAS_DTYPE.get(dtype, dtype))
+            lineage.pop(col, None)
+    return schema_from_dtypes(dtypes, lineage)
+
+
+@register_step("Create New Table with Foreign Link", form_needs_rows=True)
+def _foreign_link_schema(step, schemas):
+    dtypes = step.get("dtypes", {})
+    return schema_from_dtypes({col: _form_dtype(dtypes.get(col)) for col in step["columns"]})
+
+
+@register_step("Create Table with Primary Key")
+def _primary_key_schema(step, schemas):
+    from sql_steps import sql_to_pandas_dtype
+    dtypes = step.get("dtypes", {})
+    return schema_from_dtypes({
+        col: sql_to_pandas_dtype.get(dtypes.get(col, "TEXT").upper(), "object") for col in step["columns"]
+    })
+
+
+@register_step("Window Function")
+def _window_schema(step, schemas):
+    source = schemas[step["table"]]
+    function = step["function"]
+    column = step.get("column")
+    if function in ["ROW_NUMBER", "RANK", "DENSE_RANK", "COUNT"]:
+        dtype = "int64"
+    elif function == "AVG" or (step.get("frame", "").startswith("Moving") and pd.api.types.is_numeric_dtype(source[column].dtype)):
+        dtype = "float64"
+    elif function in ["LAG", "LEAD"] and pd.api.types.is_integer_dtype(source[column].dtype):
+        dtype = "float64"  # the rows shifted in at partition edges are null
+    else:
+        dtype = source[column].dtype
+    dtypes = dict(source.dtypes)
+    dtypes[step["alias"]] = dtype
+    lineage = {col: origin for col, origin in lineage_of(source).items() if col != step["alias"]}
+    if function in ["MIN", "MAX", "LAG", "LEAD"] and column in lineage_of(source):
+        lineage[step["alias"]] = lineage_of(source)[column]
+    keys = tuple(step.get("partition_by", []) + step.get("order_by", []))
+    # The step sorts by partition then order keys
+    sorted_by = (keys, True) if keys and step.get("ascending", True) else None
+    return schema_from_dtypes(dtypes, lineage, sorted_by)
@@ -0,0 +1,249 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from collections import OrderedDict
+
+from memory_manager import frame_token
+from sort_order import carry_order, forget_order
+
+
+KEYS_KEY = "_declared_keys"
+INDEXES_KEY = "_hash_indexes"
+# Indexes kept per session; the least recently used is rebuilt on demand
+MAX_INDEXES = 32
+
+
+class KeyViolation(ValueError):
+    pass
+
+
+class HashIndex:
+    """Value -> row positions for one column, built once in O(n).
+
+    Positions are grouped by factorized value code, so a lookup is one hash
+    probe into the distinct values plus a slice. Rows appended later are kept
+    in a small side table instead of rebuilding.
+    """
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        self.keys = pd.Index(uniques)
+        self.order = np.argsort(codes, kind="stable")
+        # Nulls (code -1) sort first; starts[c]:starts[c+1] are the rows of code c
+        self.starts = np.searchsorted(codes[self.order], np.arange(len(uniques) + 1))
+        self.counts = np.diff(self.starts)
+        self.nulls = int(self.starts[0])
+        self.size = len(codes)
+        self.appended = {}
+
+    def _code(self, value):
+        if np.ndim(value) == 0 and pd.isna(value):
+            return -1
+        try:
+            return int(self.keys.get_indexer([value])[0])
+        except (TypeError, ValueError):
+            return -1
+
+    def positions(self, value):
+        code = self._code(value)
+        found = self.order[self.starts[code]:self.starts[code + 1]] if code >= 0 else np.empty(0, dtype=np.intp)
+        extra = self.appended.get(value)
+        return np.concatenate([found, extra]) if extra else found
+
+    def positions_many(self, values):
+        """Rows whose value is any of `values`, in table order."""
+        try:
+            codes = self.keys.get_indexer(pd.Index(values).dropna().unique())
+        except (TypeError, ValueError):
+            codes = np.empty(0, dtype=np.intp)
+        codes = codes[codes >= 0]
+        counts = self.counts[codes]
+        # Concatenate the slices order[starts[c]:starts[c+1]] without a Python loop
+        offsets = np.repeat(self.starts[codes] - np.cumsum(counts) + counts, counts)
+        found = self.order[offsets + np.arange(counts.sum())]
+        extra = [pos for value in set(values) for pos in self.appended.get(value, [])]
+        return np.sort(np.concatenate([found, np.asarray(extra, dtype=np.intp)]))
+
+    def contains(self, value):
+        return len(self.positions(value)) > 0
+
+    def duplicate_keys(self, limit=5):
+        dup = self.keys[self.counts > 1].tolist()
+        dup += [value for value, extra in self.appended.items()
+                if len(extra) > 1 or self._code(value) >= 0]
+        return dup[:limit]
+
+    def with_appended(self, values):
+        """Index of this table with `values` appended as new rows; shares the built arrays."""
+        index = object.__new__(HashIndex)
+        index.__dict__.update(self.__dict__)
+        index.appended = {value: list(positions) for value, positions in self.appended.items()}
+        for offset, value in enumerate(values):
+            if pd.isna(value):
+                index.nulls += 1
+            else:
+                index.appended.setdefault(value, []).append(self.size + offset)
+        index.size = self.size + len(values)
+        return index
+
+
+def without_positions(df, positions):
+    """Boolean row mask of `df` excluding the rows at `positions` (labels may repeat)."""
+    keep = np.ones(len(df), dtype=bool)
+    keep[positions] = False
+    return keep
+
+
+# --- Declared keys ---------------------------------------------------------
+
+def declare_key(table, column, unique):
+    """Record that `table[column]` is a primary (unique) or foreign key."""
+    if table and column:
+        st.session_state.setdefault(KEYS_KEY, {}).setdefault(table, {})[column] = unique
+
+
+def forget_keys(table):
+    st.session_state.get(KEYS_KEY, {}).pop(table, None)
+
+
+def declared_keys(table):
+    """{column: unique} for the keys declared on `table`."""
+    return st.session_state.get(KEYS_KEY, {}).get(table, {})
+
+
+def primary_key(table):
+    return next((col for col, unique in declared_keys(table).items() if unique), None)
+
+
+# --- Index cache -----------------------------------------------------------
+
+def _indexes():
+    return st.session_state.setdefault(INDEXES_KEY, OrderedDict())
+
+
+def _normalized(series):
+    return series.astype(str).str.strip().str.lower()
+
+
+def hash_index(df, column, casefold=False):
+    """The index of `df[column]`, built on first use for this frame.
+
+    With `casefold`, string values are indexed stripped and lower-cased.
+    """
+    indexes = _indexes()
+    key = (frame_token(df), column, casefold)
+    index = indexes.get(key)
+    if index is None or index.size != len(df):
+        values = _normalized(df[column]) if casefold else df[column]
+        index = indexes[key] = HashIndex(values)
+    indexes.move_to_end(key)
+    while len(indexes) > MAX_INDEXES:
+        indexes.popitem(last=False)
+    return index
+
+
+def key_set(df, column):
+    """Distinct non-null values of `df[column]` as a hashed Index, built once per frame.
+
+    Reuses the keys of a full index on the column when one exists.
+    """
+    indexes = _indexes()
+    token = frame_token(df)
+    index = indexes.get((token, column, False))
+    if index is not None and index.size == len(df) and not index.appended:
+        return index.keys
+    key = (token, column, "keys")
+    entry = indexes.get(key)
+    if entry is None or entry[0] != len(df):
+        entry = indexes[key] = (len(df), pd.Index(df[column].dropna().unique()))
+    indexes.move_to_end(key)
+    while len(indexes) > MAX_INDEXES:
+        indexes.popitem(last=False)
+    return entry[1]
+
+
+def matches_keys(values, keys):
+    """Boolean mask of `values` found in the key Index `keys` (nulls never match, as in SQL)."""
+    try:
+        return keys.get_indexer(values) >= 0
+    except (TypeError, ValueError):
+        # Keys that can't be compared (e.g. numbers against strings) match nothing
+        return np.zeros(len(values), dtype=bool)
+
+
+def key_index(table, df, column, casefold=False):
+    """Index for a declared key column of `table`, or None (callers fall back to a scan)."""
+    if df is None or column not in declared_keys(table) or column not in df.columns:
+        return None
+    return hash_index(df, column, casefold)
+
+
+def carry_indexes(source, target):
+    """Let `target`, a same-rows copy of `source`, reuse the indexes (and sort order) of `source`."""
+    carry_order(source, target)
+    indexes = _indexes()
+    token = frame_token(source)
+    for (owner, column, casefold), index in list(indexes.items()):
+        if owner == token and column in target.columns:
+            indexes[(frame_token(target), column, casefold)] = index
+
+
+def drop_indexes(df, column=None):
+    """Forget indexes and sort order of `df` (or of one column) after changing its values in place."""
+    forget_order(df, column)
+    indexes = _indexes()
+    token = frame_token(df)
+    for key in [k for k in indexes if k[0] == token and (column is None or k[1] == column)]:
+        del indexes[key]
+
+
+def extend_indexes(df, new_df, appended):
+    """Carry `df`'s indexes to `new_df` = `df` with the rows of `appended` added at the end."""
+    indexes = _indexes()
+    token = frame_token(df)
+    for (owner, column, casefold), index in list(indexes.items()):
+        if owner == token and column in appended.columns and isinstance(index, HashIndex):
+            values = _normalized(appended[column]) if casefold else appended[column]
+            indexes[(frame_token(new_df), column, casefold)] = index.with_appended(values.tolist())
+
+
+# --- Key enforcement -------------------------------------------------------
+
+def check_primary_key(df, column):
+    """Raise KeyViolation if `df[column]` has nulls or repeated values."""
+    index = hash_index(df, column)
+    if index.nulls:
+        raise KeyViolation(f"Primary key `{column}` has {index.nulls} empty value(s).")
+    duplicates = index.duplicate_keys()
+    if duplicates:
+        raise KeyViolation(f"Primary key `{column}` has duplicate values: {', '.join(map(str, duplicates))}")
+
+
+def _key_value(df, pk, value):
+    if value is None or pd.isna(value) or value == "":
+        raise KeyViolation(f"Primary key `{pk}` can't be empty.")
+    try:
+        # Typed-in values are text; compare them as the key column's type
+        return df[pk].dtype.type(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def check_insert(table, df, values):
+    """Raise KeyViolation if the row `values` ({column: value}) would repeat `table`'s primary key."""
+    pk = primary_key(table)
+    if pk is None or pk not in df.columns:
+        return
+    value = _key_value(df, pk, values.get(pk))
+    if hash_index(df, pk).contains(value):
+        raise KeyViolation(f"Primary key `{pk}` = {value!r} already exists in `{table}`.")
+
+
+def check_update(table, df, positions, column, value):
+    """Raise KeyViolation if setting `column` to `value` at `positions` would repeat `table`'s primary key."""
+    if column != primary_key(table) or not len(positions):
+        return
+    value = _key_value(df, column, value)
+    others = np.setdiff1d(hash_index(df, column).positions(value), positions)
+    if len(positions) > 1 or len(others):
+        raise KeyViolation(f"Setting primary key `{column}` = {value!r} would repeat a key in `{table}`.")
@@ -0,0 +1,132 @@
+import pandas as pd
+import numpy as np
+
+from sort_order import already_sorted, record_order
+
+
+RANKING_FUNCTIONS = ["ROW_NUMBER", "RANK", "DENSE_RANK"]
+AGGREGATE_FUNCTIONS = ["SUM", "AVG", "COUNT", "MIN", "MAX"]
+OFFSET_FUNCTIONS = ["LAG", "LEAD"]
+WINDOW_FUNCTIONS = RANKING_FUNCTIONS + AGGREGATE_FUNCTIONS + OFFSET_FUNCTIONS
+
+# Frames for aggregate functions, as (label, SQL frame clause template)
+FRAMES = {
+    "Running (start of partition → current row)": "ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW",
+    "Moving (last N rows → current row)": "ROWS BETWEEN {n} PRECEDING AND CURRENT ROW",
+    "Whole partition": "ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING",
+}
+RUNNING, MOVING, WHOLE = FRAMES
+
+_CUMULATIVE = {"MIN": "cummin", "MAX": "cummax"}
+_PANDAS_AGG = {"SUM": "sum", "AVG": "mean", "COUNT": "count", "MIN": "min", "MAX": "max"}
+
+
+def _changed(frame):
+    """True where a row's values differ from the previous row's (nulls equal to nulls)."""
+    previous = frame.shift()
+    same = frame.eq(previous) | (frame.isna() & previous.isna())
+    changed = ~same.all(axis=1)
+    if len(changed):
+        changed.iloc[0] = True
+    return changed
+
+
+def _grouped(series, keys):
+    return series.groupby(keys, sort=False, dropna=False) if keys is not None else series
+
+
+def _by_rank(column, kernel):
+    """Apply a numeric MIN/MAX `kernel` to any orderable column through its sorted value codes.
+
+    Text, datetime and boolean columns are replaced by their rank among the
+    distinct values (nulls stay null), so cummin/rolling work on them too.
+    """
+    if column.dtype.kind in "iuf":
+        return kernel(column)
+    codes, uniques = pd.factorize(column, sort=True)
+    ranks = kernel(pd.Series(np.where(codes >= 0, codes, np.nan), index=column.index))
+    values = pd.Categorical.from_codes(ranks.fillna(-1).astype("int64"), categories=uniques)
+    return pd.Series(np.asarray(values), index=ranks.index)
+
+
+def window_column(ordered, step):
+    """Values of the window function for `ordered`, already sorted by partition then order keys.
+
+    Returned by position, as a Series on a fresh RangeIndex.
+    """
+    function = step["function"]
+    partition_by, order_by = step.get("partition_by", []), step.get("order_by", [])
+    ordered = ordered.reset_index(drop=True)
+    keys = [ordered[col] for col in partition_by] or None
+    n = len(ordered)
+
+    if function in RANKING_FUNCTIONS:
+        row_number = _grouped(pd.Series(np.ones(n, dtype="int64"), index=ordered.index), keys).cumsum()
+        if function == "ROW_NUMBER":
+            return row_number
+        if not order_by:
+            # Without ORDER BY every row of a partition is a peer
+            return pd.Series(np.ones(n, dtype="int64"), index=ordered.index)
+        # A new rank starts wherever the order keys (or the partition) change
+        peer_start = _changed(ordered[partition_by + order_by])
+        if function == "RANK":
+            return row_number.where(peer_start).ffill().astype("int64")
+        return _grouped(peer_start.astype("int64"), keys).cumsum()
+
+    column = ordered[step["column"]]
+    if function in OFFSET_FUNCTIONS:
+        offset = int(step.get("offset", 1))
+        return _grouped(column, keys).shift(offset if function == "LAG" else -offset)
+
+    frame = step.get("frame", RUNNING)
+    if frame == WHOLE or not order_by:
+        return _grouped(column, keys).transform(_PANDAS_AGG[function]) if keys is not None else \
+            pd.Series(column.agg(_PANDAS_AGG[function]), index=ordered.index)
+
+    if frame == MOVING:
+        size = int(step.get("frame_rows", 2)) + 1
+
+        def moving(values, func):
+            rolling = _grouped(values, keys).rolling(size, min_periods=1)
+            out = getattr(rolling, func)()
+            if keys is not None:
+                # groupby().rolling() prefixes the partition keys to the row positions
+                out = out.reset_index(level=list(range(len(partition_by))), drop=True).sort_index()
+            return out
+
+        if function == "COUNT":
+            # rolling count only takes numbers; count non-null flags instead
+            return moving(column.notna().astype("float64"), "sum").astype("int64")
+        if function in ["MIN", "MAX"]:
+            return _by_rank(column, lambda values: moving(values, _PANDAS_AGG[function]))
+        return moving(column, _PANDAS_AGG[function])
+
+    # Running frame; nulls are skipped, as SQL aggregates skip them
+    counts = _grouped(column.notna().astype("int64"), keys).cumsum()
+    if function == "COUNT":
+        return counts
+    if function in ["MIN", "MAX"]:
+        def running(values):
+            extremes = getattr(_grouped(values, keys), _CUMULATIVE[function])()
+            return _grouped(extremes, keys).ffill()
+        return _by_rank(column, running)
+    totals = _grouped(column.fillna(0), keys).cumsum()
+    if (counts == 0).any():
+        totals = totals.where(counts > 0)
+    return totals if function == "SUM" else (totals / counts.where(counts > 0)).astype("float64")
+
+
+def apply_window(df, step):
+    """`df` plus the window column `step["alias"]`, computed after one sort by partition and order keys."""
+    partition_by, order_by = step.get("partition_by", []), step.get("order_by", [])
+    ascending = step.get("ascending", True)
+    sort_keys = partition_by + order_by
+    if sort_keys and not (ascending and already_sorted(df, sort_keys)):
+        ordered = df.sort_values(sort_keys, ascending=[True] * len(partition_by) + [ascending] * len(order_by),
+                                 kind="stable")
+    else:
+        ordered = df
+    out = ordered.assign(**{step["alias"]: window_column(ordered, step).to_numpy()})
+    if sort_keys and ascending:
+        record_order(out, sort_keys, True)
+    return out